@@ -9,13 +9,16 @@
 for arg in "$@"; do
   case $arg in
     archive_path=*) ARCHIVE_PATH="${arg#*=}" ;;
+    archive_extracted=*) ARCHIVE_EXTRACTED="${arg#*=}" ;;
     java_version=*) JAVA_VERSION="${arg#*=}" ;;
     startup_command=*) STARTUP_COMMAND="${arg#*=}" ;;
   esac
 done
 
-if [ -z "$ARCHIVE_PATH" ]; then
-    echo "ERROR: archive_path argument is required."
+# PGSM streams the archive into /PGSM before running this script
+# (archive_extracted=true); archive_path is for manual installs from a file.
+if [ -z "$ARCHIVE_PATH" ] && [ "$ARCHIVE_EXTRACTED" != "true" ]; then
+    echo "ERROR: archive_path or archive_extracted=true argument is required."
     exit 1
 fi
 
@@ -66,29 +69,17 @@ mv jdk-17* java17
 mv jdk-16* java16
 mv jdk8* java8
 
-# Step 4: Prepare server archive
-echo "Preparing server archive..."
-apt install -y file unzip
+# Step 4/5: Extract the server archive (skipped when PGSM already streamed it into /PGSM)
 mkdir -p /PGSM
-cp "$ARCHIVE_PATH" /PGSM/server-archive
-
-# Step 5: Detect format and extract
-echo "Extracting server archive..."
-cd /PGSM
-FILETYPE=$(file server-archive)
-if echo "$FILETYPE" | grep -qi "Zip"; then
-    unzip -o server-archive
-elif echo "$FILETYPE" | grep -qi "gzip\|tar"; then
-    tar -xzf server-archive
-elif echo "$FILETYPE" | grep -qi "bzip2"; then
-    tar -xjf server-archive
-elif echo "$FILETYPE" | grep -qi "XZ"; then
-    tar -xJf server-archive
-else
-    # Last-resort: try tar then unzip
-    tar -xzf server-archive 2>/dev/null || unzip -o server-archive
+if [ -n "$ARCHIVE_PATH" ]; then
+    echo "Extracting server archive..."
+    # bsdtar auto-detects zip, tar.gz, tar.bz2, tar.xz and tar.zst
+    apt install -y libarchive-tools
+    bsdtar -xf "$ARCHIVE_PATH" -C /PGSM
+elif [ -z "$(ls -A /PGSM)" ]; then
+    echo "ERROR: archive_extracted=true but /PGSM is empty."
+    exit 1
 fi
-rm -f server-archive
 
 # Step 6: If the archive extracted into a single subdirectory, flatten it into /PGSM
 SUBDIRS=$(find /PGSM -mindepth 1 -maxdepth 1 -type d)
@@ -15,6 +15,26 @@ def create_app(config_class=Config):
     db.init_app(app)
     socketio.init_app(app, async_mode='eventlet', cors_allowed_origins='*')
 
+    # Coalesced nginx reloads (see NginxService.reload)
+    from app.services.nginx import reload_scheduler
+    reload_scheduler.init_app(app)
+
+    # Shared console sessions (scrollback + reconnect grace period)
+    from app.services.console import console_manager
+    from app.services.console_archive import console_archive
+    console_manager.init_app(app)
+    console_archive.init_app(app)
+
+    # Short-lived file browser directory listings
+    from app.services.file_listing import listing_cache
+    listing_cache.init_app(app)
+    # Live follow (tail -f) in the file viewer
+    from app.services.file_viewer import file_tails
+    file_tails.init_app(app)
+    # Deduplicated /PGSM backups
+    from app.services.backups import backup_manager
+    backup_manager.init_app(app)
+
     # Register blueprints
     from app.blueprints.dashboard import bp as dashboard_bp
     from app.blueprints.servers import bp as servers_bp
@@ -29,70 +49,78 @@ def create_app(config_class=Config):
     app.register_blueprint(api_bp, url_prefix='/api')
 
     with app.app_context():
-        db.create_all()
-        _apply_migrations(db)
-        _migrate_extra_ports_format()
+        _configure_sqlite(app)
+        # Fail fast on an incomplete PGSM_VLAN_Extra_Pools instead of at the first create
+        from app.services.ip_allocator import IpAllocator
+        IpAllocator().get_pools()
+
+        # Versioned migrations — a fully migrated DB costs a single query here
+        from app.migrations import run_migrations
+        run_migrations()
+
+        # Warm the version metadata cache so the create wizard never waits on upstream
+        from app.services.metadata_cache import metadata_cache
+        from app.services.minecraft import MinecraftService
+        metadata_cache.init_app(app)
+        if not app.testing:
+            metadata_cache.warm(MinecraftService().get_metadata_urls())
+
+        # Per-port traffic accounting from the nginx stream access log
+        from app.services.traffic import traffic_tailer
+        traffic_tailer.init_app(app)
+        if not app.testing:
+            traffic_tailer.start()
+
+        # Console log archive: record segments a previous run left open
+        console_archive.recover()
+        if app.config['CONSOLE_ARCHIVE_ALWAYS_ATTACHED'] and not app.testing:
+            console_manager.start_keeper()
+
+        # Backups: fail snapshots a previous run left running, then the schedule
+        backup_manager.recover()
+        if not app.testing:
+            backup_manager.start_scheduler()
+
+    _register_cli(app)
 
     return app
 
 
-def _migrate_extra_ports_format():
-    """One-time data migration: convert extra_ports from [int, ...] to
-    [{"port": int, "protocol": "tcp"}, ...] format.
+def _register_cli(app):
+    """Registers maintenance commands, e.g. `flask --app main nginx-resync`."""
 
-    Safe to run every startup — already-migrated entries (dicts) are left alone.
-    """
-    from app.models.server import GameServer
-    from sqlalchemy.orm.attributes import flag_modified
-
-    changed = False
-    for server in GameServer.query.all():
-        if not server.extra_ports:
-            continue
-        new_ports = []
-        needs_update = False
-        for entry in server.extra_ports:
-            if isinstance(entry, int):
-                new_ports.append({'port': entry, 'protocol': 'tcp'})
-                needs_update = True
-            else:
-                new_ports.append(entry)
-        if needs_update:
-            server.extra_ports = new_ports
-            flag_modified(server, 'extra_ports')
-            changed = True
-    if changed:
-        db.session.commit()
-
-
-def _apply_migrations(db):
-    """Applies lightweight schema migrations for columns added after initial release.
-
-    Uses SQLite's ALTER TABLE ADD COLUMN. Safe to run on every startup — the
-    INSERT OR IGNORE pattern means already-applied changes are skipped.
+    @app.cli.command('nginx-resync')
+    def nginx_resync():
+        """Regenerates every server's nginx conf from the DB with a single reload."""
+        from app.models.server import GameServer
+        from app.services.nginx import NginxService
+        summary = NginxService().resync_all(GameServer.query.all())
+        print(
+            f"nginx resync: {len(summary['written'])} written, "
+            f"{summary['unchanged']} unchanged, {len(summary['removed'])} removed"
+        )
+
+
+def _configure_sqlite(app):
+    """Puts every SQLite connection in WAL mode with a busy timeout.
+
+    WAL lets readers proceed while a background thread writes, and the busy
+    timeout makes concurrent writers wait for the lock instead of failing
+    immediately with "database is locked".
     """
-    migrations = [
-        # v2: extra_ports column for multi-port support
-        "ALTER TABLE game_servers ADD COLUMN extra_ports JSON",
-        # v3: ha_enabled column for Proxmox HA registration
-        "ALTER TABLE game_servers ADD COLUMN ha_enabled BOOLEAN DEFAULT 0",
-        # v4: java version override (NULL = auto)
-        "ALTER TABLE game_servers ADD COLUMN java_version_override INTEGER",
-        # v5: custom startup command override (NULL = use script default)
-        "ALTER TABLE game_servers ADD COLUMN custom_startup_command VARCHAR(512)",
-        # v6: Fabric loader version (NULL = latest)
-        "ALTER TABLE game_servers ADD COLUMN fabric_loader_version VARCHAR(32)",
-        # v7: Forge version (NULL = recommended for MC version)
-        "ALTER TABLE game_servers ADD COLUMN forge_version VARCHAR(32)",
-        # v8: Import archive URL (for import server type)
-        "ALTER TABLE game_servers ADD COLUMN import_archive_url VARCHAR(512)",
-    ]
-
-    with db.engine.connect() as conn:
-        for stmt in migrations:
-            try:
-                conn.execute(db.text(stmt))
-                conn.commit()
-            except Exception:
-                # Column likely already exists; ignore and continue
-                pass
+    from sqlalchemy import event
+
+    if db.engine.dialect.name != 'sqlite':
+        return
+    busy_timeout = app.config['SQLITE_BUSY_TIMEOUT_MS']
+
+    @event.listens_for(db.engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    # Connections opened before the listener was attached miss the pragmas
+    db.engine.dispose()
@@ -1,15 +1,21 @@
 import json
+from datetime import datetime, timedelta, timezone
 
-from flask import jsonify, request
+from flask import jsonify, request, url_for
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.attributes import flag_modified
 
 from app.blueprints.api import bp
 from app.extensions import db
 from app.models.server import GameServer
+from app.services.port_allocator import PortAllocator
 from app.services.ssh import SSHManager
 
 _ssh_mgr = SSHManager()
 
+# Largest contiguous block /ports/add will reserve in one request
+_MAX_AUTO_PORT_BLOCK = 16
+
 
 @bp.route('/nodes')
 def nodes():
@@ -96,8 +102,16 @@ def server_metrics(server_id):
         'net_tx_bytes': None,
         'players_online': None,
         'players_max': None,
+        # Per-port proxy traffic over the last 24h, from the nginx stream log
+        'proxy_traffic': [],
     }
 
+    try:
+        from app.services.traffic import get_port_traffic
+        result['proxy_traffic'] = get_port_traffic(server.id)
+    except Exception:
+        pass
+
     # Collect system metrics via a single SSH connection
     try:
         combined_cmd = (
@@ -172,12 +186,23 @@ def add_port(server_id):
     port = data.get('port')
     protocol = data.get('protocol', 'tcp')
 
-    if not port or not isinstance(port, int) or not (1024 <= port <= 65535):
-        return jsonify({'error': 'Invalid port number (must be 1024–65535)'}), 400
-
     if protocol not in ('tcp', 'udp', 'both'):
         return jsonify({'error': 'Invalid protocol (must be tcp, udp, or both)'}), 400
 
+    if port == 'auto':
+        # Reserve the lowest free block of `count` consecutive ports in the game's range
+        count = data.get('count', 1)
+        if not isinstance(count, int) or not (1 <= count <= _MAX_AUTO_PORT_BLOCK):
+            return jsonify({'error': f'Invalid count (must be 1–{_MAX_AUTO_PORT_BLOCK})'}), 400
+        try:
+            ports = PortAllocator().assign(server, count=count, protocol=protocol)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+        return _port_change_response(server, added=ports, protocol=protocol)
+
+    if not port or not isinstance(port, int) or not (1024 <= port <= 65535):
+        return jsonify({'error': 'Invalid port number (must be 1024–65535)'}), 400
+
     if port == server.game_port:
         return jsonify({'error': 'Port is already the primary game port'}), 400
 
@@ -186,23 +211,33 @@ def add_port(server_id):
     if port in existing_ports:
         return jsonify({'error': 'Port already added'}), 400
 
-    conflict = GameServer.port_in_use_by(port, exclude_id=server_id)
+    conflict = GameServer.port_in_use_by(port, protocol=protocol, exclude_id=server_id)
     if conflict:
         return jsonify({'error': f'Port {port} is already in use by server "{conflict.name}"'}), 400
 
     extra.append({'port': port, 'protocol': protocol})
     server.extra_ports = extra
     flag_modified(server, 'extra_ports')
-    db.session.commit()
+    server.sync_port_registry()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request claimed the port between the check and the commit
+        db.session.rollback()
+        return jsonify({'error': f'Port {port} was just taken by another server'}), 409
 
-    # Update nginx config
+    return _port_change_response(server, added=[port], protocol=protocol)
+
+
+def _port_change_response(server: GameServer, added: list[int], protocol: str):
+    """Regenerates the server's nginx conf and returns the add-port JSON response."""
+    body = {'ok': True, 'added': added, 'protocol': protocol, 'all_ports': server.all_ports}
     try:
         from app.services.nginx import NginxService
         NginxService().add_server(server)
     except Exception as e:
-        return jsonify({'ok': True, 'nginx_warning': str(e), 'all_ports': server.all_ports})
-
-    return jsonify({'ok': True, 'all_ports': server.all_ports})
+        body['nginx_warning'] = str(e)
+    return jsonify(body)
 
 
 @bp.route('/servers/<server_id>/ports/primary', methods=['POST'])
@@ -211,24 +246,36 @@ def set_primary_port(server_id):
     data = request.get_json(silent=True) or {}
     port = data.get('port')
 
-    if not port or not isinstance(port, int) or not (1024 <= port <= 65535):
-        return jsonify({'error': 'Invalid port number (must be 1024–65535)'}), 400
-
-    if port == server.game_port:
-        return jsonify({'error': 'That is already the primary port'}), 400
-
-    # Check it's not already an extra port
-    extra = list(server.extra_ports or [])
-    extra_port_nums = [e['port'] if isinstance(e, dict) else e for e in extra]
-    if port in extra_port_nums:
-        return jsonify({'error': f'Port {port} is already an extra port — remove it first'}), 400
-
-    conflict = GameServer.port_in_use_by(port, exclude_id=server_id)
-    if conflict:
-        return jsonify({'error': f'Port {port} is already in use by server "{conflict.name}"'}), 400
-
-    server.game_port = port
-    db.session.commit()
+    if port == 'auto':
+        # Move to the lowest free port in the game's range
+        try:
+            PortAllocator().assign(server, primary=True)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+    else:
+        if not port or not isinstance(port, int) or not (1024 <= port <= 65535):
+            return jsonify({'error': 'Invalid port number (must be 1024–65535)'}), 400
+
+        if port == server.game_port:
+            return jsonify({'error': 'That is already the primary port'}), 400
+
+        # Check it's not already an extra port
+        extra = list(server.extra_ports or [])
+        extra_port_nums = [e['port'] if isinstance(e, dict) else e for e in extra]
+        if port in extra_port_nums:
+            return jsonify({'error': f'Port {port} is already an extra port — remove it first'}), 400
+
+        conflict = GameServer.port_in_use_by(port, protocol='tcp', exclude_id=server_id)
+        if conflict:
+            return jsonify({'error': f'Port {port} is already in use by server "{conflict.name}"'}), 400
+
+        server.game_port = port
+        server.sync_port_registry()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': f'Port {port} was just taken by another server'}), 409
 
     try:
         from app.services.nginx import NginxService
@@ -239,23 +286,158 @@ def set_primary_port(server_id):
     return jsonify({'ok': True, 'game_port': server.game_port})
 
 
+@bp.route('/nginx/resync', methods=['POST'])
+def nginx_resync():
+    """Regenerates every server's nginx conf from the DB with a single reload."""
+    from app.services.nginx import NginxService
+    try:
+        summary = NginxService().resync_all(GameServer.query.all())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'ok': True, **summary})
+
+
 @bp.route('/servers', methods=['GET'])
 def list_servers():
-    """Lists all game servers for external integrations (e.g. Game-Panel whitelist sync)."""
-    servers = GameServer.query.all()
-    return jsonify([
-        {
-            'id': s.id,
-            'name': s.name,
-            'status': s.status,
-            'ip_address': s.ip_address,
-            'game_port': s.game_port,
-            'game_code': s.game_code,
-            'server_type': s.server_type,
-            'game_version': s.game_version,
+    """Lists game servers for external integrations (e.g. Game-Panel whitelist sync).
+
+    Filters: status, type, node, game (exact) and q (name substring).
+    fields=id,name,... selects the keys returned. Pass limit= (and cursor=
+    for later pages) to paginate: the body stays a list, and the next page's
+    cursor is returned in the X-Next-Cursor and Link headers. Without limit
+    every matching server is returned. X-Total-Count is the filtered count.
+    """
+    from app.services import server_listing
+
+    try:
+        fields = server_listing.parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not (1 <= limit <= server_listing.MAX_PAGE_SIZE):
+            raise ValueError(f'limit must be 1–{server_listing.MAX_PAGE_SIZE}')
+        query = server_listing.filter_servers(request.args)
+        servers, next_cursor = server_listing.paginate(
+            query, request.args.get('cursor'), limit, fields=fields,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify([server_listing.serialize(s, fields) for s in servers])
+    response.headers['X-Total-Count'] = str(query.order_by(None).count())
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("api.list_servers", _external=True, **args)}>; rel="next"'
+    return response
+
+
+@bp.route('/console/search')
+def console_search():
+    """Searches the console log archive across servers without touching them.
+
+    q: words that must all appear in a line (whole words, case-insensitive).
+    server: server id(s), repeated or comma-separated; the status, type,
+    node and game filters of /api/servers narrow the servers further.
+    since/until: ISO timestamps (UTC if no offset) or relative like 30m, 12h, 7d.
+    limit: max lines, newest first.
+    """
+    from app.services import server_listing
+    from app.services.console_archive import MAX_RESULTS, console_archive
+
+    try:
+        query = request.args.get('q', '')
+        server_ids = {
+            sid.strip() for value in request.args.getlist('server') for sid in value.split(',') if sid.strip()
         }
-        for s in servers
-    ])
+        filters = {k: request.args[k] for k in server_listing.FILTER_COLUMNS if request.args.get(k)}
+        if filters:
+            matched = {sid for (sid,) in server_listing.filter_servers(filters).with_entities(GameServer.id)}
+            server_ids = server_ids & matched if server_ids else matched
+            if not server_ids:
+                return jsonify({'results': [], 'segments_scanned': 0, 'segments_skipped': 0, 'truncated': False})
+        limit = request.args.get('limit', 200, type=int)
+        if not (1 <= limit <= MAX_RESULTS):
+            raise ValueError(f'limit must be 1–{MAX_RESULTS}')
+        result = console_archive.search(
+            query,
+            server_ids=server_ids or None,
+            since=_parse_search_time(request.args.get('since')),
+            until=_parse_search_time(request.args.get('until')),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    names = dict(
+        GameServer.query.filter(GameServer.id.in_({r['server_id'] for r in result['results']}))
+        .with_entities(GameServer.id, GameServer.name)
+    )
+    for r in result['results']:
+        r['server_name'] = names.get(r['server_id'])  # None if since deleted
+    return jsonify(result)
+
+
+_RELATIVE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def _parse_search_time(value: str | None) -> datetime | None:
+    """Parses an ISO timestamp or a relative "<n>m/h/d" (ago) into naive UTC."""
+    if not value:
+        return None
+    value = value.strip()
+    unit = _RELATIVE_UNITS.get(value[-1:].lower())
+    if unit and value[:-1].isdigit():
+        return datetime.utcnow() - timedelta(**{unit: int(value[:-1])})
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid time {value!r}: use ISO 8601 or e.g. 30m, 12h, 7d') from None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+@bp.route('/console/broadcast', methods=['POST'])
+def console_broadcast():
+    """Sends one console command to many servers concurrently.
+
+    Body: {"command": "save-all", and a selection: "servers": [ids], and/or
+    "filters": {status, type, node, game, q} (as /api/servers), or "all": true;
+    optional "concurrency" (capped at Console_Broadcast_Concurrency)}.
+    Only running servers are sent the command; the rest are reported as
+    skipped. Returns the per-server report of broadcast_console_command().
+    """
+    from flask import current_app
+    from app.services import server_listing
+    from app.services.server_lifecycle import broadcast_console_command
+
+    data = request.get_json(silent=True) or {}
+    command = str(data.get('command', '')).strip()
+    if not command:
+        return jsonify({'error': 'command is required'}), 400
+
+    server_ids = data.get('servers') or []
+    filters = {k: v for k, v in (data.get('filters') or {}).items() if v}
+    if not isinstance(server_ids, list) or not all(isinstance(i, str) for i in server_ids):
+        return jsonify({'error': 'servers must be a list of server ids'}), 400
+    unknown = set(filters) - {'q', *server_listing.FILTER_COLUMNS}
+    if unknown:
+        return jsonify({'error': f'Unknown filter(s): {", ".join(sorted(unknown))}'}), 400
+    if not (server_ids or filters or data.get('all') is True):
+        # Never fall through to the whole fleet by accident
+        return jsonify({'error': 'Select servers with "servers", "filters" or "all": true'}), 400
+
+    query = server_listing.filter_servers(filters)
+    if server_ids:
+        query = query.filter(GameServer.id.in_(server_ids))
+    servers = query.order_by(GameServer.name).all()
+
+    cap = current_app.config['CONSOLE_BROADCAST_CONCURRENCY']
+    try:
+        concurrency = min(int(data.get('concurrency') or cap), cap)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+    return jsonify(broadcast_console_command(servers, command, concurrency))
 
 
 @bp.route('/servers/<server_id>/whitelist', methods=['POST'])
@@ -311,6 +493,7 @@ def remove_port(server_id):
     extra = [e for e in extra if (e['port'] if isinstance(e, dict) else e) != port]
     server.extra_ports = extra
     flag_modified(server, 'extra_ports')
+    server.sync_port_registry()
     db.session.commit()
 
     # Update nginx config
@@ -321,3 +504,88 @@ def remove_port(server_id):
         return jsonify({'ok': True, 'nginx_warning': str(e), 'all_ports': server.all_ports})
 
     return jsonify({'ok': True, 'all_ports': server.all_ports})
+
+
+# ── Backups ───────────────────────────────────────────────────────────────────
+
+@bp.route('/servers/<server_id>/backups', methods=['GET'])
+def list_backups(server_id):
+    """The server's backups (newest first), dedup stats, and its latest restore."""
+    from app.models.backup import BackupSnapshot
+    from app.services.backups import backup_manager
+
+    snapshots = (
+        BackupSnapshot.query.filter_by(server_id=server_id)
+        .order_by(BackupSnapshot.created_at.desc()).all()
+    )
+    if not snapshots:
+        GameServer.query.get_or_404(server_id)  # backups outlive their server
+    return jsonify({
+        'backups': [s.to_dict() for s in snapshots],
+        'stats': backup_manager.stats(server_id),
+        'restore': backup_manager.restores.get(server_id),
+    })
+
+
+@bp.route('/servers/<server_id>/backups', methods=['POST'])
+def create_backup(server_id):
+    """Starts a backup of the server's /PGSM; poll the list for progress."""
+    from app.services.backups import BackupError, backup_manager
+
+    server = GameServer.query.get_or_404(server_id)
+    if server.status not in ('running', 'stopped'):
+        return jsonify({'error': f'Cannot back up a server that is {server.status}'}), 400
+    try:
+        snapshot = backup_manager.start(server)
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(snapshot.to_dict()), 202
+
+
+@bp.route('/backups/<int:backup_id>/restore', methods=['POST'])
+def restore_backup(backup_id):
+    """Replaces a stopped (or errored) server's /PGSM with a backup.
+
+    Body (optional): {"server_id": target} to restore onto another server;
+    defaults to the server the backup was taken from.
+    """
+    from app.models.backup import BackupSnapshot
+    from app.services.backups import BackupError, backup_manager
+
+    snapshot = BackupSnapshot.query.get_or_404(backup_id)
+    data = request.get_json(silent=True) or {}
+    server = GameServer.query.get_or_404(data.get('server_id') or snapshot.server_id)
+    try:
+        progress = backup_manager.restore(snapshot, server)
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'server_id': server.id, **progress}), 202
+
+
+@bp.route('/backups/<int:backup_id>', methods=['DELETE'])
+def delete_backup(backup_id):
+    """Deletes a backup and the chunks no other backup uses."""
+    from app.models.backup import BackupSnapshot
+    from app.services.backups import BackupError, backup_manager
+
+    snapshot = BackupSnapshot.query.get_or_404(backup_id)
+    try:
+        result = backup_manager.delete(snapshot)
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'ok': True, **result})
+
+
+@bp.route('/backups/stats')
+def backup_stats():
+    """Dedup and compression across every backup (or ?server=<id>)."""
+    from app.services.backups import backup_manager
+    return jsonify(backup_manager.stats(request.args.get('server') or None))
+
+
+@bp.route('/backups/prune', methods=['POST'])
+def prune_backups():
+    """Applies the retention policy to every server's backups and deletes
+    unreferenced chunks (this also happens after each backup)."""
+    from app.services.backups import backup_manager
+    return jsonify(backup_manager.prune())
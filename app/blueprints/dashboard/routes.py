@@ -1,18 +1,25 @@
 from flask import render_template
 from app.blueprints.dashboard import bp
 from app.models.server import GameServer
+from app.services import server_listing
+
+# Cards shown per dashboard section; the Servers page has the full, filterable list
+_DASHBOARD_CARDS = 12
 
 
 @bp.route('/')
 def index():
-    servers = GameServer.query.all()
-    running = sum(1 for s in servers if s.status == 'running')
-    stopped = sum(1 for s in servers if s.status == 'stopped')
-    creating = sum(1 for s in servers if s.status == 'creating')
+    counts = server_listing.status_counts()
+    running_servers, _ = server_listing.paginate(
+        GameServer.query.filter_by(status='running'), None, _DASHBOARD_CARDS,
+    )
+    recent_servers, _ = server_listing.paginate(GameServer.query, None, _DASHBOARD_CARDS)
     return render_template(
         'dashboard/index.html',
-        servers=servers,
-        running=running,
-        stopped=stopped,
-        creating=creating,
+        running_servers=running_servers,
+        recent_servers=recent_servers,
+        total=counts['total'],
+        running=counts.get('running', 0),
+        stopped=counts.get('stopped', 0),
+        creating=counts.get('creating', 0),
     )
@@ -1,13 +1,50 @@
-import io
+import json
+import logging
+import mimetypes
+import posixpath
+import shlex
 import stat
+import unicodedata
+from datetime import datetime, timezone
+from urllib.parse import quote
 
-from flask import render_template, request, redirect, url_for, send_file, flash, jsonify
+from eventlet import tpool
+from flask import (
+    render_template, request, redirect, url_for, flash, jsonify, Response, current_app, stream_with_context,
+)
+from flask_socketio import emit
+from werkzeug.datastructures import ContentRange
 
 from app.blueprints.files import bp
+from app.extensions import db, socketio
+from app.models.file_upload import FileUpload
 from app.models.server import GameServer
+from app.services import server_listing
+from app.services.file_bulk import BulkError, run_batch, validate as validate_bulk
+from app.services.file_edits import EditError, SaveConflict, save_file as save_remote_file, sha256_hex
+from app.services.file_listing import disk_usage, list_directory, listing_cache
+from app.services.file_search import SearchOptions, search_server, search_servers
+from app.services.file_uploads import UploadError, upload_manager
+from app.services.file_viewer import MAX_PAGE_BYTES, file_tails, read_page
 from app.services.ssh import SSHManager
 
 ssh_mgr = SSHManager()
+log = logging.getLogger(__name__)
+
+# Bytes per read from the download channel (and per response chunk)
+_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Folder download formats: compressor tar pipes through, and MIME type.
+# Favour speed over ratio, since the archive is built while it downloads.
+_ARCHIVE_FORMATS = {
+    'zst': ('zstd -3 -T0', 'application/zstd'),
+    'gz': ('gzip -1', 'application/gzip'),
+}
+# Deepest directory level /tree reports individually
+_TREE_MAX_DEPTH = 4
+# Search limits: lines of context either side of a match, and units
+# accepted by modified_within
+_SEARCH_MAX_CONTEXT = 5
+_SEARCH_MINUTES = {'m': 1, 'h': 60, 'd': 24 * 60}
 
 
 @bp.route('/<server_id>')
@@ -21,20 +58,7 @@ def browse(server_id, remote_path='/PGSM'):
         remote_path = '/' + remote_path
 
     try:
-        client, sftp = ssh_mgr.get_sftp(server.ip_address)
-        try:
-            entries = []
-            for attr in sftp.listdir_attr(remote_path):
-                entries.append({
-                    'name': attr.filename,
-                    'is_dir': stat.S_ISDIR(attr.st_mode),
-                    'size': attr.st_size,
-                    'path': (remote_path.rstrip('/') + '/' + attr.filename),
-                })
-            entries.sort(key=lambda e: (not e['is_dir'], e['name'].lower()))
-        finally:
-            sftp.close()
-            client.close()
+        entries = list_directory(server, remote_path, refresh=bool(request.args.get('refresh')))
     except Exception as e:
         flash(f'SFTP error: {e}', 'error')
         entries = []
@@ -57,29 +81,353 @@ def browse(server_id, remote_path='/PGSM'):
     )
 
 
+@bp.route('/<server_id>/tree')
+def tree(server_id):
+    """Recursive disk usage of a directory and its subdirectories.
+
+    Query: path (default /PGSM), depth (1-4, default 1). Returns the totals
+    for path plus {path, bytes, disk_bytes, files, dirs} for each directory
+    down to depth, largest first.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    remote_path = request.args.get('path', '/PGSM')
+    try:
+        depth = min(max(int(request.args.get('depth', 1)), 1), _TREE_MAX_DEPTH)
+    except ValueError:
+        return jsonify({'error': 'depth must be an integer'}), 400
+
+    try:
+        return jsonify(disk_usage(server, remote_path, depth))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/search')
+def search_many():
+    """Runs one content search on several servers at once.
+
+    Query: the search parameters of /<server_id>/search, plus a selection:
+    server (repeatable id), and/or status, type, node, game (exact) and
+    name (substring), or all=1. Servers are searched File_Search_Concurrency
+    at a time and matches are streamed as they arrive, tagged with
+    server_id and server_name; limit applies to the whole search.
+    """
+    try:
+        options = _search_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    server_ids = request.args.getlist('server')
+    filters = {param: request.args.get(param) for param in server_listing.FILTER_COLUMNS}
+    filters['q'] = request.args.get('name')
+    if not (server_ids or any(filters.values()) or request.args.get('all') == '1'):
+        # Never fall through to the whole fleet by accident
+        return jsonify({'error': 'Select servers with server, status/type/node/game/name or all=1'}), 400
+    query = server_listing.filter_servers(filters)
+    if server_ids:
+        query = query.filter(GameServer.id.in_(server_ids))
+    servers = query.order_by(GameServer.name).all()
+
+    results = search_servers(servers, options, current_app.config['FILE_SEARCH_CONCURRENCY'])
+    return _ndjson_response(results, options.limit, servers=len(servers))
+
+
+@bp.route('/<server_id>/search')
+def search(server_id):
+    """Searches file contents on one server.
+
+    Query: q (required), path (default /PGSM), glob (file name pattern,
+    e.g. *.yml), regex=1 (extended regex; otherwise q is a fixed string),
+    case=1 (case-sensitive; default ignores case), context (lines either
+    side, 0-5), max_size (KB, larger files are skipped), modified_within
+    (e.g. 30m, 12h, 7d), limit (capped at File_Search_Max_Results).
+
+    Streams newline-delimited JSON: one {file, line, text, before, after}
+    per match, then {"done": true, "matches": n, "truncated": bool, "errors": {}}.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    try:
+        options = _search_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def results():
+        try:
+            yield from search_server(server, options)
+        except Exception as e:
+            yield {'server_id': server.id, 'error': f'Search failed: {e}'}
+
+    return _ndjson_response(results(), options.limit)
+
+
+def _search_options() -> SearchOptions:
+    """Builds SearchOptions from the query string; raises ValueError with a
+    message for the user if a parameter is invalid."""
+    args = request.args
+    query = args.get('q', '')
+    if not query.strip():
+        raise ValueError('q is required')
+    try:
+        context = int(args.get('context') or 0)
+        max_size = int(args.get('max_size') or 10 * 1024)
+        limit = int(args.get('limit') or 200)
+    except ValueError:
+        raise ValueError('context, max_size and limit must be integers') from None
+
+    modified_within = None
+    window = (args.get('modified_within') or '').strip()
+    if window:
+        factor = _SEARCH_MINUTES.get(window[-1:].lower())
+        if not factor or not window[:-1].isdigit():
+            raise ValueError(f'Invalid modified_within {window!r}: use e.g. 30m, 12h, 7d')
+        modified_within = int(window[:-1]) * factor
+
+    return SearchOptions(
+        query=query,
+        path=posixpath.normpath('/' + args.get('path', '/PGSM').lstrip('/')),
+        glob=args.get('glob') or None,
+        regex=args.get('regex') == '1',
+        ignore_case=args.get('case') != '1',
+        context=min(max(context, 0), _SEARCH_MAX_CONTEXT),
+        max_size_kb=max(max_size, 1),
+        modified_within=modified_within,
+        limit=min(max(limit, 1), current_app.config['FILE_SEARCH_MAX_RESULTS']),
+    )
+
+
+def _ndjson_response(results, limit: int, **summary) -> Response:
+    """Streams *results* (match or error dicts) as newline-delimited JSON,
+    followed by a {"done": true, ...} line with counts and *summary*.
+    truncated means the search stopped at *limit* matches."""
+    def generate():
+        matches = 0
+        errors = {}
+        for item in results:
+            if 'error' in item:
+                errors[item.get('server_id', '')] = item['error']
+            else:
+                matches += 1
+            yield json.dumps(item) + '\n'
+        yield json.dumps({
+            'done': True, 'matches': matches, 'truncated': matches >= limit, 'errors': errors, **summary,
+        }) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Ask nginx not to buffer, so matches show up as they are found
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @bp.route('/<server_id>/download')
 def download(server_id):
+    """Streams a remote file to the browser, honouring single-range requests.
+
+    Sends Content-Length (so browsers show progress) and Accept-Ranges/ETag
+    (so interrupted downloads resume with Range + If-Range). Only one
+    chunk of the file is held in memory at a time.
+    """
     server = GameServer.query.get_or_404(server_id)
     remote_path = request.args.get('path', '')
     if not remote_path:
         flash('No file path specified.', 'error')
         return redirect(url_for('files.browse', server_id=server_id))
 
+    parent = '/'.join(remote_path.split('/')[:-1]) or '/PGSM'
     try:
         client, sftp = ssh_mgr.get_sftp(server.ip_address)
         try:
-            buf = io.BytesIO()
-            sftp.getfo(remote_path, buf)
-            buf.seek(0)
+            attr = sftp.stat(remote_path)
         finally:
             sftp.close()
+        if stat.S_ISDIR(attr.st_mode):
             client.close()
+            flash(f'{remote_path.split("/")[-1]} is a directory.', 'error')
+            return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
     except Exception as e:
         flash(f'Download failed: {e}', 'error')
-        return redirect(url_for('files.browse', server_id=server_id))
+        return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
+
+    size = attr.st_size
+    etag = f'{int(attr.st_mtime):x}-{size:x}'
+    last_modified = datetime.fromtimestamp(int(attr.st_mtime), timezone.utc)
+
+    start, stop = 0, size
+    byte_range = request.range
+    if byte_range is not None and _if_range_matches(etag, last_modified):
+        if byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+            bounds = byte_range.range_for_length(size)
+            if bounds is None:
+                client.close()
+                return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+            start, stop = bounds
+        # Multi-range requests get the whole file, which RFC 9110 allows
+
+    length = stop - start
+    if request.method == 'HEAD' or length == 0:
+        client.close()
+        body = []
+    else:
+        try:
+            body = _stream_range(client, remote_path, start, length)
+        except Exception as e:
+            client.close()
+            flash(f'Download failed: {e}', 'error')
+            return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
 
     filename = remote_path.split('/')[-1]
-    return send_file(buf, as_attachment=True, download_name=filename)
+    response = Response(
+        body,
+        status=206 if length != size else 200,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        direct_passthrough=True,
+    )
+    response.content_length = length
+    response.accept_ranges = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    if length != size:
+        response.content_range = ContentRange('bytes', start, stop, size)
+    _set_attachment(response, filename)
+    return response
+
+
+def _stream_range(client, remote_path: str, start: int, length: int):
+    """Starts reading *length* bytes of *remote_path* from *start* and returns
+    a generator of the chunks; *client* is closed when it finishes or the
+    browser goes away.
+
+    The bytes come from `tail -c | head -c` on an exec channel rather than
+    SFTP reads: the channel's flow-control window keeps the remote a couple
+    of megabytes ahead of the browser with nothing buffered here, while
+    paramiko's SFTP prefetch can mark itself done early and fall back to
+    one synchronous round trip per 32 KB.
+    """
+    command = f'tail -c +{start + 1} {shlex.quote(remote_path)} | head -c {length}'
+    _, stdout, _ = client.exec_command(command)
+    channel = stdout.channel
+
+    def generate():
+        remaining = length
+        try:
+            while remaining > 0:
+                # paramiko blocks on real threading primitives; keep the hub free
+                chunk = tpool.execute(channel.recv, min(_DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    # File shrank since the stat; the short body makes the browser retry
+                    log.warning('Download of %s ended %d bytes short', remote_path, remaining)
+                    return
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            client.close()
+
+    return generate()
+
+
+def _if_range_matches(etag: str, last_modified: datetime) -> bool:
+    """False if the request's If-Range names a different version of the file."""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return if_range.date >= last_modified
+    return True
+
+
+def _set_attachment(response, filename: str) -> None:
+    """Content-Disposition: attachment, with an RFC 5987 name for non-ASCII files."""
+    try:
+        filename.encode('ascii')
+        names = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+
+
+@bp.route('/<server_id>/archive')
+def archive(server_id):
+    """Streams a directory as a compressed tarball built on the fly.
+
+    Query: path, format (zst, gz or auto; auto picks zstd when the container
+    has it). tar's output goes from the exec channel straight into the
+    response, so nothing is written to the container's disk or held here.
+    The length isn't known up front, so the browser shows bytes received
+    rather than a percentage.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    remote_path = posixpath.normpath('/' + request.args.get('path', '/PGSM').lstrip('/'))
+    requested = request.args.get('format', 'auto')
+    parent, name = posixpath.split(remote_path)
+    if not name:
+        flash('Cannot archive the root directory.', 'error')
+        return redirect(url_for('files.browse', server_id=server_id))
+    if requested not in ('auto', *_ARCHIVE_FORMATS):
+        flash(f'Unknown archive format {requested}.', 'error')
+        return redirect(url_for('files.browse', server_id=server_id, remote_path=remote_path.lstrip('/')))
+
+    try:
+        client = ssh_mgr.get_client(server.ip_address)
+        try:
+            probe = f'test -d {shlex.quote(remote_path)} || echo missing; command -v zstd || true'
+            _, stdout, _ = client.exec_command(probe)
+            output = stdout.read().decode().split()
+            if 'missing' in output:
+                raise ValueError(f'{remote_path} is not a directory')
+            has_zstd = bool(output)
+            fmt = requested if requested != 'auto' else ('zst' if has_zstd else 'gz')
+            if fmt == 'zst' and not has_zstd:
+                raise ValueError('zstd is not installed on this server; use gzip')
+            compressor, mimetype = _ARCHIVE_FORMATS[fmt]
+            command = (
+                f'nice -n 10 tar -C {shlex.quote(parent)} --sparse --warning=no-file-changed'
+                f' --use-compress-program={shlex.quote(compressor)} -cf - -- {shlex.quote(name)}'
+            )
+            body = _stream_archive(client, command, remote_path)
+        except Exception:
+            client.close()
+            raise
+    except Exception as e:
+        flash(f'Archive download failed: {e}', 'error')
+        return redirect(url_for('files.browse', server_id=server_id, remote_path=parent.lstrip('/')))
+
+    stamp = datetime.now().strftime('%Y%m%d-%H%M')
+    response = Response(body, mimetype=mimetype, direct_passthrough=True)
+    _set_attachment(response, f'{server.name}-{name}-{stamp}.tar.{fmt}')
+    return response
+
+
+def _stream_archive(client, command: str, remote_path: str):
+    """Starts *command* and returns a generator of its stdout; *client* is
+    closed when it finishes or the browser goes away.
+
+    If tar fails part-way the generator raises, which drops the connection
+    instead of ending the body cleanly, so the browser reports the download
+    as failed rather than saving a truncated archive.
+    """
+    _, stdout, stderr = client.exec_command(command)
+    channel = stdout.channel
+
+    def generate():
+        try:
+            while True:
+                # paramiko blocks on real threading primitives; keep the hub free
+                chunk = tpool.execute(channel.recv, _DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            status = tpool.execute(channel.recv_exit_status)
+            # 1 = some files changed while being read (a running server's world); still usable
+            if status == 1:
+                log.warning('Archive of %s: files changed while reading', remote_path)
+            elif status != 0:
+                error = stderr.read().decode(errors='replace').strip()
+                log.error('Archive of %s failed (exit %d): %s', remote_path, status, error)
+                raise RuntimeError(f'tar exited with status {status}: {error}')
+        finally:
+            client.close()
+
+    return generate()
 
 
 @bp.route('/<server_id>/upload', methods=['POST'])
@@ -99,6 +447,7 @@ def upload(server_id):
         finally:
             sftp.close()
             client.close()
+            listing_cache.invalidate(server.id, remote_dir)
         flash(f'Uploaded {file.filename} successfully.', 'success')
     except Exception as e:
         flash(f'Upload failed: {e}', 'error')
@@ -107,6 +456,94 @@ def upload(server_id):
                             remote_path=remote_dir))
 
 
+@bp.route('/<server_id>/uploads', methods=['POST'])
+def upload_start(server_id):
+    """Starts a chunked upload, or resumes the matching unfinished one.
+
+    Body: {"path": <directory>, "name", "size", "fingerprint"}. Returns the
+    upload id, part size and the parts already received; the client then PUTs
+    the missing parts and POSTs commit.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be an integer'}), 400
+
+    try:
+        upload = upload_manager.start(
+            server,
+            data.get('path') or '/PGSM',
+            str(data.get('name', '')),
+            size,
+            str(data.get('fingerprint', ''))[:256],
+        )
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(upload_manager.describe(upload))
+
+
+@bp.route('/<server_id>/uploads/<upload_id>')
+def upload_status(server_id, upload_id):
+    upload = _get_upload(server_id, upload_id)
+    return jsonify(upload_manager.describe(upload))
+
+
+@bp.route('/<server_id>/uploads/<upload_id>/parts/<int:index>', methods=['PUT'])
+def upload_part(server_id, upload_id, index):
+    """Writes one part from the raw request body.
+
+    An optional X-Part-SHA256 header is checked against the received bytes.
+    A part may be sent again (e.g. after a failed attempt); the last good copy wins.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    upload = _get_upload(server_id, upload_id)
+    if 0 <= index < upload.parts_total and request.content_length != upload.part_range(index)[1]:
+        return jsonify({'error': f'Part {index} must be {upload.part_range(index)[1]} bytes'}), 400
+
+    try:
+        checksum = upload_manager.write_part(
+            upload, server, index, request.stream.read, request.headers.get('X-Part-SHA256'),
+        )
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'index': index, 'sha256': checksum})
+
+
+@bp.route('/<server_id>/uploads/<upload_id>/commit', methods=['POST'])
+def upload_commit(server_id, upload_id):
+    """Moves a complete upload into place atomically. 409 lists missing parts."""
+    server = GameServer.query.get_or_404(server_id)
+    upload = _get_upload(server_id, upload_id)
+    missing = upload_manager.missing_parts(upload)
+    if missing:
+        return jsonify({'error': f'{len(missing)} part(s) not uploaded yet', 'missing': missing}), 409
+
+    try:
+        path = upload_manager.commit(upload, server)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'ok': True, 'path': path})
+
+
+@bp.route('/<server_id>/uploads/<upload_id>', methods=['DELETE'])
+def upload_abort(server_id, upload_id):
+    server = GameServer.query.get_or_404(server_id)
+    upload_manager.abort(_get_upload(server_id, upload_id), server)
+    return jsonify({'ok': True})
+
+
+def _get_upload(server_id: str, upload_id: str) -> FileUpload:
+    return FileUpload.query.filter_by(id=upload_id, server_id=server_id).first_or_404()
+
+
 @bp.route('/<server_id>/delete_file', methods=['POST'])
 def delete_file(server_id):
     server = GameServer.query.get_or_404(server_id)
@@ -124,6 +561,7 @@ def delete_file(server_id):
         finally:
             sftp.close()
             client.close()
+            listing_cache.invalidate(server.id, parent)
         flash(f'Deleted {remote_path.split("/")[-1]}.', 'warning')
     except Exception as e:
         flash(f'Delete failed: {e}', 'error')
@@ -147,8 +585,9 @@ def delete_dir(server_id):
         return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
 
     try:
-        import shlex
         ssh_mgr.exec(server.ip_address, f'rm -rf {shlex.quote(remote_path)}')
+        listing_cache.invalidate(server.id, parent)
+        listing_cache.invalidate(server.id, remote_path, recursive=True)
         flash(f'Deleted directory {remote_path.split("/")[-1]}.', 'warning')
     except Exception as e:
         flash(f'Delete failed: {e}', 'error')
@@ -156,7 +595,36 @@ def delete_dir(server_id):
     return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
 
 
+@bp.route('/<server_id>/bulk', methods=['POST'])
+def bulk(server_id):
+    """Runs many file operations in one SSH round trip.
+
+    JSON body: {"operations": [{"op": "delete" | "move" | "copy" | "chmod" |
+    "chown", "path", and "dest" (move/copy, optional "overwrite"), "mode"
+    (chmod), "recursive" (chmod/chown)}]}. All paths must be inside /PGSM;
+    chown sets PGSM:PGSM. A malformed batch is rejected whole (400); once it
+    runs, every operation is attempted and reported on its own.
+    Returns {results: [{index, op, path, ok, error}], succeeded, failed}.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        operations = validate_bulk(data.get('operations'))
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        results = run_batch(server, operations)
+    except Exception as e:
+        return jsonify({'error': f'Bulk operation failed: {e}'}), 500
+
+    succeeded = sum(1 for r in results if r['ok'])
+    return jsonify({'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded})
+
+
 _EDIT_SIZE_LIMIT = 512 * 1024  # 512 KB
+# Bytes per page in the read-only viewer
+_VIEW_PAGE_BYTES = 128 * 1024
 
 
 @bp.route('/<server_id>/edit')
@@ -175,11 +643,11 @@ def edit_file(server_id):
             file_stat = sftp.stat(remote_path)
             if file_stat.st_size > _EDIT_SIZE_LIMIT:
                 flash(
-                    f'File is too large to edit in browser ({file_stat.st_size // 1024} KB). '
-                    'Download it instead.',
-                    'error',
+                    f'File is too large to edit in browser ({file_stat.st_size // 1024} KB); '
+                    'opened read-only instead.',
+                    'info',
                 )
-                return redirect(url_for('files.browse', server_id=server_id, remote_path=parent))
+                return redirect(url_for('files.view_file', server_id=server_id, path=remote_path))
 
             with sftp.open(remote_path, 'r') as f:
                 raw = f.read()
@@ -208,27 +676,116 @@ def edit_file(server_id):
         remote_path=remote_path,
         filename=filename,
         content=content,
+        base_sha256=sha256_hex(raw),
+        # CodeMirror would turn CRLF into LF; keep the file's own line endings
+        line_separator='\r\n' if b'\r\n' in raw else None,
     )
 
 
+@bp.route('/<server_id>/view')
+def view_file(server_id):
+    """Read-only viewer for files of any size: pages are fetched on demand
+    from /page, and follow mode streams appended lines over Socket.IO."""
+    server = GameServer.query.get_or_404(server_id)
+    remote_path = request.args.get('path', '')
+    if not remote_path:
+        flash('No file path specified.', 'error')
+        return redirect(url_for('files.browse', server_id=server_id))
+    return render_template(
+        'files/viewer.html',
+        server=server,
+        remote_path=remote_path,
+        filename=remote_path.split('/')[-1],
+        page_bytes=_VIEW_PAGE_BYTES,
+    )
+
+
+@bp.route('/<server_id>/page')
+def file_page(server_id):
+    """One page of a file, trimmed to whole lines.
+
+    Query: path, offset (bytes; negative counts back from the end, so
+    offset=-N is the last N bytes), length (default 128 KB, max 1 MB).
+    Returns {path, size, mtime, start, end, text, binary}; the next page
+    starts at end, the previous one ends at start.
+    """
+    server = GameServer.query.get_or_404(server_id)
+    remote_path = request.args.get('path', '')
+    if not remote_path:
+        return jsonify({'error': 'No path specified'}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        length = min(int(request.args.get('length', _VIEW_PAGE_BYTES)), MAX_PAGE_BYTES)
+    except ValueError:
+        return jsonify({'error': 'offset and length must be integers'}), 400
+
+    try:
+        return jsonify(read_page(server, remote_path, offset, length))
+    except FileNotFoundError:
+        return jsonify({'error': f'{remote_path} does not exist'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@socketio.on('follow_file')
+def handle_follow_file(data):
+    """Starts streaming what is appended to a file from data['offset'] on, as
+    `file_tail` events. A client follows one file at a time."""
+    path = str(data.get('path', ''))
+    server = db.session.get(GameServer, data.get('server_id'))
+    if server is None:
+        emit('file_tail', {'path': path, 'error': 'Server not found'})
+        return
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+    except (TypeError, ValueError):
+        emit('file_tail', {'path': path, 'error': 'Invalid offset'})
+        return
+    file_tails.follow(request.sid, server, path, offset)
+
+
+@socketio.on('unfollow_file')
+def handle_unfollow_file(data=None):
+    file_tails.stop(request.sid)
+
+
 @bp.route('/<server_id>/save', methods=['POST'])
 def save_file(server_id):
+    """Saves a file from the editor without clobbering concurrent changes.
+
+    JSON body: {path, base_sha256 (hash of the content the editor opened),
+    and edits: [{line, delete, insert}] against it plus the sha256 of the
+    result, or content (the whole file)}. Returns {ok, sha256} with the new
+    base, or 409 {conflict, current_sha256} if the file changed on the
+    server. A form post with path and content still saves unconditionally.
+    """
     server = GameServer.query.get_or_404(server_id)
-    remote_path = request.form.get('path', '')
-    content = request.form.get('content', '')
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {'path': request.form.get('path', ''), 'content': request.form.get('content', '')}
+    remote_path = data.get('path') or ''
+    edits = data.get('edits')
+    content = data.get('content')
 
     if not remote_path:
         return jsonify({'error': 'No path specified'}), 400
+    if (edits is None) == (content is None):
+        return jsonify({'error': 'Send either edits or content'}), 400
+    if edits is not None and (not isinstance(edits, list) or not data.get('base_sha256') or not data.get('sha256')):
+        return jsonify({'error': 'edits must be a list and need base_sha256 and sha256'}), 400
 
     try:
-        client, sftp = ssh_mgr.get_sftp(server.ip_address)
-        try:
-            with sftp.file(remote_path, 'w') as f:
-                f.write(content)
-        finally:
-            sftp.close()
-            client.close()
+        checksum = save_remote_file(
+            server, remote_path, data.get('base_sha256'),
+            content=content.encode('utf-8') if content is not None else None,
+            edits=edits,
+            result_sha256=data.get('sha256'),
+        )
+    except SaveConflict as e:
+        return jsonify({'error': str(e), 'conflict': True, 'current_sha256': e.current_sha256}), 409
+    except EditError as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-    return jsonify({'ok': True})
+    return jsonify({'ok': True, 'sha256': checksum})
@@ -1,15 +1,40 @@
 import os
+import secrets
 
 from flask import render_template, request, redirect, url_for, flash, current_app
+from sqlalchemy.exc import IntegrityError
 from app.blueprints.servers import bp
 from app.models.server import GameServer
 from app.extensions import db
 
+# Upper bound on extra ports reserved alongside an auto-assigned game port
+_MAX_RESERVED_PORTS = 8
+
 
 @bp.route('/')
 def list_servers():
-    servers = GameServer.query.order_by(GameServer.created_at.desc()).all()
-    return render_template('servers/list.html', servers=servers)
+    from app.services import server_listing
+
+    query = server_listing.filter_servers(request.args)
+    try:
+        servers, next_cursor = server_listing.paginate(
+            query, request.args.get('cursor'), current_app.config['SERVER_LIST_PAGE_SIZE'],
+        )
+    except ValueError:
+        # Stale or hand-edited cursor: start from the first page
+        servers, next_cursor = server_listing.paginate(query, None, current_app.config['SERVER_LIST_PAGE_SIZE'])
+    filters = {k: request.args.get(k, '') for k in ('q', *server_listing.FILTER_COLUMNS)}
+    return render_template(
+        'servers/list.html',
+        servers=servers,
+        next_cursor=next_cursor,
+        filters=filters,
+        active_filters={k: v for k, v in filters.items() if v},
+        is_first_page=not request.args.get('cursor'),
+        matching=query.order_by(None).count(),
+        running_matching=server_listing.status_counts(query).get('running', 0),
+        options=server_listing.filter_options(),
+    )
 
 
 @bp.route('/create', methods=['GET', 'POST'])
@@ -17,9 +42,12 @@ def create_server():
     from app.services.proxmox import ProxmoxService
     from app.services.ssh import SSHManager
     from app.services.minecraft import MinecraftService
+    from app.services.ip_allocator import IpAllocator
+    from app.services.port_allocator import PortAllocator
     import uuid, threading
 
     proxmox = ProxmoxService()
+    ip_allocator = IpAllocator()
     ssh_mgr = SSHManager()
     mc_svc = MinecraftService()
 
@@ -51,10 +79,11 @@ def create_server():
             return redirect(url_for('servers.create_server'))
         import_file = request.files.get('import_archive')
         if not import_file or not import_file.filename:
-            flash('A .zip archive is required for imported servers.', 'error')
+            flash('A server archive is required for imported servers.', 'error')
             return redirect(url_for('servers.create_server'))
-        if not import_file.filename.lower().endswith('.zip'):
-            flash('Only .zip archives are supported for import.', 'error')
+        archive_ext = mc_svc.get_import_archive_extension(import_file.filename)
+        if not archive_ext:
+            flash('Only .zip, .tar.gz and .tar.zst archives are supported for import.', 'error')
             return redirect(url_for('servers.create_server'))
 
     server_id = str(uuid.uuid4())
@@ -62,33 +91,46 @@ def create_server():
     hostname = f'PGSM-{game_code}-{partial_uuid}'
     ha_enabled = 'ha_enabled' in form
 
-    # Save uploaded zip before any error that would redirect, so we have the path ready
+    # Spool the uploaded archive before any error that would redirect, so we have
+    # the path ready. The container doesn't exist yet, so this is the one copy
+    # held on the controller until provisioning streams it into /PGSM.
     import_archive_path = None
     if server_type == 'import':
         uploads_dir = os.path.join(current_app.instance_path, 'uploads')
         os.makedirs(uploads_dir, exist_ok=True)
-        import_archive_path = os.path.join(uploads_dir, f'{server_id}.zip')
-        import_file.save(import_archive_path)
+        import_archive_path = os.path.join(uploads_dir, f'{server_id}{archive_ext}')
+        import_file.save(import_archive_path, buffer_size=1024 * 1024)
+
+    cfg = current_app.config
+    # Auto: the allocator picks the lowest free block in the game's port range,
+    # optionally reserving extra ports (e.g. query + RCON) right after it
+    port_auto = 'game_port_auto' in form
+    reserve_ports = min(max(int(form.get('reserve_ports') or 0), 0), _MAX_RESERVED_PORTS)
+    reserve_protocol = form.get('reserve_protocol', 'tcp')
+    if reserve_protocol not in ('tcp', 'udp', 'both'):
+        reserve_protocol = 'tcp'
+    game_port = None
+    if not port_auto:
+        game_port = int(form.get('game_port', cfg['SERVER_DEFAULT_GAME_PORT']))
+        port_conflict = GameServer.port_in_use_by(game_port, protocol='tcp')
+        if port_conflict:
+            if import_archive_path and os.path.exists(import_archive_path):
+                os.remove(import_archive_path)
+            flash(f'Port {game_port} is already in use by server "{port_conflict.name}".', 'error')
+            return redirect(url_for('servers.create_server'))
 
     try:
         ct_id = proxmox.get_next_ct_id()
         pubkey = ssh_mgr.ensure_keypair()
-        used_ips = [s.ip_address for s in GameServer.query.all()]
-        ip = proxmox.get_next_ip(used_ips)
+        # Atomically leases an address; released again if the create fails below
+        lease = ip_allocator.allocate(server_id)
+        ip = lease['ip']
     except Exception as e:
         if import_archive_path and os.path.exists(import_archive_path):
             os.remove(import_archive_path)
         flash(f'Setup error: {e}', 'error')
         return redirect(url_for('servers.create_server'))
 
-    cfg = current_app.config
-    game_port = int(form.get('game_port', cfg['SERVER_DEFAULT_GAME_PORT']))
-    port_conflict = GameServer.port_in_use_by(game_port)
-    if port_conflict:
-        if import_archive_path and os.path.exists(import_archive_path):
-            os.remove(import_archive_path)
-        flash(f'Port {game_port} is already in use by server "{port_conflict.name}".', 'error')
-        return redirect(url_for('servers.create_server'))
     # Import servers don't have a meaningful MC version; use 'import' as sentinel
     game_version = 'import' if server_type == 'import' else form.get('game_version', 'latest')
 
@@ -116,17 +158,40 @@ def create_server():
         # Modded / import fields
         fabric_loader_version=form.get('fabric_loader_version', '').strip() or None,
         forge_version=form.get('forge_version', '').strip() or None,
-        import_archive_url=import_archive_path,  # local path to uploaded zip
+        import_archive_url=import_archive_path,  # local path to uploaded archive
         custom_startup_command=form.get('custom_startup_command', '').strip() or None,
+        rcon_password=(
+            secrets.token_urlsafe(24)
+            if cfg['MINECRAFT_RCON_ENABLED'] and game_code == 'MCJAV' else None
+        ),
     )
-    db.session.add(server)
-    db.session.commit()
+    try:
+        if port_auto:
+            # Retries internally on collisions, so concurrent creates don't fail
+            PortAllocator().assign(server, count=1 + reserve_ports, protocol=reserve_protocol, primary=True)
+        else:
+            server.sync_port_registry()
+            db.session.add(server)
+            db.session.commit()
+    except (IntegrityError, RuntimeError) as e:
+        db.session.rollback()
+        ip_allocator.release(server_id)
+        db.session.commit()
+        if import_archive_path and os.path.exists(import_archive_path):
+            os.remove(import_archive_path)
+        if isinstance(e, IntegrityError):
+            # A concurrent create claimed the same port after our check
+            flash(f'Port {game_port} was just taken by another server.', 'error')
+        else:
+            flash(f'Port assignment failed: {e}', 'error')
+        return redirect(url_for('servers.create_server'))
 
     # Create LXC container
     try:
         proxmox.create_lxc(
             server.proxmox_node, ct_id, hostname, ip,
-            server.disk_gb, server.cores, server.memory_mb, pubkey
+            server.disk_gb, server.cores, server.memory_mb, pubkey,
+            bridge=lease['bridge'], prefixlen=lease['prefixlen'], gateway=lease['gateway'],
         )
     except Exception as e:
         server.status = 'error'
@@ -230,6 +295,9 @@ def update_settings(server_id):
         jv_raw = form.get('java_version_override', '').strip()
         server.java_version_override = int(jv_raw) if jv_raw else None
         server.custom_startup_command = form.get('custom_startup_command', '').strip() or None
+        # Turn on RCON with the rewritten server.properties (applies on next restart)
+        if current_app.config['MINECRAFT_RCON_ENABLED'] and not server.rcon_password:
+            server.rcon_password = secrets.token_urlsafe(24)
 
     db.session.commit()
 
@@ -337,10 +405,23 @@ def delete(server_id):
         pass  # CT may not exist or Proxmox unreachable
 
     try:
-        NginxService().remove_server(server)
+        # Don't hold the redirect for the reload; it is coalesced in the background
+        NginxService().remove_server(server, wait=False)
     except Exception:
         pass
 
+    from app.models.file_upload import FileUpload
+    from app.models.traffic import PortTraffic
+    from app.services.file_listing import listing_cache
+    from app.services.ip_allocator import IpAllocator
+    from app.services.rcon import rcon_pool
+    rcon_pool.close(server.id)
+    listing_cache.drop_server(server.id)
+    PortTraffic.query.filter_by(server_id=server.id).delete()
+    for upload in FileUpload.query.filter_by(server_id=server.id):
+        db.session.delete(upload)
+    IpAllocator().release(server.id)
+
     name = server.name
     db.session.delete(server)
     db.session.commit()
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -17,6 +18,9 @@ class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = 'sqlite:///pgsm.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Milliseconds a writer waits on a locked SQLite DB before failing. Provisioning
+    # threads, Socket.IO handlers and requests all write concurrently.
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLite_Busy_Timeout_MS', 15000))
 
     # Minecraft
     MINECRAFT_MANIFEST_URL = os.getenv(
@@ -24,12 +28,77 @@ class Config:
         'https://piston-meta.mojang.com/mc/game/version_manifest.json'
     )
 
+    # Seconds before cached Mojang/Forge/Fabric metadata is revalidated upstream
+    METADATA_CACHE_TTL = int(os.getenv('Metadata_Cache_TTL', 600))
+
     # SSH keypair
     SSH_KEY_PATH = os.getenv('SSH_Key_Path', 'keys/pgsm_rsa')
 
     # Nginx — must be included inside the stream {} block in nginx.conf:
     #   stream { include /etc/nginx/stream.d/*.conf; }
     NGINX_CONF_DIR = os.getenv('Nginx_Conf_Dir', '/etc/nginx/stream.d')
+    # Reload requests within this many seconds of each other are merged into one
+    NGINX_RELOAD_DEBOUNCE = float(os.getenv('Nginx_Reload_Debounce', 0.5))
+    # Upper bound on how long a burst of changes can postpone the reload
+    NGINX_RELOAD_MAX_DELAY = float(os.getenv('Nginx_Reload_Max_Delay', 3.0))
+    # Stream access log written by the PGSM server blocks and tailed for per-port traffic
+    NGINX_TRAFFIC_LOG = os.getenv('Nginx_Traffic_Log', '/var/log/nginx/pgsm-stream.log')
+    # Seconds between traffic log polls
+    TRAFFIC_TAIL_INTERVAL = int(os.getenv('Traffic_Tail_Interval', 30))
+
+    # Console: scrollback replayed to new viewers, and how long a console stays
+    # attached after its last viewer leaves (instant reconnects)
+    CONSOLE_SCROLLBACK_BYTES = int(os.getenv('Console_Scrollback_Bytes', 256 * 1024))
+    CONSOLE_GRACE_SECONDS = int(os.getenv('Console_Grace_Seconds', 60))
+    # zlib-compress large console frames for clients on the polling transport
+    # (WebSocket clients already get permessage-deflate)
+    CONSOLE_COMPRESSION = os.getenv('Console_Compression', 'true').lower() == 'true'
+
+    # Console log archive: gzipped segments per server on the controller,
+    # searchable via /api/console/search. Empty dir = <instance>/console_archive
+    CONSOLE_ARCHIVE_ENABLED = os.getenv('Console_Archive_Enabled', 'true').lower() == 'true'
+    CONSOLE_ARCHIVE_DIR = os.getenv('Console_Archive_Dir') or None
+    CONSOLE_ARCHIVE_SEGMENT_BYTES = int(os.getenv('Console_Archive_Segment_Bytes', 4 * 1024 * 1024))
+    CONSOLE_ARCHIVE_SEGMENT_SECONDS = int(os.getenv('Console_Archive_Segment_Seconds', 3600))
+    CONSOLE_ARCHIVE_RETENTION_DAYS = int(os.getenv('Console_Archive_Retention_Days', 30))
+    # Keep every running server's console attached so output is archived even
+    # when nobody has the console open (one idle SSH channel per server)
+    CONSOLE_ARCHIVE_ALWAYS_ATTACHED = os.getenv('Console_Archive_Always_Attached', 'false').lower() == 'true'
+
+    # Most servers a broadcast console command is sent to at once. SSH sends
+    # run in eventlet's tpool (EVENTLET_THREADPOOL_SIZE, default 20 threads).
+    CONSOLE_BROADCAST_CONCURRENCY = int(os.getenv('Console_Broadcast_Concurrency', 16))
+
+    # Seconds a file browser directory listing is reused (PGSM's own writes
+    # invalidate it immediately; 0 disables the cache)
+    FILE_LIST_CACHE_SECONDS = int(os.getenv('File_List_Cache_Seconds', 10))
+    # Chunked uploads in the file browser: bytes per part (the browser sends a
+    # few in parallel), and hours an unfinished upload is kept for resuming
+    FILE_UPLOAD_PART_BYTES = int(os.getenv('File_Upload_Part_Bytes', 8 * 1024 * 1024))
+    FILE_UPLOAD_EXPIRE_HOURS = int(os.getenv('File_Upload_Expire_Hours', 24))
+    # File content search: seconds the remote find/grep may run, most matches
+    # one search returns, and servers searched at once in a multi-server search
+    FILE_SEARCH_TIMEOUT = int(os.getenv('File_Search_Timeout', 30))
+    FILE_SEARCH_MAX_RESULTS = int(os.getenv('File_Search_Max_Results', 1000))
+    FILE_SEARCH_CONCURRENCY = int(os.getenv('File_Search_Concurrency', 8))
+
+    # Deduplicated /PGSM backups on the controller. Empty dir = <instance>/backups.
+    # After each backup a server keeps its last N backups plus the newest of
+    # each of the last D days and W weeks; unreferenced chunks are deleted.
+    # Interval > 0 backs up every running or stopped server that often.
+    BACKUP_DIR = os.getenv('Backup_Dir') or None
+    BACKUP_KEEP_LAST = int(os.getenv('Backup_Keep_Last', 7))
+    BACKUP_KEEP_DAILY = int(os.getenv('Backup_Keep_Daily', 7))
+    BACKUP_KEEP_WEEKLY = int(os.getenv('Backup_Keep_Weekly', 4))
+    BACKUP_INTERVAL_HOURS = int(os.getenv('Backup_Interval_Hours', 0))
+    # zstd level for stored chunks (1-19; higher is smaller and slower)
+    BACKUP_COMPRESSION_LEVEL = int(os.getenv('Backup_Compression_Level', 3))
+
+    # Enable RCON on new Minecraft Java servers (and existing ones when their
+    # settings are next saved). Used as a low-latency console input path;
+    # the port is only reached over the VLAN, never proxied by nginx.
+    MINECRAFT_RCON_ENABLED = os.getenv('Minecraft_RCON_Enabled', 'false').lower() == 'true'
+    MINECRAFT_RCON_PORT = int(os.getenv('Minecraft_RCON_Port', 25575))
 
     # PGSM VLAN network
     PGSM_VLAN_SUBNET = os.getenv('PGSM_VLAN_Subnet', '172.16.0.0/24')
@@ -37,6 +106,20 @@ class Config:
     # First IP PGSM is allowed to assign to game server containers.
     # IPs below this (e.g. Proxmox nodes, router) are left alone.
     PGSM_VLAN_IP_START = os.getenv('PGSM_VLAN_IP_Start', '172.16.0.10')
+    # Additional VLAN pools (JSON list), tried in order once the default pool is full.
+    # name, subnet, gateway and start are required; bridge defaults to PGSM:
+    #   [{"name": "vlan2", "subnet": "172.17.0.0/16", "gateway": "172.17.0.1",
+    #     "start": "172.17.0.10", "bridge": "PGSM2"}]
+    PGSM_VLAN_EXTRA_POOLS = json.loads(os.getenv('PGSM_VLAN_Extra_Pools', '[]'))
+
+    # Public port ranges used for automatic port assignment (JSON), keyed by
+    # game code with a 'default' fallback: {"MCJAV": [25565, 25999], ...}
+    PGSM_PORT_RANGES = {
+        'MCJAV': [25565, 25999],
+        'MCBED': [19132, 19532],
+        'default': [30000, 39999],
+        **json.loads(os.getenv('PGSM_Port_Ranges', '{}')),
+    }
 
     # Proxmox LXC template (must exist in Proxmox storage)
     PGSM_LXC_TEMPLATE = os.getenv(
@@ -56,3 +139,6 @@ class Config:
     SERVER_DEFAULT_DIFFICULTY    = os.getenv('Server_Default_Difficulty', 'normal')
     SERVER_DEFAULT_SERVER_TYPE   = os.getenv('Server_Default_Server_Type', 'vanilla')
     SERVER_DEFAULT_HA_ENABLED    = os.getenv('Server_Default_HA_Enabled', 'true').lower() == 'true'
+
+    # Rows per page on the server list (dashboard cards show a fixed 12)
+    SERVER_LIST_PAGE_SIZE = int(os.getenv('Server_List_Page_Size', 50))
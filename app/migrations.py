@@ -0,0 +1,296 @@
+"""
+Versioned schema and data migrations.
+
+Applied versions are recorded in the schema_migrations table, so a boot with
+everything applied costs a single `SELECT MAX(version)` query. Pending
+migrations run in order, each exactly once; failures are raised rather than
+swallowed.
+
+Every migration must mean the same thing on whatever DB it meets, so the
+history replays on a fresh DB and on one created by any earlier release:
+migration 1 creates game_servers as it was before versioned migrations
+(frozen DDL, not the current model), new tables are created by name, and
+data migrations use SQL on the columns that exist at their version, never
+the ORM models (which select every current column). Use _add_column()
+(which checks first) for new columns, never a bare ALTER TABLE.
+"""
+import ipaddress
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+
+log = logging.getLogger(__name__)
+
+# Rows loaded per transaction by data migrations
+_BATCH_SIZE = 500
+
+
+def run_migrations() -> None:
+    """Applies every pending migration in MIGRATIONS. Needs an app context."""
+    try:
+        current = db.session.execute(db.text('SELECT MAX(version) FROM schema_migrations')).scalar() or 0
+    except OperationalError:
+        db.session.rollback()
+        db.session.execute(db.text(
+            'CREATE TABLE schema_migrations ('
+            'version INTEGER PRIMARY KEY, '
+            'name VARCHAR(128) NOT NULL, '
+            'applied_at DATETIME NOT NULL)'
+        ))
+        db.session.commit()
+        current = 0
+
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        log.info('Applying migration %d: %s', version, name)
+        migrate()
+        db.session.execute(
+            db.text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+            {'v': version, 'n': name, 't': datetime.utcnow()},
+        )
+        db.session.commit()
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+# game_servers before versioned migrations. Frozen: later columns and indexes
+# come from their own migrations.
+_BASELINE_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS game_servers (
+    id VARCHAR(36) NOT NULL,
+    name VARCHAR(128) NOT NULL,
+    game_code VARCHAR(16) NOT NULL,
+    server_type VARCHAR(32) NOT NULL,
+    game_version VARCHAR(32) NOT NULL,
+    ct_id INTEGER NOT NULL,
+    proxmox_node VARCHAR(64) NOT NULL,
+    hostname VARCHAR(128) NOT NULL,
+    ip_address VARCHAR(45) NOT NULL,
+    ha_enabled BOOLEAN,
+    disk_gb INTEGER NOT NULL,
+    cores INTEGER NOT NULL,
+    memory_mb INTEGER NOT NULL,
+    game_port INTEGER NOT NULL,
+    extra_ports JSON,
+    motd VARCHAR(256),
+    render_distance INTEGER,
+    spawn_protection INTEGER,
+    difficulty VARCHAR(16),
+    hardcore BOOLEAN,
+    java_version_override INTEGER,
+    custom_startup_command VARCHAR(512),
+    fabric_loader_version VARCHAR(32),
+    forge_version VARCHAR(32),
+    import_archive_url VARCHAR(512),
+    status VARCHAR(32),
+    created_at DATETIME,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    UNIQUE (ct_id)
+)"""
+
+
+def _create_baseline_schema() -> None:
+    db.session.execute(db.text(_BASELINE_SCHEMA))
+
+
+def _create_tables(*tables: str):
+    """Returns a migration that creates *tables* from their models unless they
+    exist. Only for tables no later migration alters: a table's model must
+    still describe it as it was at this version."""
+    def migrate():
+        # Import models so every table is registered on the metadata
+        import app.models  # noqa: F401
+        db.metadata.create_all(
+            bind=db.session.connection(),
+            tables=[db.metadata.tables[name] for name in tables],
+        )
+    return migrate
+
+
+def _add_column(table: str, column: str, ddl: str):
+    """Returns a migration that adds *column* to *table* unless it already exists."""
+    def migrate():
+        columns = {row[1] for row in db.session.execute(db.text(f'PRAGMA table_info({table})'))}
+        if column not in columns:
+            db.session.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return migrate
+
+
+def _sql(*statements: str):
+    """Returns a migration that executes *statements* in order."""
+    def migrate():
+        for stmt in statements:
+            db.session.execute(db.text(stmt))
+    return migrate
+
+
+def _batched(table: str, columns: str):
+    """Yields all (id, *columns) rows of *table* in id order, _BATCH_SIZE at a time.
+
+    Uses keyset pagination so each batch is an indexed range scan; callers
+    commit between batches to keep transactions and memory bounded.
+    """
+    last_id = None
+    while True:
+        where = 'WHERE id > :last ' if last_id is not None else ''
+        rows = db.session.execute(
+            db.text(f'SELECT id, {columns} FROM {table} {where}ORDER BY id LIMIT :limit'),
+            {'last': last_id, 'limit': _BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _json(value):
+    """Decodes a JSON column read through db.text() (SQLite returns the text)."""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+# ── Data migrations ───────────────────────────────────────────────────────────
+
+def _migrate_extra_ports_format() -> None:
+    """Convert extra_ports from [int, ...] to [{"port": int, "protocol": "tcp"}, ...]."""
+    for batch in _batched('game_servers', 'extra_ports'):
+        for server_id, extra_ports in batch:
+            extra_ports = _json(extra_ports)
+            if not extra_ports or all(isinstance(e, dict) for e in extra_ports):
+                continue
+            converted = [{'port': e, 'protocol': 'tcp'} if isinstance(e, int) else e for e in extra_ports]
+            db.session.execute(
+                db.text('UPDATE game_servers SET extra_ports = :ports WHERE id = :id'),
+                {'ports': json.dumps(converted), 'id': server_id},
+            )
+        db.session.commit()
+
+
+def _backfill_server_ports() -> None:
+    """Populate server_ports from game_port/extra_ports for existing servers
+    (the rows GameServer.sync_port_registry() would keep)."""
+    from sqlalchemy.exc import IntegrityError
+
+    for batch in _batched('game_servers', 'game_port, extra_ports'):
+        for server_id, game_port, extra_ports in batch:
+            entries = {game_port: 'tcp'}
+            for entry in _json(extra_ports) or []:
+                if isinstance(entry, dict):
+                    entries[entry['port']] = entry.get('protocol', 'tcp')
+                else:
+                    entries[entry] = 'tcp'
+            rows = [
+                {'server_id': server_id, 'port': port, 'protocol': proto}
+                for port, protocol in sorted(entries.items())
+                for proto in (('tcp', 'udp') if protocol == 'both' else (protocol,))
+            ]
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.text('DELETE FROM server_ports WHERE server_id = :id'), {'id': server_id})
+                    db.session.execute(
+                        db.text('INSERT INTO server_ports (server_id, port, protocol) VALUES (:server_id, :port, :protocol)'),
+                        rows,
+                    )
+            except IntegrityError:
+                # Legacy data with a duplicate port; leave this server
+                # unregistered rather than refusing to boot.
+                log.warning('Port conflict while registering ports for server %s', server_id)
+        db.session.commit()
+
+
+def _seed_ip_leases() -> None:
+    """Record existing servers' addresses in ip_leases and queue the gaps below
+    them on the free list, so the allocator continues after the current fleet."""
+    from app.services.ip_allocator import IpAllocator
+
+    pools = IpAllocator().get_pools()
+    networks = [(pool, ipaddress.IPv4Network(pool['subnet'])) for pool in pools]
+    leased: dict[str, dict[int, str]] = {}
+    for server_id, ip in db.session.execute(db.text('SELECT id, ip_address FROM game_servers')):
+        try:
+            address = ipaddress.IPv4Address(ip)
+        except ValueError:
+            continue
+        pool = next((p for p, net in networks if address in net), None)
+        if pool is not None:
+            leased.setdefault(pool['name'], {})[int(address)] = server_id
+
+    now = datetime.utcnow()
+    for pool, network in networks:
+        start = max(int(ipaddress.IPv4Address(pool['start'])), int(network.network_address) + 1)
+        next_ip = db.session.execute(
+            db.text('SELECT next_ip FROM ip_pools WHERE name = :name'), {'name': pool['name']},
+        ).scalar()
+        if next_ip is None:
+            next_ip = start
+            db.session.execute(
+                db.text('INSERT INTO ip_pools (name, subnet, next_ip, last_ip) VALUES (:name, :subnet, :next, :last)'),
+                {'name': pool['name'], 'subnet': pool['subnet'], 'next': start,
+                 'last': int(network.broadcast_address) - 1},
+            )
+        by_ip = leased.get(pool['name'])
+        if not by_ip:
+            continue
+        gateway = int(ipaddress.IPv4Address(pool['gateway'])) if pool.get('gateway') else None
+        top = max(by_ip)
+        rows = [
+            {'pool': pool['name'], 'ip': str(ipaddress.IPv4Address(ip_int)), 'ip_int': ip_int,
+             'server_id': by_ip.get(ip_int), 'leased_at': now if ip_int in by_ip else None}
+            for ip_int in range(next_ip, top + 1) if ip_int != gateway
+        ]
+        if rows:
+            db.session.execute(
+                db.text('INSERT INTO ip_leases (pool, ip, ip_int, server_id, leased_at) '
+                        'VALUES (:pool, :ip, :ip_int, :server_id, :leased_at)'),
+                rows,
+            )
+        db.session.execute(
+            db.text('UPDATE ip_pools SET next_ip = :next WHERE name = :name'),
+            {'next': max(next_ip, top + 1), 'name': pool['name']},
+        )
+        db.session.commit()
+
+
+# (version, name, callable) — append only; never reorder or renumber.
+MIGRATIONS = [
+    (1, 'initial schema', _create_baseline_schema),
+    (2, 'extra_ports column for multi-port support',
+        _add_column('game_servers', 'extra_ports', 'JSON')),
+    (3, 'ha_enabled column for Proxmox HA registration',
+        _add_column('game_servers', 'ha_enabled', 'BOOLEAN DEFAULT 0')),
+    (4, 'java version override (NULL = auto)',
+        _add_column('game_servers', 'java_version_override', 'INTEGER')),
+    (5, 'custom startup command override (NULL = use script default)',
+        _add_column('game_servers', 'custom_startup_command', 'VARCHAR(512)')),
+    (6, 'Fabric loader version (NULL = latest)',
+        _add_column('game_servers', 'fabric_loader_version', 'VARCHAR(32)')),
+    (7, 'Forge version (NULL = recommended for MC version)',
+        _add_column('game_servers', 'forge_version', 'VARCHAR(32)')),
+    (8, 'import archive path (for import server type)',
+        _add_column('game_servers', 'import_archive_url', 'VARCHAR(512)')),
+    (9, 'extra_ports dict format', _migrate_extra_ports_format),
+    (10, 'indexes for list filters and IP lookups', _sql(
+        'CREATE INDEX IF NOT EXISTS ix_game_servers_ip_address ON game_servers (ip_address)',
+        'CREATE INDEX IF NOT EXISTS ix_game_servers_status ON game_servers (status)',
+        'CREATE INDEX IF NOT EXISTS ix_game_servers_proxmox_node ON game_servers (proxmox_node)',
+    )),
+    (11, 'server_ports registry and traffic accounting tables',
+        _create_tables('server_ports', 'port_traffic', 'traffic_log_state')),
+    (12, 'backfill server_ports', _backfill_server_ports),
+    (13, 'VLAN IP pools and leases', _create_tables('ip_pools', 'ip_leases')),
+    (14, 'seed ip_leases from existing servers', _seed_ip_leases),
+    (15, 'index for paginated server listings', _sql(
+        'CREATE INDEX IF NOT EXISTS ix_game_servers_created_id ON game_servers (created_at, id)',
+    )),
+    (16, 'RCON password (NULL = RCON disabled)',
+        _add_column('game_servers', 'rcon_password', 'VARCHAR(64)')),
+    (17, 'console log archive segments', _create_tables('console_log_segments')),
+    (18, 'chunked file uploads', _create_tables('file_uploads', 'file_upload_parts')),
+    (19, 'deduplicated backups',
+        _create_tables('backup_snapshots', 'backup_snapshot_chunks', 'backup_chunks')),
+]
@@ -1 +1,6 @@
-from app.models.server import GameServer
+from app.models.server import GameServer, ServerPort
+from app.models.traffic import PortTraffic, TrafficLogState
+from app.models.network import IpPool, IpLease
+from app.models.console_log import ConsoleLogSegment
+from app.models.file_upload import FileUpload, FileUploadPart
+from app.models.backup import BackupSnapshot, BackupSnapshotChunk, BackupChunk
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from app.extensions import db
+
+
+class BackupSnapshot(db.Model):
+    """One backup of a server's /PGSM: the tar stream of the directory, stored
+    as an ordered list of chunks (see BackupManager)."""
+    __tablename__ = 'backup_snapshots'
+    __table_args__ = (
+        db.Index('ix_backup_snapshots_server_created', 'server_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: backups outlive the server they were taken from
+    server_id = db.Column(db.String(36), nullable=False)
+    server_name = db.Column(db.String(128))
+    source_path = db.Column(db.String(1024), nullable=False, default='/PGSM')
+    status = db.Column(db.String(16), nullable=False, default='running')  # running | complete | failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    # Size of the tar stream, bytes received over SSH, and how much of the
+    # stream was new to the chunk store (before and after compression)
+    raw_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    transferred_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    new_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    stored_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+    new_chunk_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'server_id': self.server_id,
+            'server_name': self.server_name,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() + 'Z',
+            'finished_at': self.finished_at.isoformat() + 'Z' if self.finished_at else None,
+            'raw_bytes': self.raw_bytes,
+            'transferred_bytes': self.transferred_bytes,
+            'new_bytes': self.new_bytes,
+            'stored_bytes': self.stored_bytes,
+            'chunk_count': self.chunk_count,
+            'new_chunk_count': self.new_chunk_count,
+        }
+
+    def __repr__(self):
+        return f'<BackupSnapshot {self.id} {self.server_id} {self.status}>'
+
+
+class BackupSnapshotChunk(db.Model):
+    """Position *seq* of a snapshot's stream is chunk *digest*."""
+    __tablename__ = 'backup_snapshot_chunks'
+
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('backup_snapshots.id'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    # Indexed for garbage collection (chunks no snapshot refers to)
+    digest = db.Column(db.String(64), nullable=False, index=True)
+
+
+class BackupChunk(db.Model):
+    """A chunk in the content-addressed store, shared by every snapshot
+    (of any server) whose stream contains it."""
+    __tablename__ = 'backup_chunks'
+
+    digest = db.Column(db.String(64), primary_key=True)   # SHA-256 of the raw bytes
+    size = db.Column(db.Integer, nullable=False)          # raw
+    stored_size = db.Column(db.Integer, nullable=False)   # zstd-compressed, on disk
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from app.extensions import db
+
+
+class ConsoleLogSegment(db.Model):
+    """A closed, gzipped file of archived console lines (see ConsoleArchive)."""
+    __tablename__ = 'console_log_segments'
+    __table_args__ = (
+        # Search: a server's segments overlapping a time range, newest first
+        db.Index('ix_console_log_segments_server_time', 'server_id', 'started_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.String(36), nullable=False)
+    # File name inside <archive dir>/<server_id>/
+    filename = db.Column(db.String(128), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)   # first line (UTC)
+    ended_at = db.Column(db.DateTime, nullable=False)                 # last line (UTC)
+    lines = db.Column(db.Integer, nullable=False, default=0)
+    raw_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    stored_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    # Bloom filter over the segment's lowercased words; lets search skip the file
+    bloom = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<ConsoleLogSegment {self.server_id} {self.started_at}–{self.ended_at}>'
@@ -0,0 +1,44 @@
+import uuid
+from datetime import datetime
+
+from app.extensions import db
+
+
+class FileUpload(db.Model):
+    """A chunked upload in progress; its data lives in temp_path on the server
+    until it is committed (see UploadManager)."""
+    __tablename__ = 'file_uploads'
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    server_id = db.Column(db.String(36), nullable=False, index=True)
+    dest_path = db.Column(db.String(1024), nullable=False)
+    temp_path = db.Column(db.String(1024), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    part_size = db.Column(db.Integer, nullable=False)
+    # Browser-side identity of the source file (name/size/mtime), used to resume
+    fingerprint = db.Column(db.String(256), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    parts = db.relationship('FileUploadPart', cascade='all, delete-orphan', lazy='select')
+
+    @property
+    def parts_total(self) -> int:
+        return max(1, -(-self.size // self.part_size))
+
+    def part_range(self, index: int) -> tuple[int, int]:
+        """(offset, length) of part *index*."""
+        offset = index * self.part_size
+        return offset, max(0, min(self.part_size, self.size - offset))
+
+    def __repr__(self):
+        return f'<FileUpload {self.id} {self.server_id}:{self.dest_path}>'
+
+
+class FileUploadPart(db.Model):
+    """A part of a FileUpload that has been written and verified."""
+    __tablename__ = 'file_upload_parts'
+
+    upload_id = db.Column(db.String(32), db.ForeignKey('file_uploads.id'), primary_key=True)
+    index = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
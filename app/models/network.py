@@ -0,0 +1,34 @@
+from app.extensions import db
+
+
+class IpPool(db.Model):
+    """Allocation cursor for one VLAN pool (see IpAllocator)."""
+    __tablename__ = 'ip_pools'
+
+    name = db.Column(db.String(64), primary_key=True)
+    subnet = db.Column(db.String(64), nullable=False)
+    # Integer form of the next never-allocated address and the last usable one
+    next_ip = db.Column(db.BigInteger, nullable=False)
+    last_ip = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f'<IpPool {self.name} {self.subnet}>'
+
+
+class IpLease(db.Model):
+    """An address handed out from a pool. server_id NULL = released (on the free list)."""
+    __tablename__ = 'ip_leases'
+    __table_args__ = (
+        # Free-list lookup: lowest released address in a pool
+        db.Index('ix_ip_leases_free', 'pool', 'server_id', 'ip_int'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    pool = db.Column(db.String(64), nullable=False)
+    ip = db.Column(db.String(45), nullable=False, unique=True)
+    ip_int = db.Column(db.BigInteger, nullable=False)
+    server_id = db.Column(db.String(36), nullable=True, index=True)
+    leased_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<IpLease {self.ip} ({self.pool}) -> {self.server_id}>'
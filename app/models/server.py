@@ -28,6 +28,10 @@ def _resolve_java_version(mc_version: str) -> int:
 
 class GameServer(db.Model):
     __tablename__ = 'game_servers'
+    __table_args__ = (
+        # Keyset pagination order for server listings (newest first)
+        db.Index('ix_game_servers_created_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(128), nullable=False)
@@ -39,9 +43,9 @@ class GameServer(db.Model):
 
     # Proxmox / Container
     ct_id = db.Column(db.Integer, nullable=False, unique=True)
-    proxmox_node = db.Column(db.String(64), nullable=False)
+    proxmox_node = db.Column(db.String(64), nullable=False, index=True)
     hostname = db.Column(db.String(128), nullable=False)    # PGSM-MCJAV-<PARTIAL_UUID>
-    ip_address = db.Column(db.String(45), nullable=False)   # IPv4
+    ip_address = db.Column(db.String(45), nullable=False, index=True)   # IPv4
     ha_enabled = db.Column(db.Boolean, default=False)       # Proxmox HA registration
 
     # Resources
@@ -53,6 +57,8 @@ class GameServer(db.Model):
     game_port = db.Column(db.Integer, nullable=False, default=25565)
     # Additional ports proxied through nginx (stored as JSON array, e.g. [25575, 19132])
     extra_ports = db.Column(db.JSON, nullable=True, default=list)
+    # Normalized registry of game_port + extra_ports; see sync_port_registry()
+    ports = db.relationship('ServerPort', backref='server', cascade='all, delete-orphan', lazy='select')
 
     # Minecraft settings
     motd = db.Column(db.String(256), nullable=True)
@@ -70,9 +76,11 @@ class GameServer(db.Model):
     forge_version = db.Column(db.String(32), nullable=True)
     # Import: URL to a .zip or .tar.gz server archive.
     import_archive_url = db.Column(db.String(512), nullable=True)
+    # RCON password written to server.properties. NULL = RCON disabled.
+    rcon_password = db.Column(db.String(64), nullable=True)
 
     # Lifecycle
-    status = db.Column(db.String(32), default='creating')  # creating, stopped, running, error
+    status = db.Column(db.String(32), default='creating', index=True)  # creating, stopped, running, error
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -102,22 +110,40 @@ class GameServer(db.Model):
                 seen[entry] = {'port': entry, 'protocol': 'tcp'}
         return sorted(seen.values(), key=lambda x: x['port'])
 
+    def sync_port_registry(self) -> None:
+        """Rebuilds the server_ports rows from game_port + extra_ports.
+
+        Call after changing either and before committing. 'both' expands to one
+        tcp and one udp row; the (port, protocol) unique constraint then makes a
+        racing commit for the same port fail with IntegrityError.
+        """
+        wanted = set()
+        for entry in self.all_ports_with_protocols:
+            protocol = entry.get('protocol', 'tcp')
+            for proto in (('tcp', 'udp') if protocol == 'both' else (protocol,)):
+                wanted.add((entry['port'], proto))
+        current = {(row.port, row.protocol): row for row in self.ports}
+        for key, row in current.items():
+            if key not in wanted:
+                self.ports.remove(row)
+        for port, proto in sorted(wanted - current.keys()):
+            self.ports.append(ServerPort(port=port, protocol=proto))
+
     @classmethod
-    def port_in_use_by(cls, port: int, exclude_id: str = None) -> 'GameServer | None':
-        """Returns the first server using *port* (as game_port or extra port), or None if free.
+    def port_in_use_by(cls, port: int, protocol: str = 'both', exclude_id: str = None) -> 'GameServer | None':
+        """Returns the server holding *port* for any overlapping protocol, or None if free.
 
-        Pass exclude_id to skip a specific server (e.g. the server being edited).
+        A single indexed lookup against server_ports. Pass exclude_id to skip a
+        specific server (e.g. the server being edited).
         """
-        for s in cls.query.all():
-            if exclude_id and s.id == exclude_id:
-                continue
-            if s.game_port == port:
-                return s
-            for entry in (s.extra_ports or []):
-                p = entry['port'] if isinstance(entry, dict) else entry
-                if p == port:
-                    return s
-        return None
+        protocols = ('tcp', 'udp') if protocol == 'both' else (protocol,)
+        query = (
+            cls.query.join(ServerPort)
+            .filter(ServerPort.port == port, ServerPort.protocol.in_(protocols))
+        )
+        if exclude_id:
+            query = query.filter(ServerPort.server_id != exclude_id)
+        return query.first()
 
     @property
     def partial_uuid(self):
@@ -144,3 +170,19 @@ class GameServer(db.Model):
             'creating': 'badge-creating',
             'error': 'badge-error',
         }.get(self.status, 'badge-unknown')
+
+
+class ServerPort(db.Model):
+    """One (port, protocol) pair claimed by a server — the source of truth for conflicts."""
+    __tablename__ = 'server_ports'
+    __table_args__ = (
+        db.UniqueConstraint('port', 'protocol', name='uq_server_ports_port_protocol'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.String(36), db.ForeignKey('game_servers.id'), nullable=False, index=True)
+    port = db.Column(db.Integer, nullable=False)
+    protocol = db.Column(db.String(8), nullable=False)  # tcp, udp
+
+    def __repr__(self):
+        return f'<ServerPort {self.port}/{self.protocol} -> {self.server_id}>'
@@ -0,0 +1,35 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class PortTraffic(db.Model):
+    """Hourly traffic counters per server port, aggregated from the nginx stream access log."""
+    __tablename__ = 'port_traffic'
+    __table_args__ = (
+        db.UniqueConstraint('server_id', 'port', 'protocol', 'bucket', name='uq_port_traffic_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.String(36), nullable=False, index=True)
+    port = db.Column(db.Integer, nullable=False)
+    protocol = db.Column(db.String(8), nullable=False)      # tcp, udp
+    bucket = db.Column(db.DateTime, nullable=False)         # start of the hour (UTC)
+
+    bytes_in = db.Column(db.BigInteger, nullable=False, default=0)   # client → server
+    bytes_out = db.Column(db.BigInteger, nullable=False, default=0)  # server → client
+    connections = db.Column(db.Integer, nullable=False, default=0)
+    session_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<PortTraffic {self.server_id}:{self.port}/{self.protocol} @ {self.bucket}>'
+
+
+class TrafficLogState(db.Model):
+    """Read position of the traffic log tailer, committed together with the counters
+    it produced so a restart never counts the same log line twice."""
+    __tablename__ = 'traffic_log_state'
+
+    path = db.Column(db.String(512), primary_key=True)
+    inode = db.Column(db.Integer, nullable=True)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,124 @@
+"""
+Content-defined chunking and the content-addressed chunk store behind backups.
+
+ContentChunker cuts a byte stream where its content says so, not at fixed
+offsets, so inserting or removing bytes only changes the chunks around the
+edit: the rest of a tar stream (unchanged region files, jars) produces the
+same chunks as last time, wherever they now sit in the stream.
+
+A position is a cut point when the 8 bytes before it all map to 1 under a
+fixed random byte -> bit table (bytes.translate + find, so the scan runs at
+C speed), and the CRC-32 of the 48 bytes before it has its low bits clear.
+Within a long run of matching bytes only the first position is tried, so
+constant data (zero-filled gaps) doesn't cost a CRC per byte. Chunks are
+kept between 256 KB and 4 MB, about 1 MB on average for compressed data
+such as region files.
+
+ChunkStore keeps each chunk once, zstd-compressed, under its SHA-256:
+<dir>/chunks/<2 hex>/<64 hex>.zst. Writes go to a temp file that is renamed
+into place, so a chunk file is either complete or absent.
+"""
+import hashlib
+import os
+import zlib
+
+import zstandard
+
+# Byte -> 0/1 used to pre-select cut points. Part of the chunk format: changing
+# it changes every cut point and so defeats dedup against existing backups.
+_TABLE = bytes(hashlib.sha256(b'pgsm-cdc-%d' % b).digest()[0] & 1 for b in range(256))
+_RUN = b'\x01' * 8
+# Bytes hashed to confirm a candidate cut point
+_WINDOW = 48
+
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+# About 1 in 2**9 positions starts a run; the CRC mask makes up the rest of ~1 MB
+_CRC_MASK = (1 << 11) - 1
+
+
+class ContentChunker:
+    """Splits a stream fed in arbitrary pieces into content-defined chunks."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Adds *data* and returns the chunks it completed."""
+        self._buffer += data
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return chunks
+            chunks.append(bytes(self._buffer[:cut]))
+            del self._buffer[:cut]
+
+    def finish(self) -> list[bytes]:
+        """Returns the last (possibly short) chunk at end of stream."""
+        chunks = [bytes(self._buffer)] if self._buffer else []
+        self._buffer = bytearray()
+        return chunks
+
+    def _find_cut(self) -> int | None:
+        buffer = self._buffer
+        if len(buffer) < MIN_CHUNK:
+            return None
+        # A run may start up to 8 bytes before MIN_CHUNK and complete on it
+        base = MIN_CHUNK - len(_RUN)
+        projected = bytes(buffer[base:MAX_CHUNK]).translate(_TABLE)
+        position = 0
+        while True:
+            start = projected.find(_RUN, position)
+            if start < 0:
+                break
+            cut = base + start + len(_RUN)
+            if not zlib.crc32(buffer[cut - _WINDOW:cut]) & _CRC_MASK:
+                return cut
+            # Skip the rest of this run
+            position = projected.find(b'\x00', start + len(_RUN))
+            if position < 0:
+                break
+        return MAX_CHUNK if len(buffer) >= MAX_CHUNK else None
+
+
+class ChunkStore:
+    """zstd-compressed chunks on the controller's disk, addressed by SHA-256."""
+
+    def __init__(self, directory: str, level: int = 3):
+        self.directory = directory
+        self.level = level
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'chunks', digest[:2], digest + '.zst')
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def put(self, digest: str, data: bytes) -> int:
+        """Stores *data* under *digest* and returns its compressed size."""
+        path = self.path(digest)
+        compressed = zstandard.ZstdCompressor(level=self.level).compress(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.{id(data):x}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        return len(compressed)
+
+    def get(self, digest: str) -> bytes:
+        """Returns the chunk's raw bytes; raises ValueError if the file is
+        corrupt (its content doesn't hash to *digest*)."""
+        with open(self.path(digest), 'rb') as f:
+            data = zstandard.ZstdDecompressor().decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f'Backup chunk {digest} is corrupt')
+        return data
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
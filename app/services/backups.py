@@ -0,0 +1,576 @@
+"""
+Incremental, deduplicated backups of game servers' /PGSM on the controller.
+
+A backup streams `tar -C /PGSM -cf - .` over one SSH exec (zstd-compressed
+in transit when the container has zstd) and cuts the tar stream into
+content-defined chunks (see backup_store). Each chunk is stored once under
+its SHA-256, whichever server or snapshot it came from; a snapshot is just
+its ordered list of chunk digests. Unchanged files therefore cost nothing
+but the transfer after the first backup, and worlds that share a modpack or
+a map share their chunks. While a running Minecraft Java server is backed up
+its autosave is off and the world has been flushed (save-off / save-all
+flush, then save-on), so tar doesn't read region files mid-write.
+
+Restoring streams the snapshot's chunks back into tar on the container,
+extracting into a staging directory inside /PGSM first. Only once tar
+succeeds are the live entries moved aside and the staged ones moved in; if
+that swap fails the old entries are moved back, and they are deleted only
+after it succeeded, so a failed restore leaves the server as it was. The
+server must be stopped.
+
+After each successful backup the server's snapshots are pruned (keep the
+last N, the newest per day and per ISO week for a number of days/weeks)
+and chunks no snapshot refers to are deleted. Optionally every running or
+stopped server is backed up every Backup_Interval_Hours.
+"""
+import hashlib
+import logging
+import os
+import shlex
+from datetime import datetime, timedelta
+
+import zstandard
+from eventlet import tpool
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from app.extensions import db, socketio
+from app.models.backup import BackupChunk, BackupSnapshot, BackupSnapshotChunk
+from app.services.backup_store import ChunkStore, ContentChunker
+from app.services.rcon import RconDeliveryError
+from app.services.ssh import SSHManager
+
+log = logging.getLogger(__name__)
+ssh_mgr = SSHManager()
+
+_SOURCE = '/PGSM'
+# Restores extract into /PGSM/<prefix><snapshot id>; never backed up
+_STAGING_PREFIX = '.pgsm-restore-'
+# Compressed bytes received per tpool hop while backing up
+_RECEIVE_BYTES = 4 * 1024 * 1024
+# Seconds without tar output before a backup is abandoned
+_IDLE_TIMEOUT = 300
+# Trailing tar error output kept for the failure message
+_STDERR_BYTES = 4096
+# Seconds to wait for "Saved the game" after save-all flush (best effort)
+_SAVE_TIMEOUT = 60
+_SAVE_LOG = '/PGSM/logs/latest.log'
+# Scheduler: how often due servers are looked for, and how many it backs up at once
+_SCHEDULE_INTERVAL = 600
+_SCHEDULED_CONCURRENCY = 2
+
+# Stage, then swap: the live entries are moved aside (renames within /PGSM)
+# and only deleted once the staged ones are in; a failed swap moves them back.
+# If even that fails they are left in <stage>.old, which is never overwritten.
+_RESTORE_SCRIPT = '''\
+set -e
+root={root}; stage={stage}; old={stage}.old
+trap 'rm -rf "$stage"; rmdir "$old" 2>/dev/null || true' EXIT
+live() {{ find "$root" -mindepth 1 -maxdepth 1 ! -name {stage_name} ! -name {stage_name}.old "$@"; }}
+put_back() {{
+  if find "$old" -mindepth 1 -maxdepth 1 -exec mv -t "$root" {{}} +; then
+    echo "Restore failed while swapping in the backup; the previous files were put back" >&2
+  else
+    echo "Restore failed while swapping in the backup; the previous files are in $old" >&2
+  fi
+  exit 1
+}}
+if [ -e "$old" ] && ! rmdir "$old" 2>/dev/null; then
+  echo "$old holds files from an earlier failed restore; move them back first" >&2
+  exit 1
+fi
+rm -rf "$stage"; mkdir -p "$stage"
+tar -C "$stage"{compress} -xpf -
+mkdir "$old"
+live -exec mv -t "$old" {{}} + || put_back
+find "$stage" -mindepth 1 -maxdepth 1 -exec mv -t "$root" {{}} + || {{ live -exec rm -rf {{}} + || true; put_back; }}
+rm -rf "$old"
+'''
+
+
+class BackupError(ValueError):
+    """The backup or restore can't be started (already running, server not stopped, ...)."""
+
+
+class _SnapshotReader:
+    """A snapshot's tar stream as a file-like object for exec_stdin(),
+    zstd-compressed for the transfer when *compress* is set."""
+
+    def __init__(self, store: ChunkStore, digests: list[str], progress: dict, compress: bool):
+        self._store = store
+        self._digests = iter(digests)
+        self._progress = progress
+        self._compressor = zstandard.ZstdCompressor(level=1).compressobj() if compress else None
+        self._pending = b''
+
+    def read(self, size: int) -> bytes:
+        while len(self._pending) < size:
+            digest = next(self._digests, None)
+            if digest is None:
+                if self._compressor is not None:
+                    self._pending += self._compressor.flush()
+                    self._compressor = None
+                break
+            data = self._store.get(digest)
+            self._progress['raw_bytes'] += len(data)
+            self._pending += self._compressor.compress(data) if self._compressor else data
+        out, self._pending = self._pending[:size], self._pending[size:]
+        self._progress['transferred_bytes'] += len(out)
+        return out
+
+
+class BackupManager:
+    """Takes, restores, prunes and garbage-collects backups."""
+
+    def __init__(self):
+        self._app = None
+        self.store = None
+        self.keep_last = 7
+        self.keep_daily = 7
+        self.keep_weekly = 4
+        self.interval_hours = 0
+        # server_id -> progress of the latest restore to it (since startup)
+        self.restores: dict[str, dict] = {}
+
+    def init_app(self, app) -> None:
+        self._app = app
+        directory = app.config['BACKUP_DIR'] or os.path.join(app.instance_path, 'backups')
+        self.store = ChunkStore(directory, app.config['BACKUP_COMPRESSION_LEVEL'])
+        self.keep_last = app.config['BACKUP_KEEP_LAST']
+        self.keep_daily = app.config['BACKUP_KEEP_DAILY']
+        self.keep_weekly = app.config['BACKUP_KEEP_WEEKLY']
+        self.interval_hours = app.config['BACKUP_INTERVAL_HOURS']
+
+    def recover(self) -> int:
+        """Marks snapshots a previous run left running as failed. Needs an app context."""
+        interrupted = BackupSnapshot.query.filter_by(status='running').all()
+        for snapshot in interrupted:
+            snapshot.status = 'failed'
+            snapshot.error = 'Interrupted by a PGSM restart'
+            snapshot.finished_at = snapshot.finished_at or datetime.utcnow()
+        db.session.commit()
+        if interrupted:
+            log.info('Marked %d interrupted backup(s) as failed', len(interrupted))
+        return len(interrupted)
+
+    # ── Taking backups ────────────────────────────────────────────────────────
+
+    def start(self, server) -> BackupSnapshot:
+        """Starts a backup of *server* in the background and returns its
+        (running) snapshot. Raises BackupError if one is already running."""
+        if BackupSnapshot.query.filter_by(server_id=server.id, status='running').first():
+            raise BackupError('A backup of this server is already running')
+        if self._restoring(server.id):
+            raise BackupError('A backup is being restored to this server')
+        snapshot = BackupSnapshot(server_id=server.id, server_name=server.name, source_path=_SOURCE)
+        db.session.add(snapshot)
+        db.session.commit()
+        socketio.start_background_task(self._run, snapshot.id, server.ip_address)
+        return snapshot
+
+    def _run(self, snapshot_id: int, ip: str) -> None:
+        from app.models.server import GameServer
+
+        with self._app.app_context():
+            snapshot = db.session.get(BackupSnapshot, snapshot_id)
+            server = db.session.get(GameServer, snapshot.server_id)
+            saving_paused = self._pause_saving(server)
+            try:
+                self._receive(snapshot, ip)
+                snapshot.status = 'complete'
+            except Exception as e:
+                log.exception('Backup %d of %s failed', snapshot_id, ip)
+                db.session.rollback()
+                snapshot.status = 'failed'
+                snapshot.error = str(e) or type(e).__name__
+            finally:
+                if saving_paused:
+                    self._resume_saving(server)
+            try:
+                snapshot.finished_at = datetime.utcnow()
+                db.session.commit()
+                if snapshot.status == 'complete':
+                    self.apply_retention(snapshot.server_id)
+                    self.collect_garbage()
+            except Exception:
+                log.exception('Finishing backup %d failed', snapshot_id)
+            finally:
+                db.session.remove()
+
+    def _receive(self, snapshot: BackupSnapshot, ip: str) -> None:
+        client = self._threaded(ssh_mgr.get_client, ip)
+        try:
+            compressed = tpool.execute(self._has_zstd, client)
+            command = (
+                f'nice -n 10 tar -C {shlex.quote(_SOURCE)} --sparse --warning=no-file-changed'
+                f' --exclude={shlex.quote("./" + _STAGING_PREFIX + "*")}'
+                + (" --use-compress-program='zstd -1 -T0'" if compressed else '')
+                + ' -cf - .'
+            )
+            _, stdout, _ = tpool.execute(client.exec_command, command, timeout=_IDLE_TIMEOUT)
+            channel = stdout.channel
+            decompressor = zstandard.ZstdDecompressor().decompressobj(read_across_frames=True) if compressed else None
+            chunker = ContentChunker()
+            stderr = bytearray()
+            while True:
+                transferred, chunks, done = tpool.execute(
+                    _receive_batch, channel, decompressor, chunker, stderr,
+                )
+                snapshot.transferred_bytes += transferred
+                self._store_chunks(snapshot, chunks)
+                if done:
+                    break
+            status = tpool.execute(channel.recv_exit_status)
+        finally:
+            client.close()
+        # tar exits 1 when a file changed while it was read; the copy is still usable
+        if status not in (0, 1):
+            message = stderr.decode(errors='replace').strip().splitlines()
+            raise RuntimeError(f'tar exited with status {status}' + (f': {message[-1]}' if message else ''))
+
+    def _pause_saving(self, server) -> bool:
+        """Best effort: turns off a running Minecraft Java server's autosave
+        and flushes its world to disk. Returns whether save-on must be sent
+        afterwards; a failure is logged and the backup goes ahead regardless.
+        """
+        from app.services.server_lifecycle import send_console_command
+
+        if server is None or server.game_code != 'MCJAV' or server.status != 'running':
+            return False
+        ip = server.ip_address
+        try:
+            log_lines = ssh_mgr.exec_threaded(ip, f'wc -l < {_SAVE_LOG} 2>/dev/null || echo 0')[0].strip()
+            send_console_command(server, 'save-off')
+        except Exception:
+            log.warning('Could not pause saving on %s before its backup', server.name, exc_info=True)
+            return False
+        try:
+            try:
+                path, _ = send_console_command(server, 'save-all flush')
+            except RconDeliveryError:
+                path = None  # Sent, but the reply timed out; the save may still be running
+            # RCON replies once the save is done; otherwise look for it in the log
+            if path != 'rcon' and not self._saved_since(ip, int(log_lines or 0)):
+                log.warning('No "Saved the game" from %s within %ds; backing up anyway', server.name, _SAVE_TIMEOUT)
+        except Exception:
+            log.warning('Could not flush %s before its backup', server.name, exc_info=True)
+        return True
+
+    @staticmethod
+    def _saved_since(ip: str, log_lines: int) -> bool:
+        """Waits up to _SAVE_TIMEOUT for a "Saved the game" line after the
+        first *log_lines* lines of the server log."""
+        command = (
+            f'for _ in $(seq {_SAVE_TIMEOUT}); do'
+            f' tail -n +{log_lines + 1} {_SAVE_LOG} 2>/dev/null | grep -q "Saved the game" && echo saved && exit;'
+            f' sleep 1; done'
+        )
+        out, _ = ssh_mgr.exec_threaded(ip, command, timeout=_SAVE_TIMEOUT + 30)
+        return out.strip() == 'saved'
+
+    @staticmethod
+    def _resume_saving(server) -> None:
+        from app.services.server_lifecycle import send_console_command
+
+        try:
+            send_console_command(server, 'save-on')
+        except Exception:
+            log.exception('Could not turn saving back on for %s after its backup', server.name)
+
+    @staticmethod
+    def _has_zstd(client) -> bool:
+        _, stdout, _ = client.exec_command('command -v zstd', timeout=30)
+        return stdout.channel.recv_exit_status() == 0
+
+    def _store_chunks(self, snapshot: BackupSnapshot, chunks: list[tuple[str, bytes]]) -> None:
+        """Records a batch of the snapshot's chunks, writing the ones the store
+        doesn't have yet, and commits the snapshot's progress.
+
+        A chunk with a row but no file (lost or removed from Backup_Dir) is
+        written again, so the new snapshot is restorable.
+        """
+        if not chunks:
+            return
+        digests = {digest for digest, _ in chunks}
+        known = {
+            digest for (digest,) in
+            db.session.query(BackupChunk.digest).filter(BackupChunk.digest.in_(digests))
+        }
+        known = tpool.execute(lambda: {digest for digest in known if self.store.exists(digest)})
+        for digest, data in chunks:
+            snapshot.raw_bytes += len(data)
+            if digest not in known:
+                known.add(digest)
+                stored = tpool.execute(self.store.put, digest, data)
+                # Another backup may have stored the same chunk meanwhile
+                db.session.execute(insert(BackupChunk).values(
+                    digest=digest, size=len(data), stored_size=stored, created_at=datetime.utcnow(),
+                ).on_conflict_do_nothing())
+                snapshot.new_bytes += len(data)
+                snapshot.stored_bytes += stored
+                snapshot.new_chunk_count += 1
+            db.session.add(BackupSnapshotChunk(snapshot_id=snapshot.id, seq=snapshot.chunk_count, digest=digest))
+            snapshot.chunk_count += 1
+        db.session.commit()
+
+    # ── Restoring ─────────────────────────────────────────────────────────────
+
+    def restore(self, snapshot: BackupSnapshot, server) -> dict:
+        """Starts replacing *server*'s /PGSM with *snapshot* in the background
+        and returns the restore's progress dict (also in self.restores)."""
+        if snapshot.status != 'complete':
+            raise BackupError('Only complete backups can be restored')
+        if server.status == 'running':
+            raise BackupError('Stop the server before restoring a backup')
+        if server.status == 'creating':
+            raise BackupError('The server is still being created')
+        if self._restoring(server.id):
+            raise BackupError('A backup is already being restored to this server')
+        if BackupSnapshot.query.filter_by(server_id=server.id, status='running').first():
+            raise BackupError('A backup of this server is running')
+
+        digests = [
+            digest for (digest,) in
+            db.session.query(BackupSnapshotChunk.digest)
+            .filter_by(snapshot_id=snapshot.id).order_by(BackupSnapshotChunk.seq)
+        ]
+        progress = {
+            'snapshot_id': snapshot.id,
+            'status': 'running',
+            'error': None,
+            'started_at': datetime.utcnow().isoformat() + 'Z',
+            'finished_at': None,
+            'total_bytes': snapshot.raw_bytes,
+            'raw_bytes': 0,
+            'transferred_bytes': 0,
+        }
+        self.restores[server.id] = progress
+        socketio.start_background_task(self._run_restore, progress, server.id, server.ip_address, digests)
+        return progress
+
+    def _run_restore(self, progress: dict, server_id: str, ip: str, digests: list[str]) -> None:
+        from app.services.file_listing import listing_cache
+
+        with self._app.app_context():
+            try:
+                compressed = ssh_mgr.exec_threaded(ip, 'command -v zstd || true')[0].strip() != ''
+                stage_name = f'{_STAGING_PREFIX}{progress["snapshot_id"]}'
+                script = _RESTORE_SCRIPT.format(
+                    root=shlex.quote(_SOURCE),
+                    stage=shlex.quote(f'{_SOURCE}/{stage_name}'),
+                    stage_name=shlex.quote(stage_name),
+                    compress=' --use-compress-program=zstd' if compressed else '',
+                )
+                reader = _SnapshotReader(self.store, digests, progress, compressed)
+                self._threaded(ssh_mgr.exec_stdin, ip, script, reader, timeout=_IDLE_TIMEOUT)
+                progress['status'] = 'complete'
+            except Exception as e:
+                log.exception('Restoring backup %s to %s failed', progress['snapshot_id'], ip)
+                progress['status'] = 'failed'
+                progress['error'] = str(e) or type(e).__name__
+            finally:
+                progress['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+                listing_cache.invalidate(server_id, _SOURCE, recursive=True)
+                db.session.remove()
+
+    def _threaded(self, fn, *args, **kwargs):
+        """Runs a blocking SSH call in tpool with an app context (for the key path)."""
+        def run():
+            with self._app.app_context():
+                return fn(*args, **kwargs)
+
+        return tpool.execute(run)
+
+    def _restoring(self, server_id: str | None = None) -> bool:
+        if server_id is not None:
+            progress = self.restores.get(server_id)
+            return progress is not None and progress['status'] == 'running'
+        return any(p['status'] == 'running' for p in self.restores.values())
+
+    # ── Retention and garbage collection ──────────────────────────────────────
+
+    def delete(self, snapshot: BackupSnapshot) -> dict:
+        """Deletes a finished snapshot and the chunks only it used."""
+        if snapshot.status == 'running':
+            raise BackupError('This backup is still running')
+        if any(p['snapshot_id'] == snapshot.id and p['status'] == 'running' for p in self.restores.values()):
+            raise BackupError('This backup is being restored')
+        self._delete(snapshot)
+        db.session.commit()
+        return self.collect_garbage()
+
+    def apply_retention(self, server_id: str) -> list[int]:
+        """Deletes the server's snapshots outside the retention policy (failed
+        ones included) and returns their ids. Chunks are left to collect_garbage()."""
+        snapshots = (
+            BackupSnapshot.query.filter(BackupSnapshot.server_id == server_id, BackupSnapshot.status != 'running')
+            .order_by(BackupSnapshot.created_at.desc()).all()
+        )
+        complete = [s for s in snapshots if s.status == 'complete']
+        keep = {s.id for s in complete[:self.keep_last]}
+        keep |= _newest_per(complete, lambda s: s.created_at.date(), self.keep_daily)
+        keep |= _newest_per(complete, lambda s: s.created_at.isocalendar()[:2], self.keep_weekly)
+
+        deleted = []
+        for snapshot in snapshots:
+            if snapshot.id not in keep:
+                deleted.append(snapshot.id)
+                self._delete(snapshot)
+        db.session.commit()
+        return deleted
+
+    def prune(self) -> dict:
+        """Applies retention to every server that has backups, then collects garbage."""
+        deleted = []
+        for (server_id,) in db.session.query(BackupSnapshot.server_id).distinct():
+            deleted += self.apply_retention(server_id)
+        return {'deleted_snapshots': deleted, **self.collect_garbage()}
+
+    def collect_garbage(self) -> dict:
+        """Deletes chunks no snapshot refers to. Skipped while a backup or
+        restore is running, since it may be about to use them.
+
+        The rows are deleted and committed before the files, so a crash in
+        between leaves only unreferenced files, never a row without its file.
+        Runs without yielding to other greenlets, so no backup can start
+        referring to a chunk between its row and its file being deleted.
+        """
+        if self._restoring() or BackupSnapshot.query.filter_by(status='running').first():
+            return {'deleted_chunks': 0, 'freed_bytes': 0, 'skipped': True}
+        referenced = db.session.query(BackupSnapshotChunk.digest)
+        orphans = BackupChunk.query.filter(BackupChunk.digest.notin_(referenced)).all()
+        digests = [chunk.digest for chunk in orphans]
+        freed = sum(chunk.stored_size for chunk in orphans)
+        for chunk in orphans:
+            db.session.delete(chunk)
+        db.session.commit()
+        for digest in digests:
+            self.store.delete(digest)
+        return {'deleted_chunks': len(digests), 'freed_bytes': freed, 'skipped': False}
+
+    @staticmethod
+    def _delete(snapshot: BackupSnapshot) -> None:
+        BackupSnapshotChunk.query.filter_by(snapshot_id=snapshot.id).delete()
+        db.session.delete(snapshot)
+
+    # ── Statistics ────────────────────────────────────────────────────────────
+
+    def stats(self, server_id: str | None = None) -> dict:
+        """Snapshot totals and dedup/compression ratios, for one server or all.
+
+        logical_bytes: tar stream bytes over all complete snapshots.
+        unique_bytes/stored_bytes: the distinct chunks they refer to, raw and
+        compressed on disk (chunks shared with other servers count for each).
+        transferred_bytes: what crossed SSH to take them.
+        """
+        snapshots = BackupSnapshot.query.filter_by(status='complete')
+        if server_id is not None:
+            snapshots = snapshots.filter_by(server_id=server_id)
+        count, logical, transferred = snapshots.with_entities(
+            func.count(BackupSnapshot.id),
+            func.coalesce(func.sum(BackupSnapshot.raw_bytes), 0),
+            func.coalesce(func.sum(BackupSnapshot.transferred_bytes), 0),
+        ).one()
+
+        chunks = BackupChunk.query
+        if server_id is not None:
+            chunks = chunks.filter(BackupChunk.digest.in_(
+                db.session.query(BackupSnapshotChunk.digest)
+                .join(BackupSnapshot, BackupSnapshot.id == BackupSnapshotChunk.snapshot_id)
+                .filter(BackupSnapshot.server_id == server_id)
+            ))
+        chunk_count, unique, stored = chunks.with_entities(
+            func.count(BackupChunk.digest),
+            func.coalesce(func.sum(BackupChunk.size), 0),
+            func.coalesce(func.sum(BackupChunk.stored_size), 0),
+        ).one()
+
+        return {
+            'server_id': server_id,
+            'snapshots': count,
+            'logical_bytes': logical,
+            'transferred_bytes': transferred,
+            'chunks': chunk_count,
+            'unique_bytes': unique,
+            'stored_bytes': stored,
+            'dedup_ratio': round(logical / unique, 2) if unique else None,
+            'compression_ratio': round(unique / stored, 2) if stored else None,
+            'total_ratio': round(logical / stored, 2) if stored else None,
+        }
+
+    # ── Schedule ──────────────────────────────────────────────────────────────
+
+    def start_scheduler(self) -> None:
+        """Backs up every running or stopped server each Backup_Interval_Hours."""
+        if self.interval_hours > 0:
+            socketio.start_background_task(self._schedule)
+
+    def _schedule(self) -> None:
+        while True:
+            socketio.sleep(_SCHEDULE_INTERVAL)
+            with self._app.app_context():
+                try:
+                    self._start_due()
+                except Exception:
+                    log.exception('Scheduled backup pass failed')
+                finally:
+                    db.session.remove()
+
+    def _start_due(self) -> None:
+        from app.models.server import GameServer
+
+        running = BackupSnapshot.query.filter_by(status='running').count()
+        due_before = datetime.utcnow() - timedelta(hours=self.interval_hours)
+        latest = dict(
+            db.session.query(BackupSnapshot.server_id, func.max(BackupSnapshot.created_at))
+            .group_by(BackupSnapshot.server_id)
+        )
+        for server in GameServer.query.filter(GameServer.status.in_(('running', 'stopped'))).order_by(GameServer.name):
+            if running >= _SCHEDULED_CONCURRENCY:
+                break
+            last = latest.get(server.id)
+            if (last is not None and last > due_before) or self._restoring(server.id):
+                continue
+            self.start(server)
+            running += 1
+
+
+def _receive_batch(channel, decompressor, chunker: ContentChunker, stderr: bytearray):
+    """Reads about _RECEIVE_BYTES of the tar stream (blocking; run in tpool)
+    and returns (bytes received, [(digest, chunk)], end of stream)."""
+    received = 0
+    chunks = []
+    done = False
+    while received < _RECEIVE_BYTES:
+        # Drained as we go: unread stderr would eventually stall stdout
+        while channel.recv_stderr_ready():
+            stderr += channel.recv_stderr(65536)
+            del stderr[:-_STDERR_BYTES]
+        data = channel.recv(1024 * 1024)
+        if not data:
+            done = True
+            break
+        received += len(data)
+        chunks += chunker.feed(decompressor.decompress(data) if decompressor else data)
+    if done:
+        chunks += chunker.finish()
+        while channel.recv_stderr_ready():
+            stderr += channel.recv_stderr(65536)
+            del stderr[:-_STDERR_BYTES]
+    return received, [(hashlib.sha256(chunk).hexdigest(), chunk) for chunk in chunks], done
+
+
+def _newest_per(snapshots: list[BackupSnapshot], period, count: int) -> set[int]:
+    """Ids of the newest snapshot in each of the *count* most recent periods
+    (snapshots are newest first)."""
+    kept = {}
+    for snapshot in snapshots:
+        key = period(snapshot)
+        if key not in kept:
+            if len(kept) >= count:
+                break
+            kept[key] = snapshot.id
+    return set(kept.values())
+
+
+backup_manager = BackupManager()
@@ -0,0 +1,422 @@
+"""
+Shared, long-lived console sessions.
+
+One ConsoleSession per server owns the SSH channel attached to the tmux
+session and a bounded scrollback ring buffer. Every viewer of a server shares
+it: a new viewer is sent the scrollback first and then live output. When the last viewer leaves, the session stays attached for
+Console_Grace_Seconds, so a page reload or quick reconnect skips the SSH
+handshake and `su` attach entirely.
+
+Runs on eventlet greenlets: the reader sleeps on the channel's fileno() via
+green select, so an idle console costs no CPU.
+
+Viewers that ask for `frames` get output as acked `console_frame` events with
+credit-based flow control: a viewer that stops acking has its queued output
+dropped instead of holding up the room. Each frame is text over WebSocket,
+where eventlet's permessage-deflate already compresses it with a window shared
+across frames; on the polling transport, large frames are sent as zlib-deflated
+binary instead. Other clients get plain `console_output` text events.
+"""
+import codecs
+import logging
+import socket
+import time
+import traceback
+import zlib
+from collections import deque
+
+from eventlet.green import select as green_select
+
+from app.extensions import db, socketio
+from app.services.console_archive import console_archive
+from app.services.ssh import SSHManager
+
+log = logging.getLogger(__name__)
+
+# Output is coalesced into frames: one is emitted once this many bytes are
+# buffered, or _FRAME_LATENCY seconds after its first byte arrived
+_FRAME_MAX_BYTES = 64 * 1024
+_FRAME_LATENCY = 0.02
+# Safety-net wakeup for an idle reader; closing the channel wakes it immediately
+_IDLE_WAKE_INTERVAL = 30
+
+# Per-viewer flow control: frames and bytes sent but not yet acked before
+# output queues up (queued output is batched into the next frame), and queued
+# bytes before the queue is dropped
+_VIEWER_WINDOW_FRAMES = 2
+_VIEWER_WINDOW_BYTES = 256 * 1024
+_VIEWER_MAX_PENDING = 1024 * 1024
+# Below this, a binary attachment costs more than deflating saves
+_DEFLATE_MIN_BYTES = 512
+
+# pty size for consoles opened without a viewer
+_DEFAULT_COLS = 220
+_DEFAULT_ROWS = 50
+# Seconds between checks that every running server's console is attached
+_KEEPER_INTERVAL = 60
+
+# TMUX_TMPDIR=/tmp matches what the systemd service sets. exec replaces the
+# login shell, so the channel closes when tmux exits (e.g. the server stops).
+_TMUX_ATTACH = 'exec su -s /bin/bash PGSM -c "TMUX_TMPDIR=/tmp tmux attach -t PGSM"\n'
+
+
+def console_room(server_id: str) -> str:
+    return f'console_{server_id}'
+
+
+def emit_notice(text: str, **kwargs) -> None:
+    """Emits a PGSM status line to console viewers (pass room= or to=)."""
+    socketio.emit('console_output', {'data': f'\r\n[PGSM] {text}\r\n'}, **kwargs)
+
+
+class Scrollback:
+    """Bounded byte ring buffer of recent console output."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+
+    def append(self, data: bytes) -> None:
+        if not data or self.capacity <= 0:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.capacity:
+            excess = self._size - self.capacity
+            head = self._chunks[0]
+            if len(head) <= excess:
+                self._chunks.popleft()
+                self._size -= len(head)
+            else:
+                self._chunks[0] = head[excess:]
+                self._size -= excess
+
+    def snapshot(self) -> bytes:
+        """Returns the buffered output, starting at a line boundary once the
+        buffer has wrapped so replay never begins mid escape sequence."""
+        data = b''.join(self._chunks)
+        if self._size >= self.capacity:
+            cut = data.find(b'\n')
+            data = data[cut + 1:] if cut >= 0 else b''
+        return data
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class ConsoleViewer:
+    """One client watching a session, with its own output queue."""
+
+    def __init__(self, sid: str, frames: bool, deflate: bool):
+        self.sid = sid
+        self.frames = frames
+        self.deflate = deflate
+        self.closed = False
+        self.in_flight = 0
+        self.frames_in_flight = 0
+        self.pending = bytearray()
+        self.skipped = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def push(self, data: bytes) -> None:
+        """Queues *data* for this viewer and sends as much as its window allows."""
+        if not self.frames:
+            # These clients don't ack, so they get no flow control
+            socketio.emit('console_output', {'data': self._decoder.decode(data)}, to=self.sid)
+            return
+        self.pending += data
+        if len(self.pending) > _VIEWER_MAX_PENDING:
+            # Too slow to keep up: drop the backlog rather than buffer without bound
+            self.skipped += len(self.pending)
+            self.pending.clear()
+        self._flush()
+
+    def _flush(self) -> None:
+        if (self.closed or self.in_flight >= _VIEWER_WINDOW_BYTES
+                or self.frames_in_flight >= _VIEWER_WINDOW_FRAMES):
+            return
+        if self.skipped:
+            emit_notice(f'Skipped {self.skipped // 1024} KB of output (connection too slow).', to=self.sid)
+            self.skipped = 0
+        if not self.pending:
+            return
+        data = bytes(self.pending)
+        self.pending.clear()
+        payload = self._encode(data)
+        size = len(payload)
+        self.in_flight += size
+        self.frames_in_flight += 1
+        socketio.emit('console_frame', payload, to=self.sid, callback=lambda *_: self._ack(size))
+
+    def _ack(self, size: int) -> None:
+        self.in_flight -= size
+        self.frames_in_flight -= 1
+        self._flush()
+
+    def _encode(self, data: bytes) -> str | bytes:
+        """Returns a frame as text, or as deflated bytes on the polling
+        transport when that is smaller (polling base64-encodes binary)."""
+        if self.deflate and len(data) >= _DEFLATE_MIN_BYTES and _transport(self.sid) == 'polling':
+            # Include any partial character the text decoder is holding back
+            held, _ = self._decoder.getstate()
+            compressed = zlib.compress(held + data)
+            if len(compressed) * 4 // 3 < len(data):
+                self._decoder.reset()
+                return compressed
+        return self._decoder.decode(data)
+
+
+class ConsoleSession:
+    """The attached console of one server, shared by all of its viewers."""
+
+    def __init__(self, manager: 'ConsoleManager', server_id: str, ip: str):
+        self.manager = manager
+        self.server_id = server_id
+        self.ip = ip
+        self.room = console_room(server_id)
+        self.viewers: dict[str, ConsoleViewer] = {}
+        self.scrollback = Scrollback(manager.scrollback_bytes)
+        self.channel = None
+        self.closed = False
+        # Kept attached with no viewers (Console_Archive_Always_Attached)
+        self.pinned = False
+        # Set once tmux has drawn its first output, i.e. keystrokes reach the game
+        self.attached = False
+        # Bumped whenever the viewer set empties, so stale grace timers no-op
+        self._idle_generation = 0
+
+    # ── Viewers ───────────────────────────────────────────────────────────────
+
+    def attach(self, sid: str, frames: bool = False, deflate: bool = False) -> None:
+        """Adds a viewer (already in the room) and replays the scrollback to it.
+
+        Runs without yielding, so no frame is emitted between the snapshot and
+        the viewer receiving live output — nothing is lost or duplicated.
+        """
+        old = self.viewers.get(sid)
+        if old is not None:
+            old.closed = True
+        viewer = ConsoleViewer(sid, frames, deflate and self.manager.compression)
+        self.viewers[sid] = viewer
+        replay = self.scrollback.snapshot()
+        if replay:
+            viewer.push(replay)
+
+    def detach(self, sid: str) -> None:
+        viewer = self.viewers.pop(sid, None)
+        if viewer is None:
+            return
+        viewer.closed = True
+        if not self.viewers:
+            self._idle_generation += 1
+            socketio.start_background_task(self._expire, self._idle_generation)
+
+    def resize(self, cols: int, rows: int) -> None:
+        if self.channel is not None:
+            try:
+                self.channel.resize_pty(width=cols, height=rows)
+            except Exception:
+                pass
+
+    def send_input(self, text: str) -> bool:
+        """Types *text* + Enter into the attached tmux pane. Returns False if
+        the console isn't attached (the caller should use another path)."""
+        if not self.attached or self.closed or self.channel is None:
+            return False
+        try:
+            self.channel.sendall((text + '\r').encode('utf-8'))
+        except (OSError, EOFError):
+            return False
+        return True
+
+    def close(self) -> None:
+        """Detaches from tmux: wakes the reader, which closes the connection."""
+        self.closed = True
+        self.manager._forget(self)
+        if self.channel is not None:
+            # channel.close() would close the pipe the reader selects on without
+            # waking it; ending the input buffer signals the pipe (recv → EOF)
+            self.channel.in_buffer.close()
+
+    def _expire(self, generation: int) -> None:
+        socketio.sleep(self.manager.grace_seconds)
+        if not self.viewers and generation == self._idle_generation and not (self.closed or self.pinned):
+            log.debug('Closing idle console for %s', self.server_id)
+            self.close()
+
+    # ── Reader ────────────────────────────────────────────────────────────────
+
+    def run(self, app, cols: int, rows: int) -> None:
+        """Eventlet greenlet: SSH invoke_shell → attach tmux → stream to the room."""
+        client = None
+        try:
+            with app.app_context():
+                emit_notice(f'Connecting to {self.ip}...', room=self.room)
+                client = SSHManager().get_client(self.ip)
+                emit_notice('SSH connected. Attaching tmux...', room=self.room)
+
+                # Open a pty-backed shell sized to match xterm.js exactly
+                channel = client.invoke_shell(term='xterm-256color', width=cols, height=rows)
+                channel.setblocking(False)
+                self.channel = channel
+                if self.closed:
+                    return  # Expired while we were connecting
+                channel.send(_TMUX_ATTACH)
+                while not self.closed:
+                    frame = _read_frame(channel)
+                    if frame is None:
+                        continue  # Idle wakeup
+                    if not frame:
+                        if not self.closed:
+                            emit_notice('Console closed.', room=self.room)
+                        break
+                    self.attached = True
+                    self.scrollback.append(frame)
+                    try:
+                        console_archive.append(self.server_id, frame)
+                    except Exception:
+                        log.exception('Console archive write failed for %s', self.server_id)
+                    for viewer in list(self.viewers.values()):
+                        viewer.push(frame)
+
+        except Exception as e:
+            log.error('Console stream error for %s: %s', self.server_id, traceback.format_exc())
+            emit_notice(f'Connection error: {e}', room=self.room)
+        finally:
+            self.closed = True
+            self.manager._forget(self)
+            with app.app_context():
+                try:
+                    console_archive.close(self.server_id)
+                except Exception:
+                    log.exception('Console archive close failed for %s', self.server_id)
+            if client is not None:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+
+
+class ConsoleManager:
+    """Registry of live ConsoleSessions, one per server."""
+
+    def __init__(self):
+        self._app = None
+        self._sessions: dict[str, ConsoleSession] = {}
+        self.scrollback_bytes = 256 * 1024
+        self.grace_seconds = 60
+        self.compression = True
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.scrollback_bytes = app.config['CONSOLE_SCROLLBACK_BYTES']
+        self.grace_seconds = app.config['CONSOLE_GRACE_SECONDS']
+        self.compression = app.config['CONSOLE_COMPRESSION']
+
+    def get(self, server_id: str) -> ConsoleSession | None:
+        return self._sessions.get(server_id)
+
+    def join(self, server, sid: str, cols: int, rows: int,
+             frames: bool = False, deflate: bool = False) -> ConsoleSession:
+        """Attaches *sid* to *server*'s console, starting the reader if needed.
+
+        *frames* and *deflate* say whether the client acks `console_frame`
+        events and can inflate binary ones. The caller must have put *sid* in
+        the console room already.
+        """
+        session = self._open(server, cols, rows)
+        session.attach(sid, frames, deflate)
+        return session
+
+    def keep_attached(self, server) -> ConsoleSession:
+        """Opens *server*'s console if needed and keeps it open without viewers."""
+        session = self._open(server, _DEFAULT_COLS, _DEFAULT_ROWS)
+        session.pinned = True
+        return session
+
+    def start_keeper(self) -> None:
+        """Keeps every running server's console attached so its output is
+        archived even when nobody is watching (Console_Archive_Always_Attached)."""
+        socketio.start_background_task(self._keep_running_attached)
+
+    def leave(self, server_id: str, sid: str) -> None:
+        session = self._sessions.get(server_id)
+        if session is not None:
+            session.detach(sid)
+
+    def leave_all(self, sid: str) -> None:
+        """Detaches a disconnected client from every console it was viewing."""
+        for session in list(self._sessions.values()):
+            session.detach(sid)
+
+    def _open(self, server, cols: int, rows: int) -> ConsoleSession:
+        session = self._sessions.get(server.id)
+        if session is None or session.closed:
+            session = ConsoleSession(self, server.id, server.ip_address)
+            self._sessions[server.id] = session
+            socketio.start_background_task(session.run, self._app, cols, rows)
+        return session
+
+    def _keep_running_attached(self) -> None:
+        from app.models.server import GameServer
+        while True:
+            with self._app.app_context():
+                try:
+                    for server in GameServer.query.filter_by(status='running'):
+                        session = self._sessions.get(server.id)
+                        if session is None or session.closed or not session.pinned:
+                            self.keep_attached(server)
+                except Exception:
+                    log.exception('Console keeper pass failed')
+                finally:
+                    db.session.remove()
+            socketio.sleep(_KEEPER_INTERVAL)
+
+    def _forget(self, session: ConsoleSession) -> None:
+        if self._sessions.get(session.server_id) is session:
+            del self._sessions[session.server_id]
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _transport(sid: str) -> str | None:
+    """'websocket' or 'polling' for a connected client, None if it's gone."""
+    try:
+        return socketio.server.transport(sid)
+    except KeyError:
+        return None
+
+
+def _wait_readable(channel, timeout: float) -> bool:
+    """Yields to other greenlets until *channel* has data or EOF, or *timeout* passes."""
+    return bool(green_select.select([channel], [], [], timeout)[0])
+
+
+def _read_frame(channel) -> bytes | None:
+    """Waits for output, then drains and coalesces it into one frame.
+
+    Returns None if nothing arrived within _IDLE_WAKE_INTERVAL and b'' at EOF.
+    """
+    if not _wait_readable(channel, _IDLE_WAKE_INTERVAL):
+        return None
+    frame = bytearray()
+    deadline = time.monotonic() + _FRAME_LATENCY
+    while len(frame) < _FRAME_MAX_BYTES:
+        try:
+            chunk = channel.recv(_FRAME_MAX_BYTES - len(frame))
+        except socket.timeout:
+            chunk = None  # Spurious wakeup; buffer already drained
+        if chunk == b'':
+            if not frame:
+                return b''
+            break  # EOF; the next call returns b''
+        if chunk:
+            frame += chunk
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not _wait_readable(channel, remaining):
+            break
+    return bytes(frame) or None
+
+
+console_manager = ConsoleManager()
@@ -0,0 +1,395 @@
+"""
+Persistent console history on the controller, searchable without SSH.
+
+ConsoleSession hands every output frame to console_archive. Frames are turned
+into plain text lines (escape sequences stripped, the tmux status bar and
+lines repeated by a screen redraw dropped) and appended with a UTC timestamp
+to the server's open segment, Console_Archive_Dir/<server_id>/<start>.log.
+A segment is closed when it reaches Console_Archive_Segment_Bytes or
+Console_Archive_Segment_Seconds, or when the console detaches: it is gzipped
+and recorded in console_log_segments with its time range and a Bloom filter
+of its words. Segments older than Console_Archive_Retention_Days are deleted.
+
+search() selects segments by server and time range through the
+(server_id, started_at) index, skips every segment whose Bloom filter rules
+out a query word, and scans only the remaining files. Open segments are
+checked against their in-memory word set instead.
+"""
+import codecs
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+from collections import deque
+from datetime import datetime, timedelta
+
+from eventlet import tpool
+
+from app.extensions import db
+from app.models.console_log import ConsoleLogSegment
+
+log = logging.getLogger(__name__)
+
+# Escape sequences: CSI, OSC, DCS/SOS/PM/APC strings, charset selection, and
+# two-byte escapes. Cursor positioning (CUP/HVP/VPA/CNL/CPL, DECSC/DECRC)
+# starts a new line.
+_ESCAPE = re.compile(
+    r'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[PX^_][^\x1b]*\x1b\\|[()*+].|(?![\[\]PX^_])[ -/]*[0-~])'
+)
+_CURSOR_MOVE = re.compile(r'\x1b\[[0-9;]*[HfdEF]|\x1b[78]')
+_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_NEWLINE = re.compile(r'\r\n|\r|\n')
+# Full-screen redraws (attach, resize) repaint lines that are already archived
+_REDRAW = re.compile(r'\x1b\[2J|\x1b\[\?1049h')
+# tmux's default status line: "[<session>] <window index>:<name>..."
+_TMUX_STATUS = re.compile(r'^\[PGSM\] \d+:\S')
+_WORD = re.compile(r'[0-9a-z_]{2,}')
+
+# Lines compared against when dropping redraw repeats (a screenful or two)
+_RECENT_LINES = 256
+# A partial line longer than this is archived without waiting for its end
+_MAX_LINE_CHARS = 4096
+_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Bloom filter sizing: ~1% false positives
+_BLOOM_BITS_PER_WORD = 10
+_BLOOM_HASHES = 7
+
+MAX_RESULTS = 1000
+
+
+class SegmentWriter:
+    """The open segment of one server, plus the line-splitting state for its stream."""
+
+    def __init__(self, directory: str, server_id: str):
+        self.server_id = server_id
+        self.started_at = None
+        self.ended_at = None
+        self.lines = 0
+        self.raw_bytes = 0
+        self.words: set[str] = set()
+        self.path = None
+        self._directory = directory
+        self._file = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._held = ''       # Incomplete escape sequence at the end of the last frame
+        self._partial = ''    # Text after the last line break
+        self._recent: deque[str] = deque(maxlen=_RECENT_LINES)
+
+    def feed(self, frame: bytes, now: datetime) -> None:
+        """Archives the complete lines in *frame*."""
+        text = self._held + self._decoder.decode(frame)
+        self._held = ''
+        esc = text.rfind('\x1b')
+        if esc != -1 and len(text) - esc < 64 and not _ESCAPE.match(text, esc):
+            text, self._held = text[:esc], text[esc:]
+        redraw = bool(_REDRAW.search(text))
+
+        text = _CURSOR_MOVE.sub('\n', text)
+        text = _CONTROL.sub('', _ESCAPE.sub('', text))
+        parts = _NEWLINE.split(self._partial + text)
+        self._partial = parts.pop()
+        if len(self._partial) > _MAX_LINE_CHARS:
+            parts.append(self._partial)
+            self._partial = ''
+
+        out = []
+        for line in parts:
+            line = line.rstrip()
+            if not line or _TMUX_STATUS.match(line):
+                continue
+            if redraw and line in self._recent:
+                continue
+            self._recent.append(line)
+            out.append(f'{now.strftime(_TIME_FORMAT)}\t{line}\n')
+            self.words.update(_WORD.findall(line.lower()))
+        if out:
+            self._write(''.join(out).encode('utf-8'), len(out), now)
+
+    def _write(self, data: bytes, lines: int, now: datetime) -> None:
+        if self._file is None:
+            os.makedirs(self._directory, exist_ok=True)
+            self.started_at = now
+            self.path = os.path.join(self._directory, f'{now.strftime("%Y%m%dT%H%M%S")}-{os.urandom(3).hex()}.log')
+            self._file = open(self.path, 'ab')
+        self._file.write(data)
+        self._file.flush()
+        self.ended_at = now
+        self.lines += lines
+        self.raw_bytes += len(data)
+
+    def detach_file(self) -> tuple[str | None, bool]:
+        """Closes the open file and starts a fresh segment on the next line.
+
+        Returns (path, had_lines); the line-splitting state is kept.
+        """
+        path, had_lines = self.path, self._file is not None
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self.path = None
+        self.started_at = self.ended_at = None
+        self.lines = self.raw_bytes = 0
+        self.words = set()
+        return path, had_lines
+
+
+class ConsoleArchive:
+    """Writes and searches the per-server console log segments."""
+
+    def __init__(self):
+        self._writers: dict[str, SegmentWriter] = {}
+        self.enabled = False
+        self.directory = None
+        self.segment_bytes = 4 * 1024 * 1024
+        self.segment_seconds = 3600
+        self.retention_days = 30
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config['CONSOLE_ARCHIVE_ENABLED']
+        self.directory = app.config['CONSOLE_ARCHIVE_DIR'] or os.path.join(app.instance_path, 'console_archive')
+        self.segment_bytes = app.config['CONSOLE_ARCHIVE_SEGMENT_BYTES']
+        self.segment_seconds = app.config['CONSOLE_ARCHIVE_SEGMENT_SECONDS']
+        self.retention_days = app.config['CONSOLE_ARCHIVE_RETENTION_DAYS']
+
+    # ── Writing ───────────────────────────────────────────────────────────────
+
+    def append(self, server_id: str, frame: bytes) -> None:
+        """Archives a console output frame, rotating the segment when it's full
+        or old enough. Needs an app context."""
+        if not self.enabled:
+            return
+        writer = self._writers.get(server_id)
+        if writer is None:
+            writer = self._writers[server_id] = SegmentWriter(os.path.join(self.directory, server_id), server_id)
+        now = datetime.utcnow()
+        writer.feed(frame, now)
+        if writer.started_at is not None and (
+            writer.raw_bytes >= self.segment_bytes
+            or (now - writer.started_at).total_seconds() >= self.segment_seconds
+        ):
+            self._close_segment(writer)
+
+    def close(self, server_id: str) -> None:
+        """Closes *server_id*'s open segment (the console detached). Needs an app context."""
+        writer = self._writers.pop(server_id, None)
+        if writer is not None:
+            self._close_segment(writer)
+
+    def recover(self) -> int:
+        """Finalizes segments left open by a crash or restart. Returns how many
+        were recorded. Needs an app context."""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return 0
+        recovered = 0
+        for server_id in os.listdir(self.directory):
+            server_dir = os.path.join(self.directory, server_id)
+            if server_id in self._writers or not os.path.isdir(server_dir):
+                continue
+            for name in sorted(os.listdir(server_dir)):
+                if name.endswith('.log'):
+                    recovered += self._record(server_id, os.path.join(server_dir, name))
+        if recovered:
+            log.info('Recovered %d console archive segment(s)', recovered)
+        return recovered
+
+    def prune(self) -> int:
+        """Deletes segments whose last line is older than the retention period."""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        expired = ConsoleLogSegment.query.filter(ConsoleLogSegment.ended_at < cutoff).all()
+        for segment in expired:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+            db.session.delete(segment)
+        if expired:
+            db.session.commit()
+        return len(expired)
+
+    def _close_segment(self, writer: SegmentWriter) -> None:
+        path, had_lines = writer.detach_file()
+        if had_lines:
+            self._record(writer.server_id, path)
+            self.prune()
+
+    def _record(self, server_id: str, path: str) -> int:
+        """Gzips a finished .log file and records it. Returns 1 if recorded."""
+        try:
+            stats = tpool.execute(_compress_segment, path)
+        except OSError:
+            log.exception('Could not archive console segment %s', path)
+            return 0
+        if stats is None:
+            return 0  # Empty file
+        started_at, ended_at, lines, raw_bytes, words = stats
+        gz_path = path + '.gz'
+        db.session.add(ConsoleLogSegment(
+            server_id=server_id,
+            filename=os.path.basename(gz_path),
+            started_at=started_at,
+            ended_at=ended_at,
+            lines=lines,
+            raw_bytes=raw_bytes,
+            stored_bytes=os.path.getsize(gz_path),
+            bloom=_bloom_build(words),
+        ))
+        db.session.commit()
+        return 1
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    def search(self, query: str, server_ids=None, since: datetime | None = None,
+               until: datetime | None = None, limit: int = 200) -> dict:
+        """Returns archived lines containing every word of *query*, newest first.
+
+        Words are matched whole and case-insensitively. *server_ids* (None =
+        all servers) and the naive-UTC *since*/*until* bounds narrow the
+        segments considered. Raises ValueError if *query* has no words.
+        """
+        terms = sorted(set(_WORD.findall(query.lower())))
+        if not terms:
+            raise ValueError('Query must contain at least one word of 2+ letters or digits')
+
+        candidates = []   # (server_id, path, started_at, ended_at)
+        skipped = 0
+        for writer in list(self._writers.values()):
+            if writer.path is None or (server_ids and writer.server_id not in server_ids):
+                continue
+            if not _overlaps(writer.started_at, writer.ended_at, since, until):
+                continue
+            if all(t in writer.words for t in terms):
+                candidates.append((writer.server_id, writer.path, writer.started_at, writer.ended_at))
+            else:
+                skipped += 1
+
+        segments = ConsoleLogSegment.query
+        if server_ids:
+            segments = segments.filter(ConsoleLogSegment.server_id.in_(server_ids))
+        if since is not None:
+            segments = segments.filter(ConsoleLogSegment.ended_at >= since)
+        if until is not None:
+            segments = segments.filter(ConsoleLogSegment.started_at <= until)
+        for segment in segments.order_by(ConsoleLogSegment.started_at.desc()):
+            if all(_bloom_contains(segment.bloom, t) for t in terms):
+                candidates.append((segment.server_id, self._segment_path(segment), segment.started_at, segment.ended_at))
+            else:
+                skipped += 1
+
+        results = []
+        scanned = 0
+        truncated = False
+        for server_id, path, _started_at, ended_at in sorted(candidates, key=lambda c: c[3], reverse=True):
+            if len(results) >= limit and ended_at < results[limit - 1]['time']:
+                truncated = True
+                break  # Nothing in this or any older segment makes the cut
+            try:
+                matches = tpool.execute(_scan_segment, path, terms, since, until)
+            except OSError:
+                continue  # Rotated or pruned meanwhile
+            scanned += 1
+            results.extend({'server_id': server_id, 'time': ts, 'line': line} for ts, line in matches)
+            results.sort(key=lambda r: r['time'], reverse=True)
+            if len(results) > limit:
+                del results[limit:]
+                truncated = True
+
+        return {
+            'results': [{**r, 'time': r['time'].isoformat()} for r in results],
+            'segments_scanned': scanned,
+            'segments_skipped': skipped,
+            'truncated': truncated,
+        }
+
+    def _segment_path(self, segment: ConsoleLogSegment) -> str:
+        return os.path.join(self.directory, segment.server_id, segment.filename)
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _overlaps(started_at, ended_at, since, until) -> bool:
+    return (since is None or ended_at >= since) and (until is None or started_at <= until)
+
+
+def _parse_line(raw: str) -> tuple[datetime, str] | None:
+    stamp, sep, line = raw.rstrip('\n').partition('\t')
+    if not sep:
+        return None
+    try:
+        return datetime.strptime(stamp, _TIME_FORMAT), line
+    except ValueError:
+        return None
+
+
+def _compress_segment(path: str):
+    """Gzips *path* to *path*.gz, removes it, and returns (started_at,
+    ended_at, lines, raw_bytes, words), or None if it held no lines.
+
+    Runs in a real thread via tpool so compressing never stalls the hub.
+    """
+    started_at = ended_at = None
+    lines = 0
+    words: set[str] = set()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for raw in f:
+            parsed = _parse_line(raw)
+            if parsed is None:
+                continue
+            ts, line = parsed
+            started_at = started_at or ts
+            ended_at = ts
+            lines += 1
+            words.update(_WORD.findall(line.lower()))
+    if not lines:
+        os.remove(path)
+        return None
+    raw_bytes = os.path.getsize(path)
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return started_at, ended_at, lines, raw_bytes, words
+
+
+def _scan_segment(path: str, terms: list[str], since, until) -> list[tuple[datetime, str]]:
+    """Returns the (time, line) pairs in a segment matching every term, in file order."""
+    opener = gzip.open if path.endswith('.gz') else open
+    matches = []
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for raw in f:
+            lowered = raw.lower()
+            if not all(t in lowered for t in terms):
+                continue  # Cheap substring reject before word matching
+            parsed = _parse_line(raw)
+            if parsed is None:
+                continue
+            ts, line = parsed
+            if (since is not None and ts < since) or (until is not None and ts > until):
+                continue
+            words = set(_WORD.findall(line.lower()))
+            if all(t in words for t in terms):
+                matches.append((ts, line))
+    return matches
+
+
+def _bloom_positions(word: str, bits: int) -> list[int]:
+    digest = hashlib.blake2b(word.encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(_BLOOM_HASHES)]
+
+
+def _bloom_build(words) -> bytes:
+    size = max(8, (len(words) * _BLOOM_BITS_PER_WORD + 7) // 8)
+    bloom = bytearray(size)
+    for word in words:
+        for pos in _bloom_positions(word, size * 8):
+            bloom[pos >> 3] |= 1 << (pos & 7)
+    return bytes(bloom)
+
+
+def _bloom_contains(bloom: bytes, word: str) -> bool:
+    return all(bloom[pos >> 3] & (1 << (pos & 7)) for pos in _bloom_positions(word, len(bloom) * 8))
+
+
+console_archive = ConsoleArchive()
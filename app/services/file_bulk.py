@@ -0,0 +1,141 @@
+"""
+Bulk file operations: many deletes, moves, copies, chmods and chowns in one
+SSH exec.
+
+The whole batch is checked first (known operation, paths inside /PGSM,
+valid mode), so a bad entry rejects the batch before anything runs. It then
+becomes a single shell script; each operation runs in turn, whether or not
+the previous one succeeded, and prints its index, exit status and error
+output, NUL-terminated. Clearing 200 old logs therefore costs one
+connection and one round trip instead of 200.
+"""
+import posixpath
+import re
+import shlex
+
+from app.services.file_listing import listing_cache
+from app.services.ssh import SSHManager
+
+ssh_mgr = SSHManager()
+
+OPERATIONS = ('delete', 'move', 'copy', 'chmod', 'chown')
+# Most operations accepted in one batch
+MAX_OPERATIONS = 1000
+# Seconds the whole batch may run on the container
+_BATCH_TIMEOUT = 300
+_ROOT = '/PGSM'
+_MODE = re.compile(r'^[0-7]{3,4}$')
+
+
+class BulkError(ValueError):
+    """The batch is malformed; nothing was run."""
+
+
+def validate(operations) -> list[dict]:
+    """Returns the normalised operations, or raises BulkError naming the
+    first bad entry.
+
+    Each is {"op", "path"} plus "dest" for move/copy (the new path, not a
+    directory to put it in; "overwrite": true replaces an existing one),
+    "mode" for chmod (octal string) and optional "recursive" for chmod/chown.
+    chown always sets PGSM:PGSM. Paths must be inside /PGSM, not /PGSM itself.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BulkError('operations must be a non-empty list')
+    if len(operations) > MAX_OPERATIONS:
+        raise BulkError(f'At most {MAX_OPERATIONS} operations per batch')
+
+    normalised = []
+    for index, raw in enumerate(operations):
+        if not isinstance(raw, dict):
+            raise BulkError(f'Operation {index} must be an object')
+        op = raw.get('op')
+        if op not in OPERATIONS:
+            raise BulkError(f'Operation {index}: op must be one of {", ".join(OPERATIONS)}')
+        entry = {'op': op, 'path': _inside_root(raw.get('path'), index)}
+        if op in ('move', 'copy'):
+            entry['dest'] = _inside_root(raw.get('dest'), index)
+            entry['overwrite'] = raw.get('overwrite') is True
+            if entry['dest'] == entry['path'] or entry['dest'].startswith(entry['path'] + '/'):
+                raise BulkError(f'Operation {index}: cannot {op} {entry["path"]} into itself')
+        if op == 'chmod':
+            mode = str(raw.get('mode', ''))
+            if not _MODE.match(mode):
+                raise BulkError(f'Operation {index}: mode must be octal, e.g. 644 or 0755')
+            entry['mode'] = mode
+        if op in ('chmod', 'chown'):
+            entry['recursive'] = raw.get('recursive') is True
+        normalised.append(entry)
+    return normalised
+
+
+def run_batch(server, operations: list[dict]) -> list[dict]:
+    """Runs validated *operations* on *server* in order, in one exec.
+
+    Returns one {index, op, path, ok, error} per operation. An operation
+    that didn't report (the batch timed out or the connection dropped) is
+    returned with ok False.
+    """
+    script = '\n'.join(_command(i, entry) for i, entry in enumerate(operations))
+    try:
+        out, _ = ssh_mgr.exec_threaded(server.ip_address, script, timeout=_BATCH_TIMEOUT)
+    finally:
+        _invalidate(server.id, operations)
+
+    reported = {}
+    for record in out.split('\0'):
+        fields = record.lstrip('\n').split('\t', 2)
+        if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+            reported[int(fields[0])] = (int(fields[1]), fields[2].strip())
+
+    results = []
+    for index, entry in enumerate(operations):
+        status, message = reported.get(index, (None, 'Not run (batch interrupted)'))
+        result = {'index': index, 'op': entry['op'], 'path': entry['path'], 'ok': status == 0}
+        if 'dest' in entry:
+            result['dest'] = entry['dest']
+        if status != 0:
+            result['error'] = message or f'Exited with status {status}'
+        results.append(result)
+    return results
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _inside_root(path, index: int) -> str:
+    if not isinstance(path, str) or not path:
+        raise BulkError(f'Operation {index}: path and dest must be non-empty strings')
+    normalised = posixpath.normpath('/' + path.lstrip('/'))
+    if not normalised.startswith(_ROOT + '/'):
+        raise BulkError(f'Operation {index}: {path} is outside {_ROOT}')
+    return normalised
+
+
+def _command(index: int, entry: dict) -> str:
+    """One operation as a shell line that reports "<index>\\t<status>\\t<stderr>\\0"."""
+    path = shlex.quote(entry['path'])
+    op = entry['op']
+    # rm -f and friends succeed on missing paths; report those instead
+    check = f'{{ [ -e {path} ] || [ -L {path} ] || {{ echo "No such file or directory" >&2; false; }}; }}'
+    if op == 'delete':
+        action = f'rm -rf -- {path}'
+    elif op in ('move', 'copy'):
+        dest = shlex.quote(entry['dest'])
+        if not entry['overwrite']:
+            exists = shlex.quote(f'{entry["dest"]} already exists')
+            check += f' && {{ ! [ -e {dest} ] || {{ echo {exists} >&2; false; }}; }}'
+        tool = 'mv -T' if op == 'move' else 'cp -a -T'
+        action = f'mkdir -p -- {shlex.quote(posixpath.dirname(entry["dest"]))} && {tool} -- {path} {dest}'
+    elif op == 'chmod':
+        action = f'chmod {"-R " if entry["recursive"] else ""}{entry["mode"]} -- {path}'
+    else:
+        action = f'chown -h {"-R " if entry["recursive"] else ""}PGSM:PGSM -- {path}'
+    return f'r=$({{ {check} && {action}; }} 2>&1); printf "%d\\t%d\\t%s\\0" {index} $? "$r"'
+
+
+def _invalidate(server_id: str, operations: list[dict]) -> None:
+    for entry in operations:
+        for key in ('path', 'dest'):
+            if key in entry:
+                listing_cache.invalidate(server_id, posixpath.dirname(entry[key]))
+                listing_cache.invalidate(server_id, entry[key], recursive=True)
@@ -0,0 +1,157 @@
+"""
+Conflict-safe saves from the file editor.
+
+The editor opens a file together with the SHA-256 of the bytes it was
+given (the base). A save sends that base hash plus either line edits
+against the base with the SHA-256 of the intended result (edits are
+computed on the editor's normalised lines, so a file with unusual line
+endings could otherwise be saved corrupted), or the whole new content. The server
+re-reads the file, refuses the save with SaveConflict if it no longer
+matches the base (the game or another admin changed it), applies the edits,
+and has the container write the result to a temp file next to the
+original, copy its owner and mode, fsync it and rename it into place. The
+base check is repeated on the container just before the rename, so the
+window for a lost update is one hash of the file rather than the whole
+time it was open in the browser.
+"""
+import hashlib
+import posixpath
+import shlex
+import uuid
+
+from app.services.file_listing import listing_cache
+from app.services.ssh import SSHManager
+
+ssh_mgr = SSHManager()
+
+# Exit status the save script uses for "file changed since it was read"
+_CONFLICT_STATUS = 3
+
+# stdin -> temp file with the original's owner and mode, fsynced; then the
+# base is checked once more (empty base: no check) right before the atomic
+# rename. The temp file never outlives the script.
+_SAVE_SCRIPT = '''\
+f={path}; t={temp}; base={base}
+trap 'rm -f "$t"' EXIT
+cat > "$t" || exit 1
+if [ -e "$f" ]; then
+    chown --reference="$f" "$t" && chmod --reference="$f" "$t" || exit 1
+fi
+sync "$t" || exit 1
+if [ -n "$base" ]; then
+    cur=$(sha256sum < "$f" | cut -c1-64)
+    [ "$cur" = "$base" ] || {{ echo "$cur"; exit {conflict}; }}
+fi
+mv -f "$t" "$f"
+'''
+
+
+class EditError(ValueError):
+    """The edits don't apply to the base (bad ranges, wrong result hash, ...)."""
+
+
+class SaveConflict(Exception):
+    """The file on the server no longer matches the editor's base."""
+
+    def __init__(self, current_sha256: str):
+        super().__init__('The file was changed on the server since it was opened')
+        self.current_sha256 = current_sha256
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def split_lines(data: bytes) -> list[bytes]:
+    """Splits *data* after each b'\\n', keeping the line endings (CRLF stays
+    whole); a last line without a newline is kept as is."""
+    lines = data.split(b'\n')
+    tail = lines.pop()
+    return [line + b'\n' for line in lines] + ([tail] if tail else [])
+
+
+def apply_edits(base: bytes, edits: list[dict]) -> bytes:
+    """Applies line edits to *base*.
+
+    Each edit is {"line": first base line (0-based), "delete": lines to
+    remove, "insert": text to put in their place}. Line numbers refer to the
+    base, so edits may come in any order but must not overlap.
+    """
+    lines = split_lines(base)
+    parsed = []
+    for edit in edits:
+        try:
+            start, delete, insert = int(edit['line']), int(edit['delete']), str(edit['insert'])
+        except (KeyError, TypeError, ValueError):
+            raise EditError('Each edit needs line, delete and insert') from None
+        if start < 0 or delete < 0 or start + delete > len(lines):
+            raise EditError(f'Edit at line {start} is outside the file ({len(lines)} lines)')
+        parsed.append((start, delete, insert.encode('utf-8')))
+
+    parsed.sort(key=lambda e: e[0])
+    for previous, current in zip(parsed, parsed[1:]):
+        if previous[0] + previous[1] > current[0]:
+            raise EditError('Edits overlap')
+
+    out = []
+    position = 0
+    for start, delete, insert in parsed:
+        out.extend(lines[position:start])
+        out.append(insert)
+        position = start + delete
+    out.extend(lines[position:])
+    return b''.join(out)
+
+
+def save_file(server, path: str, base_sha256: str | None, *, content: bytes | None = None,
+              edits: list[dict] | None = None, result_sha256: str | None = None) -> str:
+    """Saves *path* from *content* or from *edits* against the base, and
+    returns the new file's SHA-256.
+
+    Raises SaveConflict if the file doesn't match *base_sha256* (no check
+    when it is None, e.g. for old clients), EditError if the edits don't
+    apply, come without *result_sha256* or don't produce it.
+    """
+    if edits is not None and not result_sha256:
+        raise EditError('Edits need the sha256 of their result')
+    directory, name = posixpath.split(path)
+    client = ssh_mgr.get_client(server.ip_address)
+    try:
+        if edits is not None or base_sha256:
+            sftp = client.open_sftp()
+            try:
+                with sftp.open(path, 'rb') as f:
+                    current = f.read()
+            finally:
+                sftp.close()
+            if base_sha256 and sha256_hex(current) != base_sha256:
+                raise SaveConflict(sha256_hex(current))
+            if edits is not None:
+                content = apply_edits(current, edits)
+
+        checksum = sha256_hex(content)
+        if result_sha256 and result_sha256.lower() != checksum:
+            raise EditError('The edits did not produce the expected content')
+
+        temp = posixpath.join(directory, f'.{name}.{uuid.uuid4().hex[:8]}.save')
+        script = _SAVE_SCRIPT.format(
+            path=shlex.quote(path),
+            temp=shlex.quote(temp),
+            base=shlex.quote(base_sha256 or ''),
+            conflict=_CONFLICT_STATUS,
+        )
+        stdin, stdout, stderr = client.exec_command(script, timeout=60)
+        channel = stdin.channel
+        channel.sendall(content)
+        channel.shutdown_write()
+        status = channel.recv_exit_status()
+        if status == _CONFLICT_STATUS:
+            raise SaveConflict(stdout.read().decode().strip())
+        if status != 0:
+            err = stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(f'Save failed (status {status}): {err}')
+    finally:
+        client.close()
+        listing_cache.invalidate(server.id, directory)
+    return checksum
+
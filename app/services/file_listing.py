@@ -0,0 +1,172 @@
+"""
+Directory listings and disk usage for the file browser.
+
+Listings are cached in memory per (server, path) for File_List_Cache_Seconds,
+so moving back and forth through the browser doesn't open a new SFTP session
+on every click. PGSM's own writes (uploads, saves, deletes) invalidate the
+directories they touch; changes made on the server itself show up once the
+entry expires, or straight away with ?refresh=1.
+
+disk_usage() sizes a whole subtree with a single `find | awk` over SSH, which
+sums it on the container and sends back one line per directory, instead of
+a stat round trip per file.
+"""
+import posixpath
+import shlex
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.ssh import SSHManager
+
+ssh_mgr = SSHManager()
+
+# Listings kept at most; least recently used are evicted first
+_MAX_ENTRIES = 512
+# Seconds a disk usage scan may run on the container
+_DU_TIMEOUT = 120
+
+# Sums apparent size, allocated size (512-byte blocks), files and
+# subdirectories for the root and every directory down to -v depth=N.
+# Input lines are "<type> <size> <blocks> <path relative to the root>".
+_DU_AWK = r'''
+{
+    type = $1; size = $2; blocks = $3
+    path = substr($0, length($1) + length($2) + length($3) + 4)
+    n = split(path, parts, "/")
+    bytes[""] += size; disk[""] += blocks
+    if (type == "f") files[""]++; else if (type == "d") dirs[""]++
+    key = ""
+    for (i = 1; i < n && i <= depth; i++) {
+        key = (i == 1) ? parts[1] : key "/" parts[i]
+        bytes[key] += size; disk[key] += blocks
+        if (type == "f") files[key]++; else if (type == "d") dirs[key]++
+    }
+    if (type == "d" && n <= depth) seen[path] = 1
+}
+END {
+    printf "%.0f\t%.0f\t%d\t%d\t\n", bytes[""], disk[""] * 512, files[""], dirs[""]
+    for (p in seen) printf "%.0f\t%.0f\t%d\t%d\t%s\n", bytes[p], disk[p] * 512, files[p], dirs[p], p
+}
+'''
+
+
+class ListingCache:
+    """Short-lived, size-bounded cache of directory listings keyed by (server, path)."""
+
+    def __init__(self):
+        self._ttl = 10
+        self._lock = threading.Lock()
+        # (server_id, path) -> (fetched_at, entries)
+        self._entries: OrderedDict[tuple[str, str], tuple[float, list[dict]]] = OrderedDict()
+
+    def init_app(self, app) -> None:
+        self._ttl = app.config['FILE_LIST_CACHE_SECONDS']
+
+    def get(self, server_id: str, path: str) -> list[dict] | None:
+        key = (server_id, _normalize(path))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[0] > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def put(self, server_id: str, path: str, entries: list[dict]) -> None:
+        if self._ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(server_id, _normalize(path))] = (time.monotonic(), entries)
+            self._entries.move_to_end((server_id, _normalize(path)))
+            while len(self._entries) > _MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, server_id: str, path: str, recursive: bool = False) -> None:
+        """Drops the listing of *path*; with *recursive*, every listing below it too."""
+        path = _normalize(path)
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == server_id and (key[1] == path or (recursive and key[1].startswith(prefix))):
+                    del self._entries[key]
+
+    def drop_server(self, server_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == server_id]:
+                del self._entries[key]
+
+
+def list_directory(server, path: str, refresh: bool = False) -> list[dict]:
+    """Returns *path*'s entries (directories first, then by name), from the
+    cache unless *refresh*. Raises on SFTP errors."""
+    if not refresh:
+        cached = listing_cache.get(server.id, path)
+        if cached is not None:
+            return cached
+
+    client, sftp = ssh_mgr.get_sftp(server.ip_address)
+    try:
+        entries = []
+        for attr in sftp.listdir_attr(path):
+            entries.append({
+                'name': attr.filename,
+                'is_dir': stat.S_ISDIR(attr.st_mode),
+                'size': attr.st_size,
+                'path': (path.rstrip('/') + '/' + attr.filename),
+            })
+        entries.sort(key=lambda e: (not e['is_dir'], e['name'].lower()))
+    finally:
+        sftp.close()
+        client.close()
+
+    listing_cache.put(server.id, path, entries)
+    return entries
+
+
+def disk_usage(server, path: str, depth: int = 1) -> dict:
+    """Recursive size and file counts of *path* and of its directories down
+    to *depth* levels, largest first.
+
+    Stays on *path*'s filesystem and doesn't follow symlinks. Sizes are
+    apparent (bytes) and allocated (disk_bytes); unreadable entries are skipped.
+    """
+    path = _normalize(path)
+    quoted = shlex.quote(path)
+    command = (
+        f'test -d {quoted} && find {quoted} -xdev -mindepth 1 -printf "%y %s %b %P\\n" 2>/dev/null'
+        f' | awk -v depth={int(depth)} {shlex.quote(_DU_AWK)}'
+    )
+    out, err = ssh_mgr.exec_threaded(server.ip_address, command, timeout=_DU_TIMEOUT)
+
+    total = None
+    directories = []
+    for line in out.splitlines():
+        fields = line.split('\t', 4)
+        if len(fields) != 5:
+            continue
+        entry = {
+            'bytes': int(fields[0]),
+            'disk_bytes': int(fields[1]),
+            'files': int(fields[2]),
+            'dirs': int(fields[3]),
+        }
+        if not fields[4]:
+            total = entry
+        else:
+            directories.append({'path': posixpath.join(path, fields[4]), **entry})
+    if total is None:
+        raise RuntimeError(err.strip() or f'{path} is not a directory')
+
+    directories.sort(key=lambda d: d['bytes'], reverse=True)
+    return {'path': path, 'depth': depth, **total, 'directories': directories}
+
+
+def _normalize(path: str) -> str:
+    return posixpath.normpath('/' + path.lstrip('/'))
+
+
+listing_cache = ListingCache()
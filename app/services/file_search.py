@@ -0,0 +1,198 @@
+"""
+Content search across a game server's files (and across several servers).
+
+A search is one bounded `find | xargs grep` on the container: find applies
+the path, name glob, size and age limits, grep does the matching with line
+numbers and context, and `timeout` caps the run time. Output is parsed as it
+arrives into matches (file, line, text, before/after context) and yielded
+one by one, so the caller can stream them; once enough matches have been
+read the channel is closed and the remote pipeline dies of SIGPIPE.
+"""
+import logging
+import shlex
+from collections import deque
+from dataclasses import dataclass
+
+import eventlet
+from eventlet import tpool
+from eventlet.greenpool import GreenPool
+from eventlet.queue import Queue
+from flask import current_app
+
+from app.services.ssh import SSHManager
+
+log = logging.getLogger(__name__)
+
+ssh_mgr = SSHManager()
+
+# Lines reported per file before grep moves on
+_MAX_PER_FILE = 50
+# Longest line text returned; the rest is cut
+_MAX_LINE_CHARS = 400
+_READ_SIZE = 64 * 1024
+
+
+@dataclass
+class SearchOptions:
+    query: str
+    path: str = '/PGSM'
+    glob: str | None = None              # find -name pattern, e.g. *.yml
+    regex: bool = False                  # extended regex instead of a fixed string
+    ignore_case: bool = False
+    context: int = 0                     # lines of context before and after
+    max_size_kb: int = 10 * 1024         # skip larger files
+    modified_within: int | None = None   # minutes; skip older files
+    limit: int = 200                     # matches to return
+
+    def command(self, timeout: int) -> str:
+        find = ['find', shlex.quote(self.path), '-xdev', '-type', 'f', '-size', f'-{self.max_size_kb + 1}k']
+        if self.glob:
+            find += ['-name', shlex.quote(self.glob)]
+        if self.modified_within:
+            find += ['-mmin', f'-{self.modified_within}']
+        grep = ['grep', '-I', '-n', '-H', '--null', '-m', str(_MAX_PER_FILE), '-E' if self.regex else '-F']
+        if self.ignore_case:
+            grep.append('-i')
+        if self.context:
+            grep += ['-C', str(self.context)]
+        grep += ['-e', shlex.quote(self.query)]
+        return (
+            f'timeout {timeout} nice -n 10 {" ".join(find)} -print0 2>/dev/null'
+            f' | timeout {timeout} xargs -0 -r {" ".join(grep)} -- 2>/dev/null'
+        )
+
+
+def search_server(server, options: SearchOptions):
+    """Yields matches for *options* on *server* as they are found:
+    {'file', 'line', 'text', 'before': [[line, text]], 'after': [[line, text]]}.
+
+    Stops after options.limit matches. Raises on SSH errors.
+    """
+    timeout = current_app.config['FILE_SEARCH_TIMEOUT']
+    client = ssh_mgr.get_client(server.ip_address)
+    try:
+        _, stdout, _ = client.exec_command(options.command(timeout), timeout=timeout + 5)
+        channel = stdout.channel
+        found = 0
+        for match in _group_matches(_read_lines(channel), options.context):
+            yield match
+            found += 1
+            if found >= options.limit:
+                return
+    finally:
+        client.close()
+
+
+def search_servers(servers, options: SearchOptions, concurrency: int):
+    """Runs *options* on each of *servers*, at most *concurrency* at a time,
+    and yields results as they arrive from any of them.
+
+    Yields {'server_id', 'server_name', **match} for matches and
+    {'server_id', 'server_name', 'error'} for servers that failed. At most
+    options.limit matches are yielded in total.
+    """
+    app = current_app._get_current_object()
+    results = Queue()
+    done = object()
+    state = {'remaining': options.limit}
+
+    def run(server):
+        tag = {'server_id': server.id, 'server_name': server.name}
+        with app.app_context():
+            try:
+                for match in search_server(server, options):
+                    if state['remaining'] <= 0:
+                        break
+                    state['remaining'] -= 1
+                    results.put({**tag, **match})
+            except Exception as e:
+                results.put({**tag, 'error': str(e) or e.__class__.__name__})
+        results.put(done)
+
+    pool = GreenPool(max(1, concurrency))
+    for server in servers:
+        pool.spawn_n(run, server)
+
+    pending = len(servers)
+    try:
+        while pending:
+            item = results.get()
+            if item is done:
+                pending -= 1
+            else:
+                yield item
+    finally:
+        # Caller stopped reading (limit reached or client gone): stop the rest
+        state['remaining'] = 0
+        eventlet.spawn_n(pool.waitall)
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _read_lines(channel):
+    """Yields grep's output lines as (file, line number, is_match, text),
+    or None for a context group separator ("--")."""
+    buf = b''
+    while True:
+        # paramiko blocks on real threading primitives; keep the hub free
+        chunk = tpool.execute(channel.recv, _READ_SIZE)
+        if chunk:
+            buf += chunk
+            *lines, buf = buf.split(b'\n')
+        else:
+            lines, buf = ([buf] if buf else []), b''
+        for raw in lines:
+            if raw == b'--':
+                yield None
+                continue
+            # --null: "<file>\0<n>:<text>" for matches, "<file>\0<n>-<text>" for context
+            name, sep, rest = raw.partition(b'\0')
+            if not sep:
+                continue
+            number, kind, text = rest.partition(b':')
+            if not kind or not number.isdigit():
+                number, kind, text = rest.partition(b'-')
+                if not kind or not number.isdigit():
+                    continue
+            yield (
+                name.decode(errors='replace'),
+                int(number),
+                kind == b':',
+                text[:_MAX_LINE_CHARS].decode(errors='replace'),
+            )
+        if not chunk:
+            return
+
+
+def _group_matches(lines, context: int):
+    """Turns grep lines into matches with up to *context* lines either side.
+
+    grep merges overlapping context; a line shared by two matches is given
+    to both (after the first, before the second).
+    """
+    recent = deque(maxlen=context or None)
+    open_matches = []
+
+    def complete(file, number):
+        # Matches whose after-context can't grow any more
+        ready = [m for m in open_matches if m['file'] != file or number - m['line'] > context]
+        for m in ready:
+            open_matches.remove(m)
+        return ready
+
+    for item in lines:
+        if item is None:
+            recent.clear()
+            continue
+        file, number, is_match, text = item
+        yield from complete(file, number)
+        if recent and recent[-1][0] != file:
+            recent.clear()
+        for m in open_matches:
+            m['after'].append([number, text])
+        if is_match:
+            before = [[n, t] for f, n, t in recent if number - n <= context] if context else []
+            open_matches.append({'file': file, 'line': number, 'text': text, 'before': before, 'after': []})
+        if context:
+            recent.append((file, number, text))
+    yield from open_matches
@@ -0,0 +1,202 @@
+"""
+Chunked, resumable uploads into a game server's filesystem.
+
+An upload is a FileUpload row plus a sparse temp file next to its
+destination. The browser sends fixed-size parts, several at once; each part
+is written at its offset over its own SFTP session with pipelined writes and
+hashed on the way through, and is only recorded (as a FileUploadPart) once
+all of its bytes arrived and the SHA-256 matches. An interrupted upload
+resumes by sending just the missing parts. Commit checks that every part is
+present and renames the temp file over the destination in one step, so the
+destination is never seen half-written.
+"""
+import hashlib
+import logging
+import posixpath
+import uuid
+from datetime import datetime, timedelta
+
+from eventlet import tpool
+from flask import current_app
+
+from app.extensions import db
+from app.models.file_upload import FileUpload, FileUploadPart
+from app.services.file_listing import listing_cache
+from app.services.ssh import SSHManager
+
+log = logging.getLogger(__name__)
+
+ssh_mgr = SSHManager()
+
+# Bytes read from the request body per SFTP write
+_READ_SIZE = 256 * 1024
+
+
+class UploadError(ValueError):
+    """The upload request can't be honoured as given (bad part, incomplete upload, ...)."""
+
+
+class UploadManager:
+    """Creates, fills and commits chunked uploads."""
+
+    def start(self, server, directory: str, name: str, size: int, fingerprint: str) -> FileUpload:
+        """Returns the upload for *name* in *directory*, resuming a matching
+        unfinished one (same destination, size and fingerprint) if there is one.
+
+        A new upload gets a temp file of the final size, so parts can be written
+        at their offsets in any order.
+        """
+        if not name or '/' in name or name in ('.', '..'):
+            raise UploadError('Invalid file name')
+        if size < 0:
+            raise UploadError('Invalid file size')
+        dest_path = posixpath.join(directory, name)
+
+        self.prune(server)
+        upload = FileUpload.query.filter_by(
+            server_id=server.id, dest_path=dest_path, size=size, fingerprint=fingerprint,
+        ).order_by(FileUpload.updated_at.desc()).first()
+        if upload is not None:
+            return upload
+
+        upload_id = uuid.uuid4().hex
+        upload = FileUpload(
+            id=upload_id,
+            server_id=server.id,
+            dest_path=dest_path,
+            size=size,
+            part_size=current_app.config['FILE_UPLOAD_PART_BYTES'],
+            fingerprint=fingerprint,
+            temp_path=posixpath.join(directory, f'.{name}.{upload_id[:8]}.upload'),
+        )
+
+        client, sftp = ssh_mgr.get_sftp(server.ip_address)
+        try:
+            with sftp.open(upload.temp_path, 'wb') as f:
+                f.truncate(size)
+        finally:
+            sftp.close()
+            client.close()
+
+        listing_cache.invalidate(server.id, directory)
+        db.session.add(upload)
+        db.session.commit()
+        return upload
+
+    def write_part(self, upload: FileUpload, server, index: int, read, sha256: str | None = None) -> str:
+        """Writes part *index* from *read* (a file-like read callable) at its
+        offset and records it. Returns the part's SHA-256.
+
+        Raises UploadError if the body is short or doesn't match *sha256*; the
+        part is then not recorded and can be sent again.
+        """
+        if not 0 <= index < upload.parts_total:
+            raise UploadError(f'Part {index} is out of range (0-{upload.parts_total - 1})')
+        offset, length = upload.part_range(index)
+
+        digest = hashlib.sha256()
+        received = 0
+        client, sftp = ssh_mgr.get_sftp(server.ip_address)
+        try:
+            with sftp.open(upload.temp_path, 'r+b') as f:
+                # Don't wait for each write's ack; errors surface on close
+                f.set_pipelined(True)
+                f.seek(offset)
+                while received < length:
+                    chunk = read(min(_READ_SIZE, length - received))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    received += len(chunk)
+                    # paramiko blocks on real threading primitives; keep the hub free
+                    tpool.execute(f.write, chunk)
+                tpool.execute(f.close)
+        finally:
+            sftp.close()
+            client.close()
+
+        if received != length:
+            raise UploadError(f'Part {index} is incomplete ({received} of {length} bytes)')
+        checksum = digest.hexdigest()
+        if sha256 and sha256.lower() != checksum:
+            raise UploadError(f'Part {index} checksum mismatch')
+
+        db.session.merge(FileUploadPart(upload_id=upload.id, index=index, sha256=checksum))
+        upload.updated_at = datetime.utcnow()
+        db.session.commit()
+        return checksum
+
+    def commit(self, upload: FileUpload, server) -> str:
+        """Moves a complete upload into place and returns its path.
+
+        Raises UploadError if parts are missing or the temp file is the wrong size.
+        """
+        missing = self.missing_parts(upload)
+        if missing:
+            raise UploadError(f'{len(missing)} part(s) not uploaded yet')
+
+        client, sftp = ssh_mgr.get_sftp(server.ip_address)
+        try:
+            actual = sftp.stat(upload.temp_path).st_size
+            if actual != upload.size:
+                raise UploadError(f'Upload is {actual} bytes on the server, expected {upload.size}')
+            # Atomic replace of any existing file (OpenSSH posix-rename extension)
+            sftp.posix_rename(upload.temp_path, upload.dest_path)
+        finally:
+            sftp.close()
+            client.close()
+
+        dest_path = upload.dest_path
+        listing_cache.invalidate(server.id, posixpath.dirname(dest_path))
+        db.session.delete(upload)
+        db.session.commit()
+        return dest_path
+
+    def abort(self, upload: FileUpload, server) -> None:
+        """Deletes *upload* and its temp file."""
+        self._remove_temp(server, upload.temp_path)
+        db.session.delete(upload)
+        db.session.commit()
+
+    def prune(self, server) -> None:
+        """Aborts *server*'s uploads that haven't received a part within
+        File_Upload_Expire_Hours."""
+        cutoff = datetime.utcnow() - timedelta(hours=current_app.config['FILE_UPLOAD_EXPIRE_HOURS'])
+        stale = FileUpload.query.filter(
+            FileUpload.server_id == server.id, FileUpload.updated_at < cutoff,
+        ).all()
+        for upload in stale:
+            self._remove_temp(server, upload.temp_path)
+            db.session.delete(upload)
+        if stale:
+            db.session.commit()
+
+    def missing_parts(self, upload: FileUpload) -> list[int]:
+        received = {part.index for part in upload.parts}
+        return [i for i in range(upload.parts_total) if i not in received]
+
+    def describe(self, upload: FileUpload) -> dict:
+        return {
+            'upload_id': upload.id,
+            'path': upload.dest_path,
+            'size': upload.size,
+            'part_size': upload.part_size,
+            'parts_total': upload.parts_total,
+            'received': sorted(part.index for part in upload.parts),
+        }
+
+    def _remove_temp(self, server, temp_path: str) -> None:
+        listing_cache.invalidate(server.id, posixpath.dirname(temp_path))
+        try:
+            client, sftp = ssh_mgr.get_sftp(server.ip_address)
+            try:
+                sftp.remove(temp_path)
+            finally:
+                sftp.close()
+                client.close()
+        except Exception as e:
+            # Server offline or file already gone; the row goes regardless
+            log.warning('Could not remove upload temp file %s: %s', temp_path, e)
+
+
+upload_manager = UploadManager()
@@ -0,0 +1,211 @@
+"""
+Read-only paged view of large files, and live follow (tail -f).
+
+read_page() fetches one byte window of a file with an SFTP seek + read and
+trims it to whole lines, returning the exact byte span it covers. The
+viewer pages backwards and forwards from those offsets, so it never reads
+more than one page of a multi-gigabyte log at a time.
+
+Follow mode is a FileTail per Socket.IO client: a background task that
+keeps one SFTP handle open, polls the file's size and emits whatever was
+appended since the last offset as `file_tail` events. The path is stat'ed
+too: a file that shrinks (truncated) or was replaced (rotated, like
+latest.log on restart, while the open handle still points at the renamed
+old file) is reopened and followed again from the start.
+"""
+import codecs
+import logging
+
+from eventlet import tpool
+
+from app.extensions import socketio
+from app.services.ssh import SSHManager
+
+log = logging.getLogger(__name__)
+
+ssh_mgr = SSHManager()
+
+# Largest page a client may ask for
+MAX_PAGE_BYTES = 1024 * 1024
+# Seconds between size checks while following
+_TAIL_POLL_INTERVAL = 1.0
+# Most bytes sent per poll; a writer faster than this is skipped ahead
+_TAIL_MAX_CHUNK = 256 * 1024
+
+
+def read_page(server, path: str, offset: int, length: int) -> dict:
+    """Returns up to *length* bytes of *path* from *offset* (negative: from
+    the end, so -N is the last N bytes), trimmed to whole lines.
+
+    A partial first line is dropped unless *offset* is a line start, and a
+    partial last line is dropped unless the window reaches end of file; a
+    single line longer than the window is returned as is. Returns {path,
+    size, mtime, start, end, text, binary}: the next page starts at end, the
+    previous one ends at start.
+    """
+    length = max(1, min(length, MAX_PAGE_BYTES))
+    client, sftp = ssh_mgr.get_sftp(server.ip_address)
+    try:
+        with sftp.open(path, 'rb') as f:
+            attrs = f.stat()
+            size = attrs.st_size
+            if offset < 0:
+                offset += size
+            offset = max(0, min(offset, size))
+            # One byte before the window tells whether offset is a line start
+            lead = 1 if offset > 0 else 0
+            f.seek(offset - lead)
+            raw = _read_exactly(f, min(length, size - offset) + lead)
+    finally:
+        sftp.close()
+        client.close()
+
+    start, end = offset, offset + len(raw) - lead
+    data = raw[lead:]
+    if lead and raw[:1] != b'\n':
+        cut = data.find(b'\n')
+        if 0 <= cut < len(data) - 1:
+            data = data[cut + 1:]
+            start += cut + 1
+    if end < size:
+        cut = data.rfind(b'\n')
+        if cut >= 0:
+            end -= len(data) - cut - 1
+            data = data[:cut + 1]
+
+    return {
+        'path': path,
+        'size': size,
+        'mtime': attrs.st_mtime,
+        'start': start,
+        'end': end,
+        'text': data.decode('utf-8', errors='replace'),
+        'binary': b'\x00' in data[:8192],
+    }
+
+
+class FileTail:
+    """Follows one file for one client, from a byte offset."""
+
+    def __init__(self, sid: str, server_id: str, ip: str, path: str, offset: int):
+        self.sid = sid
+        self.server_id = server_id
+        self.ip = ip
+        self.path = path
+        self.offset = offset
+        self.stopped = False
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def run(self, app) -> None:
+        """Background task: polls the file and emits appended bytes."""
+        client = sftp = None
+        try:
+            with app.app_context():
+                client, sftp = ssh_mgr.get_sftp(self.ip)
+            f = sftp.open(self.path, 'rb')
+            decoder = _utf8_decoder()
+            while not self.stopped:
+                # paramiko blocks on real threading primitives; keep the hub free
+                size, replaced = tpool.execute(_poll, sftp, f, self.path)
+                if replaced or size < self.offset:
+                    if replaced:
+                        f.close()
+                        f = tpool.execute(sftp.open, self.path, 'rb')
+                        size = tpool.execute(f.stat).st_size
+                    self.offset = 0
+                    decoder = _utf8_decoder()
+                    self._emit({'reset': True})
+                if size > self.offset:
+                    skipped = max(0, size - self.offset - _TAIL_MAX_CHUNK)
+                    self.offset += skipped
+                    f.seek(self.offset)
+                    data = tpool.execute(_read_exactly, f, size - self.offset)
+                    self.offset += len(data)
+                    self._emit({'data': decoder.decode(data), 'skipped': skipped})
+                socketio.sleep(_TAIL_POLL_INTERVAL)
+            f.close()
+        except Exception as e:
+            log.info('Tail of %s on %s ended: %s', self.path, self.server_id, e)
+            self._emit({'error': str(e) or e.__class__.__name__})
+        finally:
+            self.stopped = True
+            file_tails._forget(self)
+            if sftp is not None:
+                sftp.close()
+            if client is not None:
+                client.close()
+
+    def _emit(self, payload: dict) -> None:
+        if not self.stopped:
+            socketio.emit('file_tail', {'path': self.path, 'offset': self.offset, **payload}, to=self.sid)
+
+
+class FileTailManager:
+    """One FileTail per Socket.IO client; following a new file replaces the old."""
+
+    def __init__(self):
+        self._app = None
+        self._tails: dict[str, FileTail] = {}
+
+    def init_app(self, app) -> None:
+        self._app = app
+
+    def follow(self, sid: str, server, path: str, offset: int) -> None:
+        """Starts following *path* from *offset* for *sid*."""
+        self.stop(sid)
+        tail = FileTail(sid, server.id, server.ip_address, path, offset)
+        self._tails[sid] = tail
+        socketio.start_background_task(tail.run, self._app)
+
+    def stop(self, sid: str) -> None:
+        tail = self._tails.pop(sid, None)
+        if tail is not None:
+            tail.stop()
+
+    def _forget(self, tail: FileTail) -> None:
+        if self._tails.get(tail.sid) is tail:
+            del self._tails[tail.sid]
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _read_exactly(f, length: int) -> bytes:
+    """Reads *length* bytes (fewer at end of file); SFTP reads can come back short."""
+    chunks = []
+    while length > 0:
+        chunk = f.read(length)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def _poll(sftp, f, path: str) -> tuple[int, bool]:
+    """Returns (size of the open file, whether *path* now names another file).
+
+    SFTP has no inode numbers, so a replacement shows as the path's size or
+    mtime differing from the handle's while the handle's stay put (the old
+    file is no longer written). The handle is stat'ed on both sides of the
+    path so an append landing in between isn't mistaken for one. A path
+    that is briefly missing mid-rotation counts as not replaced yet.
+    """
+    before = f.stat()
+    try:
+        current = sftp.stat(path)
+    except FileNotFoundError:
+        return before.st_size, False
+    after = f.stat()
+    handle = (after.st_size, after.st_mtime)
+    replaced = (before.st_size, before.st_mtime) == handle != (current.st_size, current.st_mtime)
+    return after.st_size, replaced
+
+
+def _utf8_decoder():
+    # Appended bytes can end mid-character; the decoder holds the rest back
+    return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+file_tails = FileTailManager()
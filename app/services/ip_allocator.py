@@ -0,0 +1,171 @@
+"""
+VLAN IP allocation backed by the ip_pools / ip_leases tables.
+
+Each pool keeps a cursor (next_ip) to the next never-used address, and
+released addresses stay in ip_leases with server_id NULL as a free list.
+Allocation takes the lowest free-list entry (one indexed lookup) or bumps the
+cursor (one row update), so cost does not depend on subnet or fleet size.
+Both paths claim the address with a conditional UPDATE, so concurrent creates
+can never receive the same IP.
+"""
+import ipaddress
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.network import IpLease, IpPool
+
+# Keys every PGSM_VLAN_Extra_Pools entry must set (bridge defaults to PGSM)
+_REQUIRED_POOL_KEYS = ('name', 'subnet', 'gateway', 'start')
+
+# Cursor bumps tried per pool before giving up (only exceeded if many addresses
+# ahead of the cursor were leased outside the allocator)
+_MAX_BUMP_ATTEMPTS = 256
+
+
+class IpAllocator:
+    """Hands out and releases PGSM VLAN addresses for game servers."""
+
+    def get_pools(self) -> list[dict]:
+        """Returns the configured pools in allocation order, default pool first.
+
+        Each dict has name, subnet, gateway, start, bridge and prefixlen.
+        Raises ValueError naming the entry and key if PGSM_VLAN_Extra_Pools is
+        incomplete, rather than letting a pool inherit another pool's gateway.
+        """
+        cfg = current_app.config
+        pools = [{
+            'name': 'default',
+            'subnet': cfg['PGSM_VLAN_SUBNET'],
+            'gateway': cfg['PGSM_VLAN_GATEWAY'],
+            'start': cfg['PGSM_VLAN_IP_START'],
+            'bridge': 'PGSM',
+        }]
+        for index, extra in enumerate(cfg['PGSM_VLAN_EXTRA_POOLS']):
+            missing = [key for key in _REQUIRED_POOL_KEYS if not extra.get(key)]
+            if missing:
+                raise ValueError(
+                    f"PGSM_VLAN_Extra_Pools entry {index} is missing {', '.join(map(repr, missing))}"
+                )
+            pools.append({'bridge': 'PGSM', **extra})
+        names = set()
+        for pool in pools:
+            network = ipaddress.IPv4Network(pool['subnet'])
+            for key in ('gateway', 'start'):
+                if ipaddress.IPv4Address(pool[key]) not in network:
+                    raise ValueError(f"VLAN pool {pool['name']!r}: {key} {pool[key]} is outside {network}")
+            if pool['name'] in names:
+                raise ValueError(f"VLAN pool name {pool['name']!r} is used more than once")
+            names.add(pool['name'])
+            pool['prefixlen'] = network.prefixlen
+        return pools
+
+    def get_pool(self, name: str) -> dict:
+        pool = next((p for p in self.get_pools() if p['name'] == name), None)
+        if pool is None:
+            raise ValueError(f'Unknown VLAN pool: {name}')
+        return pool
+
+    def allocate(self, server_id: str, pool_name: str | None = None) -> dict:
+        """Leases an address to *server_id* and commits.
+
+        Tries *pool_name* only, or every configured pool in order. Idempotent:
+        returns the existing lease if the server already holds one. Returns the
+        pool dict plus 'ip'. Raises RuntimeError if every candidate pool is full.
+        """
+        existing = IpLease.query.filter_by(server_id=server_id).first()
+        if existing:
+            return {**self.get_pool(existing.pool), 'ip': existing.ip}
+
+        pools = [self.get_pool(pool_name)] if pool_name else self.get_pools()
+        for pool in pools:
+            self._ensure_pool(pool)
+            ip = self._claim_free(pool['name'], server_id) or self._claim_next(pool, server_id)
+            if ip:
+                return {**pool, 'ip': ip}
+        raise RuntimeError('No available IPs in the PGSM VLAN pools.')
+
+    def release(self, server_id: str) -> None:
+        """Returns *server_id*'s address to its pool's free list (caller commits)."""
+        db.session.execute(
+            update(IpLease)
+            .where(IpLease.server_id == server_id)
+            .values(server_id=None, leased_at=None)
+        )
+
+    # ── Internal helpers ──────────────────────────────────────────────────────
+
+    def _ensure_pool(self, pool: dict) -> None:
+        """Creates or updates the IpPool cursor row for a configured pool."""
+        network = ipaddress.IPv4Network(pool['subnet'])
+        start = max(int(ipaddress.IPv4Address(pool['start'])), int(network.network_address) + 1)
+        last = int(network.broadcast_address) - 1
+        row = db.session.get(IpPool, pool['name'])
+        if row is None:
+            db.session.add(IpPool(name=pool['name'], subnet=pool['subnet'], next_ip=start, last_ip=last))
+        elif row.subnet != pool['subnet'] or row.last_ip != last:
+            row.subnet = pool['subnet']
+            row.last_ip = last
+            row.next_ip = max(row.next_ip, start)
+        else:
+            return
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Created concurrently
+
+    def _claim_free(self, pool_name: str, server_id: str) -> str | None:
+        """Claims the lowest released address in the pool, or returns None."""
+        lowest_free = (
+            select(IpLease.id)
+            .where(IpLease.pool == pool_name, IpLease.server_id.is_(None))
+            .order_by(IpLease.ip_int)
+            .limit(1)
+            .scalar_subquery()
+        )
+        result = db.session.execute(
+            update(IpLease)
+            .where(IpLease.id == lowest_free, IpLease.server_id.is_(None))
+            .values(server_id=server_id, leased_at=datetime.utcnow())
+        )
+        db.session.commit()
+        if result.rowcount != 1:
+            return None
+        return db.session.execute(
+            select(IpLease.ip).where(IpLease.server_id == server_id)
+        ).scalar()
+
+    def _claim_next(self, pool: dict, server_id: str) -> str | None:
+        """Advances the pool cursor and leases the address it passed, or returns None if exhausted."""
+        gateway = int(ipaddress.IPv4Address(pool['gateway'])) if pool.get('gateway') else None
+        for _ in range(_MAX_BUMP_ATTEMPTS):
+            next_ip, last_ip = db.session.execute(
+                select(IpPool.next_ip, IpPool.last_ip).where(IpPool.name == pool['name'])
+            ).one()
+            if next_ip > last_ip:
+                return None
+            bumped = db.session.execute(
+                update(IpPool)
+                .where(IpPool.name == pool['name'], IpPool.next_ip == next_ip)
+                .values(next_ip=next_ip + 1)
+            )
+            db.session.commit()
+            if bumped.rowcount != 1:
+                continue  # Another create moved the cursor first; re-read it
+            if next_ip == gateway:
+                continue
+
+            ip = str(ipaddress.IPv4Address(next_ip))
+            db.session.add(IpLease(
+                pool=pool['name'], ip=ip, ip_int=next_ip,
+                server_id=server_id, leased_at=datetime.utcnow(),
+            ))
+            try:
+                db.session.commit()
+                return ip
+            except IntegrityError:
+                db.session.rollback()  # Address already leased; keep advancing
+        return None
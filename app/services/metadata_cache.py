@@ -0,0 +1,144 @@
+"""
+Disk-backed cache for upstream version metadata (Mojang, Forge, Fabric).
+
+Documents are stored as JSON under instance/cache/metadata and revalidated
+with conditional requests (If-None-Match / If-Modified-Since) once they are
+older than their TTL. Stale documents are served immediately while a
+background thread revalidates them, and are kept indefinitely if the
+upstream is unreachable — only a completely cold cache blocks on the network.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+log = logging.getLogger(__name__)
+
+_REQUEST_TIMEOUT = 10
+
+
+class MetadataCache:
+    """Stale-while-revalidate JSON cache keyed by URL."""
+
+    def __init__(self):
+        self._dir: str | None = None
+        self._ttl = 600
+        self._lock = threading.Lock()
+        # url -> {'body', 'etag', 'last_modified', 'fetched_at'}
+        self._entries: dict[str, dict] = {}
+        # urls with a background revalidation in flight
+        self._refreshing: set[str] = set()
+
+    def init_app(self, app) -> None:
+        self._dir = os.path.join(app.instance_path, 'cache', 'metadata')
+        os.makedirs(self._dir, exist_ok=True)
+        self._ttl = app.config['METADATA_CACHE_TTL']
+
+    def get_json(self, url: str, ttl: int | None = None):
+        """Returns the parsed JSON document at *url*, from cache where possible.
+
+        Raises RuntimeError only if the document has never been fetched and the
+        upstream cannot be reached now.
+        """
+        ttl = self._ttl if ttl is None else ttl
+        entry = self._load(url)
+        if entry is None:
+            entry = self._refresh(url)
+            if entry is None:
+                raise RuntimeError(f'{url} is unreachable and has not been cached yet')
+        elif time.time() - entry['fetched_at'] > ttl:
+            self._refresh_async(url)
+        return entry['body']
+
+    def warm(self, urls: list[str]) -> None:
+        """Fetches or revalidates *urls* in a background thread."""
+        def _warm():
+            for url in urls:
+                self._refresh(url)
+
+        threading.Thread(target=_warm, daemon=True, name='pgsm-metadata-warm').start()
+
+    # ── Internal helpers ──────────────────────────────────────────────────────
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self._dir, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def _load(self, url: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is not None or self._dir is None:
+            return entry
+        try:
+            with open(self._path(url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._entries.setdefault(url, entry)
+        return entry
+
+    def _store(self, url: str, entry: dict) -> None:
+        with self._lock:
+            self._entries[url] = entry
+        if self._dir is None:
+            return
+        path = self._path(url)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning('Could not persist metadata cache entry for %s: %s', url, e)
+
+    def _refresh_async(self, url: str) -> None:
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def _run():
+            try:
+                self._refresh(url)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        threading.Thread(target=_run, daemon=True, name='pgsm-metadata-refresh').start()
+
+    def _refresh(self, url: str) -> dict | None:
+        """Revalidates *url* against the upstream. Returns the current entry,
+        which is the previous (stale) one if the upstream is unreachable."""
+        entry = self._load(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = requests.get(url, headers=headers, timeout=_REQUEST_TIMEOUT)
+            if response.status_code == 304 and entry:
+                entry = dict(entry, fetched_at=time.time())
+            else:
+                response.raise_for_status()
+                entry = {
+                    'body': response.json(),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.time(),
+                }
+        except Exception as e:
+            log.warning('Metadata refresh failed for %s (serving cached copy): %s', url, e)
+            return entry
+
+        self._store(url, entry)
+        return entry
+
+
+metadata_cache = MetadataCache()
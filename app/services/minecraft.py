@@ -1,8 +1,9 @@
 import os
 
-import requests
 from flask import current_app
 
+from app.services.metadata_cache import metadata_cache
+
 # Maps server_type → game code
 GAME_CODES = {
     'vanilla': 'MCJAV',
@@ -33,18 +34,29 @@ SERVER_TYPE_NAMES = {
     'import':  'Minecraft - Import',
 }
 
+# Archive formats accepted for the import server type. All of them are
+# extracted on the container by bsdtar reading from stdin.
+IMPORT_ARCHIVE_EXTENSIONS = ('.zip', '.tar.gz', '.tgz', '.tar.zst', '.tar.zstd')
+
 _FORGE_PROMOS_URL = 'https://files.minecraftforge.net/net/minecraftforge/forge/promotions_slim.json'
 _FORGE_INSTALLER_URL = 'https://maven.minecraftforge.net/net/minecraftforge/forge/{mc}-{forge}/forge-{mc}-{forge}-installer.jar'
 _FABRIC_LOADER_URL = 'https://meta.fabricmc.net/v2/versions/loader'
 
+# Per-version Mojang pages are content-addressed and never change once published
+_VERSION_PAGE_TTL = 7 * 24 * 3600
+
 
 class MinecraftService:
 
+    def get_metadata_urls(self) -> list[str]:
+        """Returns the upstream metadata documents worth warming at startup."""
+        return [current_app.config['MINECRAFT_MANIFEST_URL'], _FORGE_PROMOS_URL, _FABRIC_LOADER_URL]
+
     def get_vanilla_jar_url(self, version: str, snapshot: bool = False) -> str:
         """Resolves a Minecraft version string to its server JAR download URL via Mojang API.
         Directly absorbs the logic from the original Minecraft.py JavaManifester()."""
         manifest_url = current_app.config['MINECRAFT_MANIFEST_URL']
-        response = requests.get(manifest_url, timeout=10).json()
+        response = metadata_cache.get_json(manifest_url)
 
         if version == 'latest':
             version_id = (
@@ -61,14 +73,13 @@ class MinecraftService:
         if not version_entry:
             raise ValueError(f"Minecraft version '{version_id}' not found in Mojang manifest.")
 
-        version_page = requests.get(version_entry['url'], timeout=10).json()
+        version_page = metadata_cache.get_json(version_entry['url'], ttl=_VERSION_PAGE_TTL)
         return version_page['downloads']['server']['url']
 
     def get_available_versions(self, include_snapshots: bool = False) -> list[dict]:
         """Returns a list of available Minecraft versions from the Mojang manifest."""
         manifest_url = current_app.config['MINECRAFT_MANIFEST_URL']
-        response = requests.get(manifest_url, timeout=10).json()
-        versions = response['versions']
+        versions = metadata_cache.get_json(manifest_url)['versions']
         if not include_snapshots:
             versions = [v for v in versions if v['type'] == 'release']
         return versions
@@ -80,7 +91,7 @@ class MinecraftService:
             {'recommended': '47.3.12', 'latest': '47.3.12'}
         Either value may be None if not available for the given MC version.
         """
-        promos = requests.get(_FORGE_PROMOS_URL, timeout=10).json().get('promos', {})
+        promos = metadata_cache.get_json(_FORGE_PROMOS_URL).get('promos', {})
         return {
             'recommended': promos.get(f'{mc_version}-recommended'),
             'latest':      promos.get(f'{mc_version}-latest'),
@@ -101,7 +112,12 @@ class MinecraftService:
 
     def get_fabric_loader_versions(self) -> list[dict]:
         """Returns a list of available Fabric loader versions."""
-        return requests.get(_FABRIC_LOADER_URL, timeout=10).json()
+        return metadata_cache.get_json(_FABRIC_LOADER_URL)
+
+    def get_import_archive_extension(self, filename: str) -> str | None:
+        """Returns the matching IMPORT_ARCHIVE_EXTENSIONS suffix for *filename*, or None."""
+        lowered = filename.lower()
+        return next((ext for ext in IMPORT_ARCHIVE_EXTENSIONS if lowered.endswith(ext)), None)
 
     def get_script_path(self, server_type: str) -> str:
         """Returns the absolute path to the install script for a given server type."""
@@ -118,11 +134,9 @@ class MinecraftService:
         args = [f'type={server.server_type}']
 
         if server.server_type == 'import':
-            if not server.import_archive_url:
-                raise ValueError('import_archive_url is required for import server type')
-            # import_archive_url holds the local host path; the file will be
-            # uploaded to /tmp/server-archive.zip on the container by provision_server()
-            args.append('archive_path=/tmp/server-archive.zip')
+            # The archive has already been streamed into /PGSM by provision_server(),
+            # so the script only needs to flatten it and set up the service.
+            args.append('archive_extracted=true')
 
         elif server.server_type == 'forge':
             forge_url = self.get_forge_installer_url(server.game_version, server.forge_version)
@@ -157,9 +171,18 @@ class MinecraftService:
             f"hardcore={'true' if server.hardcore else 'false'}",
             "online-mode=true",
             "max-players=20",
-            "enable-rcon=false",
+            *self._rcon_properties(server),
             "white-list=false",
             "enable-query=true",
             f"query.port={server.game_port}",
         ]
         return "\n".join(lines) + "\n"
+
+    def _rcon_properties(self, server) -> list[str]:
+        if not server.rcon_password:
+            return ["enable-rcon=false"]
+        return [
+            "enable-rcon=true",
+            f"rcon.port={current_app.config['MINECRAFT_RCON_PORT']}",
+            f"rcon.password={server.rcon_password}",
+        ]
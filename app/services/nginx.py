@@ -1,8 +1,127 @@
+import glob
+import hashlib
+import logging
 import os
 import subprocess
+import threading
+import time
+from concurrent.futures import Future
 
+from eventlet import tpool
 from flask import current_app
 
+log = logging.getLogger(__name__)
+
+# Max seconds a caller blocks waiting for a coalesced reload to finish
+_RELOAD_WAIT_TIMEOUT = 60
+
+# Shared stream-level config (log_format) written alongside the per-server files.
+# nginx expands include globs in sorted order, and digits sort before letters,
+# so the "00-" prefix is what puts the log_format ahead of every
+# pgsm-<ct_id>.conf that uses it. It also keeps the file out of the
+# pgsm-[0-9]*.conf glob that resync_all treats as server confs.
+_COMMON_CONF_NAME = '00-pgsm-common.conf'
+# Earlier name, which sorted after the server confs (nginx -t: unknown log format)
+_LEGACY_COMMON_CONF_NAME = 'pgsm-common.conf'
+
+# Access log format parsed by app.services.traffic.TrafficTailer — keep in sync
+TRAFFIC_LOG_FORMAT_NAME = 'pgsm_traffic'
+TRAFFIC_LOG_FORMAT = (
+    '$time_iso8601 $protocol $status $bytes_received $bytes_sent '
+    '$session_time $upstream_addr $server_port'
+)
+
+
+class ReloadScheduler:
+    """Debounces nginx reload requests onto a single background thread.
+
+    Requests arriving within the debounce window of each other are merged into
+    one `nginx -t` + `nginx -s reload`. A burst is never held back longer than
+    max_delay in total, so a steady stream of changes still gets applied.
+    Every request gets a Future resolved with the outcome of the reload that
+    covered it.
+    """
+
+    def __init__(self):
+        self._debounce = 0.5
+        self._max_delay = 3.0
+        self._cond = threading.Condition()
+        self._pending: list[Future] = []
+        self._first_at = 0.0
+        self._last_at = 0.0
+        self._thread: threading.Thread | None = None
+        # False until a reload has succeeded, and again after one fails: the
+        # confs on disk may then differ from what nginx is running, so an
+        # unchanged conf is no reason to skip a reload
+        self.in_sync = False
+
+    def init_app(self, app) -> None:
+        self._debounce = app.config['NGINX_RELOAD_DEBOUNCE']
+        self._max_delay = max(self._debounce, app.config['NGINX_RELOAD_MAX_DELAY'])
+
+    def request(self) -> Future:
+        """Queues a reload and returns a Future for its result."""
+        future = Future()
+        now = time.monotonic()
+        with self._cond:
+            if not self._pending:
+                self._first_at = now
+            self._last_at = now
+            self._pending.append(future)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='pgsm-nginx-reload')
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    deadline = min(self._last_at + self._debounce, self._first_at + self._max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+
+            try:
+                _test_and_reload_nginx()
+            except Exception as e:
+                log.warning('Coalesced nginx reload (%d requests) failed: %s', len(batch), e)
+                self.in_sync = False
+                for future in batch:
+                    future.set_exception(e)
+            else:
+                self.in_sync = True
+                for future in batch:
+                    future.set_result(None)
+
+
+reload_scheduler = ReloadScheduler()
+
+
+def _test_and_reload_nginx() -> None:
+    # Test config first so errors are descriptive rather than silent.
+    for cmd in (['nginx', '-t'], ['sudo', 'nginx', '-t']):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            break
+    else:
+        raise RuntimeError(
+            f'nginx config test failed: {result.stderr.strip() or result.stdout.strip()}'
+        )
+
+    # Reload — try direct first (works when running as root),
+    # fall back to sudo granted via /etc/sudoers.d/pgsm-nginx.
+    for cmd in (['nginx', '-s', 'reload'], ['sudo', 'nginx', '-s', 'reload']):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            return
+    raise RuntimeError(f'nginx reload failed: {result.stderr.strip()}')
+
 
 class NginxService:
     """Manages nginx TCP stream proxy config files for game servers."""
@@ -11,6 +130,48 @@ class NginxService:
         conf_dir = current_app.config['NGINX_CONF_DIR']
         return os.path.join(conf_dir, f'pgsm-{server.ct_id}.conf')
 
+    def _write_common_conf(self) -> bool:
+        """Writes the shared stream-level config, removing the file under its
+        legacy name (a second log_format definition). Returns True if anything changed."""
+        conf_dir = current_app.config['NGINX_CONF_DIR']
+        content = (
+            "# PGSM Auto-generated: shared stream settings\n"
+            f"log_format {TRAFFIC_LOG_FORMAT_NAME} '{TRAFFIC_LOG_FORMAT}';\n"
+        )
+        changed = self._write_conf(os.path.join(conf_dir, _COMMON_CONF_NAME), content)
+        legacy = os.path.join(conf_dir, _LEGACY_COMMON_CONF_NAME)
+        if os.path.exists(legacy):
+            os.remove(legacy)
+            changed = True
+        return changed
+
+    @staticmethod
+    def _write_conf(path: str, content: str) -> bool:
+        """Atomically writes *content* to *path* unless it already matches.
+
+        Compares SHA-256 digests with the file on disk and returns False without
+        touching it when they are equal. Otherwise writes a temp file in the same
+        directory, fsyncs it and renames it over *path*, so nginx -t never sees a
+        half-written config. Returns True if the file changed.
+        """
+        data = content.encode()
+        try:
+            with open(path, 'rb') as f:
+                if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                    return False
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Suffix keeps the temp file out of nginx's *.conf include glob
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return True
+
     def _generate_stream_block(self, server) -> str:
         """Generates nginx stream blocks to TCP-proxy all of a server's ports.
 
@@ -24,6 +185,9 @@ class NginxService:
         with the http {} block that typically includes conf.d.
         This is a one-time manual setup prerequisite.
         """
+        access_log = (
+            f"    access_log {current_app.config['NGINX_TRAFFIC_LOG']} {TRAFFIC_LOG_FORMAT_NAME};\n"
+        )
         lines = [f"# PGSM Auto-generated: {server.name} (CT {server.ct_id})\n"]
         for entry in server.all_ports_with_protocols:
             port = entry['port']
@@ -39,6 +203,7 @@ class NginxService:
                     f"server {{\n"
                     f"    listen {port};\n"
                     f"    proxy_pass {name};\n"
+                    f"{access_log}"
                     f"}}\n"
                 )
             if protocol in ('udp', 'both'):
@@ -46,41 +211,77 @@ class NginxService:
                     f"server {{\n"
                     f"    listen {port} udp;\n"
                     f"    proxy_pass {name};\n"
+                    f"{access_log}"
                     f"}}\n"
                 )
             lines.append(block)
         return '\n'.join(lines)
 
-    def add_server(self, server) -> None:
-        """Writes an nginx conf file for the server and reloads nginx."""
-        path = self._conf_path(server)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f:
-            f.write(self._generate_stream_block(server))
-        self._reload_nginx()
+    def add_server(self, server, wait: bool = True) -> Future | None:
+        """Writes an nginx conf file for the server and schedules a reload.
 
-    def remove_server(self, server) -> None:
-        """Removes the nginx conf file for the server and reloads nginx."""
+        The reload is skipped (and None returned) if the generated config is
+        identical to what is already on disk and the last reload succeeded
+        (so nginx is running it). Otherwise, with wait=True (default)
+        blocks until the coalesced reload has run and raises if it failed.
+        Either way the reload's Future is returned.
+        """
+        changed = self._write_common_conf()
+        changed |= self._write_conf(self._conf_path(server), self._generate_stream_block(server))
+        if not changed and reload_scheduler.in_sync:
+            return None
+        return self.reload(wait=wait)
+
+    def remove_server(self, server, wait: bool = True) -> Future | None:
+        """Removes the nginx conf file for the server and schedules a reload."""
         path = self._conf_path(server)
         if os.path.exists(path):
             os.remove(path)
-            self._reload_nginx()
-
-    def _reload_nginx(self) -> None:
-        # Test config first so errors are descriptive rather than silent.
-        for cmd in (['nginx', '-t'], ['sudo', 'nginx', '-t']):
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                break
-        else:
-            raise RuntimeError(
-                f'nginx config test failed: {result.stderr.strip() or result.stdout.strip()}'
-            )
+        elif reload_scheduler.in_sync:
+            return None
+        return self.reload(wait=wait)
 
-        # Reload — try direct first (works when running as root),
-        # fall back to sudo granted via /etc/sudoers.d/pgsm-nginx.
-        for cmd in (['nginx', '-s', 'reload'], ['sudo', 'nginx', '-s', 'reload']):
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                return
-        raise RuntimeError(f'nginx reload failed: {result.stderr.strip()}')
+    def resync_all(self, servers, wait: bool = True) -> dict:
+        """Regenerates every server's conf from the DB in one pass.
+
+        Writes changed files, removes pgsm-*.conf files that no longer belong to
+        a server, and issues at most one reload for the whole batch (also when
+        nothing changed but the last reload failed). Returns
+        {'written': [ct_id, ...], 'removed': [filename, ...], 'unchanged': int}.
+        """
+        conf_dir = current_app.config['NGINX_CONF_DIR']
+        summary = {'written': [], 'removed': [], 'unchanged': 0}
+        common_changed = self._write_common_conf()
+        expected = set()
+        for server in servers:
+            path = self._conf_path(server)
+            expected.add(os.path.basename(path))
+            if self._write_conf(path, self._generate_stream_block(server)):
+                summary['written'].append(server.ct_id)
+            else:
+                summary['unchanged'] += 1
+
+        for path in glob.glob(os.path.join(conf_dir, 'pgsm-[0-9]*.conf')):
+            name = os.path.basename(path)
+            if name not in expected:
+                os.remove(path)
+                summary['removed'].append(name)
+
+        if common_changed or summary['written'] or summary['removed'] or not reload_scheduler.in_sync:
+            self.reload(wait=wait)
+        return summary
+
+    def reload(self, wait: bool = True) -> Future:
+        """Queues a test-and-reload with the shared ReloadScheduler.
+
+        Reloads requested within NGINX_RELOAD_DEBOUNCE seconds of each other are
+        merged into one. Pass wait=False to return immediately with the Future.
+
+        The wait happens in a tpool thread: Future.result() blocks on a real
+        lock, which would stall the eventlet hub (and every other request)
+        until the reload finished.
+        """
+        future = reload_scheduler.request()
+        if wait:
+            tpool.execute(future.result, timeout=_RELOAD_WAIT_TIMEOUT)
+        return future
@@ -0,0 +1,154 @@
+"""
+Automatic public port assignment from per-game port ranges.
+
+Ranges come from PGSM_PORT_RANGES (game_code -> [first, last], with a
+'default' entry). Each range keeps a cursor below which every port is known
+to be used: it moves up as searches find the lowest free port and back down
+whenever a server_ports row is deleted. The lowest free block is found by
+seeking the (port, protocol) unique index to the cursor (O(log n)) and
+walking used ports from there to the first gap wide enough, so a packed
+range costs a few rows per claim rather than one per server. Only holes too
+narrow for the block are walked past; if nothing fits above the cursor the
+range is rescanned from its start once, so a missed release never hides a
+free port. The block is claimed by committing its server_ports rows; the
+unique constraint rejects a racing claim, in which case the search is
+retried. Ports a game's containers bind for themselves (Minecraft Java's
+RCON port) are never handed out.
+"""
+import heapq
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.extensions import db
+from app.models.server import ServerPort
+
+# Searches retried after losing a race for the same block
+_MAX_CLAIM_ATTEMPTS = 8
+
+
+class _PortCursors:
+    """Per range, the lowest port that may be free (every port below it is
+    used). In memory: rebuilt by the first search after a restart."""
+
+    def __init__(self):
+        self._cursors: dict[tuple, int] = {}
+        # Bumped on every release, so a search that overlapped one doesn't
+        # move a cursor past the released port
+        self.generation = 0
+
+    def get(self, key: tuple) -> int:
+        return self._cursors.get(key, key[0])
+
+    def advance(self, key: tuple, port: int, generation: int) -> None:
+        if generation == self.generation:
+            self._cursors[key] = port
+
+    def release(self, port: int) -> None:
+        self.generation += 1
+        for key, cursor in self._cursors.items():
+            if key[0] <= port < cursor:
+                self._cursors[key] = port
+
+
+port_cursors = _PortCursors()
+
+
+@event.listens_for(ServerPort, 'after_delete')
+def _port_released(mapper, connection, target) -> None:
+    port_cursors.release(target.port)
+
+
+class PortAllocator:
+    """Finds and reserves free public ports for game servers."""
+
+    def get_range(self, game_code: str) -> tuple[int, int]:
+        """Returns the inclusive (first, last) port range for *game_code*."""
+        ranges = current_app.config['PGSM_PORT_RANGES']
+        first, last = ranges.get(game_code) or ranges['default']
+        return max(int(first), 1024), min(int(last), 65535)
+
+    def reserved_ports(self, game_code: str) -> list[int]:
+        """Returns the sorted ports never assigned to *game_code* servers.
+
+        Minecraft Java's RCON port is bound inside every container (RCON can
+        be switched on for existing servers later), so it is skipped whether
+        or not RCON is currently enabled.
+        """
+        if game_code == 'MCJAV':
+            return [current_app.config['MINECRAFT_RCON_PORT']]
+        return []
+
+    def find_free_block(self, game_code: str, count: int = 1) -> int | None:
+        """Returns the lowest port starting *count* consecutive free ports in
+        *game_code*'s range, or None if the range is full.
+
+        A port held on any protocol counts as used, since a server's ports are
+        keyed by number alone. Reserved ports count as used too.
+        """
+        first, last = self.get_range(game_code)
+        reserved = tuple(p for p in self.reserved_ports(game_code) if first <= p <= last)
+        key = (first, last, reserved)
+        generation = port_cursors.generation
+        start = port_cursors.get(key)
+        found, lowest_free = self._scan(start, last, reserved, count)
+        if found is None and start > first:
+            found, lowest_free = self._scan(first, last, reserved, count)
+        if lowest_free is not None:
+            port_cursors.advance(key, lowest_free, generation)
+        return found
+
+    @staticmethod
+    def _scan(start: int, last: int, reserved: tuple, count: int) -> tuple[int | None, int | None]:
+        """Walks used ports from *start* in port order. Returns (start of the
+        first free block of *count*, lowest free port), either None if absent."""
+        used = (
+            db.session.query(ServerPort.port)
+            .filter(ServerPort.port >= start, ServerPort.port <= last)
+            .distinct()
+            .order_by(ServerPort.port)
+            .yield_per(256)
+        )
+        candidate = start
+        lowest_free = None
+        for port in heapq.merge((port for (port,) in used), (p for p in reserved if p >= start)):
+            if port > candidate and lowest_free is None:
+                lowest_free = candidate
+            if port >= candidate + count:
+                break  # Gap before this port is wide enough
+            candidate = max(candidate, port + 1)
+        if lowest_free is None and candidate <= last:
+            lowest_free = candidate
+        return (candidate if candidate + count - 1 <= last else None), lowest_free
+
+    def assign(self, server, count: int = 1, protocol: str = 'tcp', primary: bool = False) -> list[int]:
+        """Reserves the lowest free block of *count* consecutive ports for *server* and commits.
+
+        With *primary*, the first port becomes game_port (always tcp) and the
+        rest are added as extra ports with *protocol*; otherwise every port is
+        an extra port. Works for a new server (it is added to the session) and
+        an existing one. Raises RuntimeError if no block is free.
+        """
+        base_extra = list(server.extra_ports or [])
+        first, last = self.get_range(server.game_code)
+
+        for _ in range(_MAX_CLAIM_ATTEMPTS):
+            start = self.find_free_block(server.game_code, count)
+            if start is None:
+                raise RuntimeError(f'No {count} free consecutive port(s) left in range {first}–{last}.')
+            ports = list(range(start, start + count))
+            extra_ports = ports[1:] if primary else ports
+            if primary:
+                server.game_port = ports[0]
+            server.extra_ports = base_extra + [{'port': p, 'protocol': protocol} for p in extra_ports]
+            flag_modified(server, 'extra_ports')
+            server.sync_port_registry()
+            db.session.add(server)
+            try:
+                db.session.commit()
+                return ports
+            except IntegrityError:
+                db.session.rollback()  # Another server claimed part of the block; search again
+        raise RuntimeError('Could not reserve ports: too many concurrent assignments, try again.')
@@ -1,5 +1,3 @@
-import ipaddress
-
 from flask import current_app
 from proxmoxer import ProxmoxAPI
 
@@ -48,22 +46,6 @@ class ProxmoxService:
             ct_id += 1
         return ct_id
 
-    def get_next_ip(self, used_ips: list[str]) -> str:
-        """Returns the next available IP in the PGSM VLAN subnet.
-
-        Skips everything below PGSM_VLAN_IP_Start (reserved for Proxmox nodes,
-        router, controller, etc.) and anything already assigned to a server in the DB.
-        """
-        subnet = ipaddress.IPv4Network(current_app.config['PGSM_VLAN_SUBNET'])
-        ip_start = ipaddress.IPv4Address(current_app.config['PGSM_VLAN_IP_START'])
-        reserved = {ipaddress.IPv4Address(ip) for ip in used_ips if ip}
-        for host in subnet.hosts():
-            if host < ip_start:
-                continue
-            if host not in reserved:
-                return str(host)
-        raise RuntimeError('No available IPs in the PGSM VLAN subnet.')
-
     def create_lxc(
         self,
         node: str,
@@ -74,11 +56,18 @@ class ProxmoxService:
         cores: int,
         memory_mb: int,
         pubkey: str,
+        bridge: str = 'PGSM',
+        prefixlen: int = 24,
+        gateway: str | None = None,
     ) -> None:
-        """Creates an unprivileged LXC container with PGSM networking and starts it."""
+        """Creates an unprivileged LXC container with PGSM networking and starts it.
+
+        bridge/prefixlen/gateway describe the VLAN pool the IP was leased from
+        (see IpAllocator); gateway defaults to PGSM_VLAN_Gateway.
+        """
         api = self._get_api()
         cfg = current_app.config
-        gateway = cfg['PGSM_VLAN_GATEWAY']
+        gateway = gateway or cfg['PGSM_VLAN_GATEWAY']
         template = cfg['PGSM_LXC_TEMPLATE']
 
         api.nodes(node).lxc.post(**{
@@ -89,7 +78,7 @@ class ProxmoxService:
             'cores': cores,
             'memory': memory_mb,
             'rootfs': f'kestrel:{disk_gb}',
-            'net0': f'name=eth0,bridge=PGSM,ip={ip}/24,gw={gateway}',
+            'net0': f'name=eth0,bridge={bridge},ip={ip}/{prefixlen},gw={gateway}',
             'nameserver': '1.1.1.1',
             'searchdomain': 'PGSM.lan',
             'ssh-public-keys': pubkey,
@@ -0,0 +1,183 @@
+"""
+Minimal Minecraft RCON (Source RCON protocol) client with persistent connections.
+
+RconPool keeps one authenticated connection per server and reuses it, so a
+command costs one round trip instead of an SSH handshake plus a process spawn.
+Sockets are eventlet green sockets, matching the SocketIO async mode.
+
+A command is never sent twice: a stale pooled connection is replaced before
+the command goes out, and any failure after that raises RconDeliveryError,
+since the server may already have run it. Long replies arrive split over
+several packets, so each command is followed by an empty packet of another
+type; the server answers packets in order, so its reply marks the end.
+"""
+import logging
+import struct
+import time
+
+from eventlet.green import select, socket
+from eventlet.semaphore import Semaphore
+
+log = logging.getLogger(__name__)
+
+_TYPE_RESPONSE = 0
+_TYPE_COMMAND = 2
+_TYPE_AUTH = 3
+
+_TIMEOUT = 5
+# After a failed connect, skip RCON for this server for this many seconds
+_RETRY_AFTER = 30
+# Minecraft rejects request bodies longer than this
+_MAX_COMMAND_BYTES = 1446
+
+
+class RconError(RuntimeError):
+    pass
+
+
+class RconDeliveryError(RconError):
+    """The command was sent but its reply was lost; it may have run."""
+
+
+class RconClient:
+    """One authenticated RCON connection."""
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = _TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._next_id = 0
+
+    def connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        request_id = self._send(_TYPE_AUTH, self.password)
+        # Minecraft answers auth with a single packet; id -1 means a bad password
+        response_id, _, _ = self._recv()
+        if response_id == -1 or response_id != request_id:
+            self.close()
+            raise RconError('RCON authentication failed')
+
+    def command(self, command: str) -> str:
+        """Runs *command* and returns its whole reply. Raises RconDeliveryError
+        for any failure once the command has started going out."""
+        if self._sock is None:
+            self.connect()
+        try:
+            request_id = self._send(_TYPE_COMMAND, command)
+            end_id = self._send(_TYPE_RESPONSE, '')
+            parts = []
+            while True:
+                response_id, _, body = self._recv()
+                if response_id == end_id:
+                    return ''.join(parts)
+                if response_id != request_id:
+                    raise RconError('Out-of-order RCON response')
+                parts.append(body)
+        except (OSError, RconError) as e:
+            self.close()
+            raise RconDeliveryError(f'RCON reply lost, the command may have run: {e}') from e
+
+    def stale(self) -> bool:
+        """True if the server closed the connection (or sent something
+        unasked), so it must not carry a command."""
+        if self._sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _send(self, packet_type: int, body: str) -> int:
+        self._next_id += 1
+        payload = struct.pack('<ii', self._next_id, packet_type) + body.encode('utf-8') + b'\x00\x00'
+        self._sock.sendall(struct.pack('<i', len(payload)) + payload)
+        return self._next_id
+
+    def _recv(self) -> tuple[int, int, str]:
+        (length,) = struct.unpack('<i', self._recv_exact(4))
+        data = self._recv_exact(length)
+        response_id, packet_type = struct.unpack('<ii', data[:8])
+        return response_id, packet_type, data[8:-2].decode('utf-8', errors='replace')
+
+    def _recv_exact(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self._sock.recv(n - len(buf))
+            if not chunk:
+                raise RconError('RCON connection closed')
+            buf += chunk
+        return bytes(buf)
+
+
+class RconPool:
+    """Persistent RCON connections keyed by server id."""
+
+    def __init__(self):
+        self._clients: dict[str, RconClient] = {}
+        self._locks: dict[str, Semaphore] = {}
+        self._failed_at: dict[str, float] = {}
+
+    def available(self, server) -> bool:
+        """True if *server* has RCON configured and hasn't failed to connect recently."""
+        if not server.rcon_password:
+            return False
+        failed_at = self._failed_at.get(server.id)
+        return failed_at is None or time.monotonic() - failed_at >= _RETRY_AFTER
+
+    def command(self, server, command: str, port: int) -> str:
+        """Runs *command* over *server*'s pooled connection and returns the reply.
+
+        Reconnects first if the pooled connection has gone stale. Raises
+        RconError or OSError if RCON is unreachable (the command wasn't sent),
+        or RconDeliveryError if it was sent but the reply was lost; the
+        command is never retried after it went out.
+        """
+        if len(command.encode('utf-8')) > _MAX_COMMAND_BYTES:
+            raise RconError(f'Command too long for RCON (max {_MAX_COMMAND_BYTES} bytes)')
+        lock = self._locks.setdefault(server.id, Semaphore())
+        with lock:
+            client = self._clients.get(server.id)
+            if client is not None and (
+                (client.host, client.password) != (server.ip_address, server.rcon_password) or client.stale()
+            ):
+                # Server restarted, the socket idled out or the settings changed
+                self._drop(server.id)
+                client = None
+            if client is None:
+                client = RconClient(server.ip_address, port, server.rcon_password)
+                try:
+                    client.connect()
+                except (OSError, RconError):
+                    client.close()
+                    self._failed_at[server.id] = time.monotonic()
+                    raise
+                self._clients[server.id] = client
+                self._failed_at.pop(server.id, None)
+            try:
+                return client.command(command)
+            except RconDeliveryError:
+                self._drop(server.id)
+                raise
+
+    def close(self, server_id: str) -> None:
+        self._drop(server_id)
+        self._failed_at.pop(server_id, None)
+
+    def _drop(self, server_id: str) -> None:
+        client = self._clients.pop(server_id, None)
+        if client is not None:
+            client.close()
+
+
+rcon_pool = RconPool()
@@ -4,10 +4,12 @@ Server lifecycle management.
 All operations that control game server state: provisioning, start, stop,
 restart, console command sending, and status queries.
 """
-import io
 import os
+import re
 import time
 
+from eventlet.greenpool import GreenPool
+
 from app.extensions import db
 from app.models.server import GameServer
 from app.services.ssh import SSHManager
@@ -28,6 +30,8 @@ TMUX_SESSION = 'PGSM'
 _BOOT_RETRY_INTERVAL = 5
 _BOOT_MAX_ATTEMPTS = 60  # 5 minutes total
 
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f]')
+
 
 def provision_server(server_id: str) -> None:
     """Full provisioning pipeline after LXC container creation.
@@ -56,18 +60,22 @@ def provision_server(server_id: str) -> None:
         _set_status(server, 'error')
         raise RuntimeError(f'Script upload failed: {e}') from e
 
-    # Step 2b: For import servers, upload the zip archive to the container
+    # Step 2b: For import servers, stream the archive straight into /PGSM.
+    # bsdtar reads zip, tar.gz and tar.zst from stdin, so the archive is never
+    # staged on the container's disk — the only copy there is the extracted tree.
     if server.server_type == 'import' and server.import_archive_url:
-        local_zip = server.import_archive_url  # stored as local host path
+        local_archive = server.import_archive_url  # stored as local host path
         try:
-            ssh_mgr.upload_script(ip, local_zip, '/tmp/server-archive.zip')
+            _ensure_bsdtar(ip)
+            with open(local_archive, 'rb') as f:
+                ssh_mgr.exec_stdin(ip, 'mkdir -p /PGSM && bsdtar -xf - -C /PGSM', f)
         except Exception as e:
             _set_status(server, 'error')
-            raise RuntimeError(f'Archive upload failed: {e}') from e
+            raise RuntimeError(f'Archive extraction failed: {e}') from e
         finally:
-            # Clean up local zip regardless of upload success
+            # Clean up local archive regardless of extraction success
             try:
-                os.remove(local_zip)
+                os.remove(local_archive)
             except OSError:
                 pass
 
@@ -184,14 +192,90 @@ def sync_server_status(server: GameServer) -> str:
     return new_status
 
 
-def send_console_command(server: GameServer, command: str) -> None:
-    """Sends a command string to the running tmux session."""
+def send_console_command(server: GameServer, command: str) -> tuple[str, str | None]:
+    """Sends a command to the server console by the fastest available path.
+
+    1. 'console': typed into the shared console session's attached tmux
+       channel, if one is open (output shows in the console as usual)
+    2. 'rcon': over the server's persistent RCON connection, if enabled
+    3. 'tmux': `tmux send-keys` over a fresh SSH exec
+
+    Returns (path, reply); reply is the RCON response text, else None.
+    Falls back to tmux only if RCON couldn't connect. Once the command went
+    out over RCON, a lost reply raises RconDeliveryError instead, so the
+    command never runs twice.
+    """
+    from flask import current_app
+    from app.services.console import console_manager
+    from app.services.rcon import RconDeliveryError, RconError, rcon_pool
+
+    # Control characters could inject extra lines or tmux key bindings
+    command = _CONTROL_CHARS.sub('', command)
+
+    session = console_manager.get(server.id)
+    if session is not None and session.send_input(command):
+        return 'console', None
+
+    if rcon_pool.available(server):
+        try:
+            # RCON takes commands without the chat-style leading slash
+            reply = rcon_pool.command(server, command.removeprefix('/'), current_app.config['MINECRAFT_RCON_PORT'])
+            return 'rcon', reply
+        except RconDeliveryError:
+            raise
+        except (OSError, RconError):
+            pass  # Not reachable (e.g. properties not applied yet); use tmux
+
     escaped = command.replace("'", "'\\''")
     # tmux session is owned by the PGSM user — must run as that user
-    ssh_mgr.exec(
+    ssh_mgr.exec_threaded(
         server.ip_address,
         f"su -s /bin/bash PGSM -c \"TMUX_TMPDIR=/tmp tmux send-keys -t {TMUX_SESSION} '{escaped}' Enter\""
     )
+    return 'tmux', None
+
+
+def broadcast_console_command(servers, command: str, concurrency: int) -> dict:
+    """Sends *command* to every running server in *servers*, at most
+    *concurrency* at a time, and returns a report.
+
+    Each server's result has ok, the path used (see send_console_command),
+    latency_ms and the RCON reply or the error. Servers that aren't running
+    are listed under skipped rather than attempted.
+    """
+    from flask import current_app
+    app = current_app._get_current_object()
+    targets = [s for s in servers if s.status == 'running']
+
+    def send(server):
+        started = time.monotonic()
+        result = {'server_id': server.id, 'name': server.name}
+        with app.app_context():
+            try:
+                via, reply = send_console_command(server, command)
+                result.update(ok=True, via=via, reply=reply, error=None)
+            except Exception as e:
+                result.update(ok=False, via=None, reply=None, error=str(e) or e.__class__.__name__)
+        result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    started = time.monotonic()
+    pool = GreenPool(max(1, concurrency))
+    results = sorted(pool.imap(send, targets), key=lambda r: r['name'].lower())
+    succeeded = sum(r['ok'] for r in results)
+    return {
+        'command': command,
+        'concurrency': max(1, concurrency),
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        'results': results,
+        'skipped': [
+            {'server_id': s.id, 'name': s.name, 'status': s.status}
+            for s in servers if s.status != 'running'
+        ],
+    }
 
 
 # ── Internal helpers ──────────────────────────────────────────────────────────
@@ -210,6 +294,22 @@ def _wait_for_ssh(ip: str, server: GameServer) -> None:
     raise RuntimeError(f'Container at {ip} never became SSH-accessible after {_BOOT_MAX_ATTEMPTS} attempts.')
 
 
+def _ensure_bsdtar(ip: str) -> None:
+    """Installs libarchive-tools unless bsdtar is already there. Raises
+    RuntimeError with apt's error if bsdtar still isn't available."""
+    # stdout is only the bsdtar path, and only if it is (now) installed
+    stdout, stderr = ssh_mgr.exec(
+        ip,
+        'command -v bsdtar || { { apt-get update -q && apt-get install -y -q libarchive-tools; } >/dev/null'
+        ' && command -v bsdtar; }',
+        timeout=600,
+    )
+    if not stdout.strip():
+        errors = [line for line in stderr.strip().splitlines() if line.startswith(('E:', 'W:'))]
+        detail = (errors or stderr.strip().splitlines() or ['no output'])[-1]
+        raise RuntimeError(f'Could not install bsdtar (libarchive-tools): {detail}')
+
+
 def _write_remote_file(ip: str, remote_path: str, content: str) -> None:
     """Writes a string to a file on the remote host via SFTP."""
     client, sftp = ssh_mgr.get_sftp(ip)
@@ -0,0 +1,136 @@
+"""
+Filtered, paginated server listings for the list page, dashboard and /api/servers.
+
+Pages are keyset-paginated on (created_at, id), newest first, through the
+ix_game_servers_created_id index, so fetching any page costs one indexed
+range scan of `limit` rows regardless of fleet size. The cursor is an opaque
+token encoding the last row's sort key. Status counts are a single GROUP BY.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import load_only
+
+from app.extensions import db
+from app.models.server import GameServer
+
+# Query-string filters: parameter name -> column matched exactly
+FILTER_COLUMNS = {
+    'status': GameServer.status,
+    'type': GameServer.server_type,
+    'node': GameServer.proxmox_node,
+    'game': GameServer.game_code,
+}
+
+# Fields /api/servers can return via ?fields=; DEFAULT_FIELDS when omitted
+API_FIELDS = (
+    'id', 'name', 'status', 'ip_address', 'game_port', 'game_code', 'server_type',
+    'game_version', 'proxmox_node', 'ct_id', 'created_at',
+)
+DEFAULT_FIELDS = (
+    'id', 'name', 'status', 'ip_address', 'game_port', 'game_code', 'server_type', 'game_version',
+)
+
+MAX_PAGE_SIZE = 500
+
+
+def filter_servers(args) -> 'db.Query':
+    """Returns a GameServer query filtered by *args* (request.args or a dict).
+
+    Supports status, type, node and game (exact) and q (name substring,
+    case-insensitive). Empty values are ignored.
+    """
+    query = GameServer.query
+    for param, column in FILTER_COLUMNS.items():
+        value = (args.get(param) or '').strip()
+        if value:
+            query = query.filter(column == value)
+    name = (args.get('q') or '').strip()
+    if name:
+        escaped = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(GameServer.name.ilike(f'%{escaped}%', escape='\\'))
+    return query
+
+
+def paginate(query, cursor: str | None, limit: int | None, fields=None) -> tuple[list[GameServer], str | None]:
+    """Returns (servers, next_cursor) for the page after *cursor*, newest first.
+
+    *fields* limits the columns loaded; limit None returns every remaining
+    row. next_cursor is None on the last page. Raises ValueError for a
+    malformed cursor.
+    """
+    if cursor:
+        created_at, server_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            GameServer.created_at < created_at,
+            and_(GameServer.created_at == created_at, GameServer.id < server_id),
+        ))
+    if fields:
+        columns = {'id', 'created_at', *fields}
+        query = query.options(load_only(*(getattr(GameServer, f) for f in sorted(columns))))
+    query = query.order_by(GameServer.created_at.desc(), GameServer.id.desc())
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor(rows[-1])
+
+
+def status_counts(query=None) -> dict[str, int]:
+    """Returns {status: count} plus 'total', for *query* (default: every server)."""
+    query = query if query is not None else GameServer.query
+    rows = (
+        query.with_entities(GameServer.status, func.count(GameServer.id))
+        .group_by(GameServer.status)
+        .order_by(None)
+        .all()
+    )
+    counts = {status: n for status, n in rows}
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def filter_options() -> dict[str, list[str]]:
+    """Distinct values for the type and node filter dropdowns (indexed scans)."""
+    return {
+        'types': [v for (v,) in db.session.query(GameServer.server_type).distinct().order_by(GameServer.server_type)],
+        'nodes': [v for (v,) in db.session.query(GameServer.proxmox_node).distinct().order_by(GameServer.proxmox_node)],
+    }
+
+
+def parse_fields(value: str | None) -> tuple[str, ...]:
+    """Parses a comma-separated ?fields= value. Raises ValueError on unknown fields."""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown field(s): {", ".join(unknown)}. Allowed: {", ".join(API_FIELDS)}')
+    return fields
+
+
+def serialize(server: GameServer, fields) -> dict:
+    out = {}
+    for field in fields:
+        value = getattr(server, field)
+        out[field] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _encode_cursor(server: GameServer) -> str:
+    raw = f'{server.created_at.isoformat()}|{server.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, server_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), server_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
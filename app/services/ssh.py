@@ -1,11 +1,15 @@
 import os
 
 import paramiko
+from eventlet import tpool
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from flask import current_app
 
+# Bytes read from a local stream per channel write when piping into a remote command
+_STREAM_CHUNK_SIZE = 256 * 1024
+
 
 class SSHManager:
     """Manages the PGSM SSH keypair and all SSH/SFTP operations against game nodes."""
@@ -67,6 +71,10 @@ class SSHManager:
     def exec(self, ip: str, command: str, username: str = 'root', timeout: int = 60) -> tuple[str, str]:
         """Runs a command on a remote host. Returns (stdout, stderr) as strings.
 
+        Output is decoded leniently (invalid UTF-8 becomes U+FFFD): file names
+        and game logs on the container are arbitrary bytes, and a strict decode
+        would turn a command that already ran into an error.
+
         Args:
             timeout: Max seconds to wait for the command. Use a large value for
                      install scripts (e.g., 600 for 10-minute installs).
@@ -74,7 +82,48 @@ class SSHManager:
         client = self.get_client(ip, username)
         try:
             _, stdout, stderr = client.exec_command(command, timeout=timeout)
-            return stdout.read().decode(), stderr.read().decode()
+            return stdout.read().decode(errors='replace'), stderr.read().decode(errors='replace')
+        finally:
+            client.close()
+
+    def exec_threaded(self, ip: str, command: str, **kwargs) -> tuple[str, str]:
+        """exec() in an eventlet tpool thread.
+
+        paramiko waits on real threading primitives, which would stall the
+        eventlet hub (and every other request) for the whole command.
+        """
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                return self.exec(ip, command, **kwargs)
+
+        return tpool.execute(run)
+
+    def exec_stdin(self, ip: str, command: str, stream, username: str = 'root', timeout: int = 3600) -> str:
+        """Runs a command on a remote host, piping *stream* into its stdin chunk by chunk.
+
+        Only one chunk is held in memory at a time, so arbitrarily large inputs
+        (e.g. server archives) can be fed to a remote extractor without staging
+        them on the remote disk. Returns stdout; raises RuntimeError if the
+        command exits non-zero.
+        """
+        client = self.get_client(ip, username)
+        try:
+            stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+            channel = stdin.channel
+            while True:
+                chunk = stream.read(_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                channel.sendall(chunk)
+            channel.shutdown_write()
+            exit_status = channel.recv_exit_status()
+            out = stdout.read().decode(errors='replace')
+            if exit_status != 0:
+                err = stderr.read().decode(errors='replace').strip()
+                raise RuntimeError(f'Remote command exited with status {exit_status}: {err}')
+            return out
         finally:
             client.close()
 
@@ -0,0 +1,238 @@
+"""
+Per-port traffic accounting from the nginx stream access log.
+
+NginxService tags every proxied server block with `access_log ... pgsm_traffic`.
+TrafficTailer reads that log incrementally on the controller, aggregates bytes,
+connections and session time per server/port/protocol into hourly PortTraffic
+rows, and stores its read position (inode + offset) in the same transaction.
+Log rotation is detected by inode change (the remainder of the rotated file is
+drained from `<log>.1` if present, across passes if need be) or by the file
+shrinking (copytruncate).
+
+Lines are attributed by upstream IP. VLAN addresses are recycled, so a line is
+only counted for the server that holds its IP if it was logged after that
+server was created; anything older belonged to a deleted server.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.server import GameServer
+from app.models.traffic import PortTraffic, TrafficLogState
+
+log = logging.getLogger(__name__)
+
+# Upper bound on log bytes consumed per pass, so one pass never runs unbounded
+_MAX_BYTES_PER_PASS = 64 * 1024 * 1024
+
+
+class TrafficTailer:
+    """Incrementally tails the nginx stream access log into PortTraffic."""
+
+    def __init__(self):
+        self._app = None
+        self._thread: threading.Thread | None = None
+
+    def init_app(self, app) -> None:
+        self._app = app
+
+    def start(self) -> None:
+        """Starts polling the log in a daemon thread every TRAFFIC_TAIL_INTERVAL seconds."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name='pgsm-traffic-tailer')
+        self._thread.start()
+
+    def _run(self) -> None:
+        interval = self._app.config['TRAFFIC_TAIL_INTERVAL']
+        while True:
+            with self._app.app_context():
+                try:
+                    self.poll()
+                except Exception:
+                    db.session.rollback()
+                    log.exception('Traffic log poll failed')
+            time.sleep(interval)
+
+    def poll(self) -> int:
+        """Consumes new log lines once. Returns the number of lines accounted. Needs an app context."""
+        from flask import current_app
+        path = current_app.config['NGINX_TRAFFIC_LOG']
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return 0
+
+        state = db.session.get(TrafficLogState, path) or TrafficLogState(path=path, inode=None, offset=0)
+        owners = _server_owners()
+        totals: dict[tuple, list] = {}
+        lines = 0
+        budget = _MAX_BYTES_PER_PASS
+
+        if state.inode is not None and state.inode != st.st_ino:
+            # Rotated: finish the old file if logrotate left it next to us, then start fresh
+            rotated = f'{path}.1'
+            try:
+                if os.stat(rotated).st_ino == state.inode:
+                    n, offset, consumed = _read_lines(rotated, state.offset, budget, totals, owners)
+                    lines += n
+                    budget -= consumed
+                    if budget <= 0:
+                        # Out of budget mid-file: keep our place in it for the next pass
+                        state.offset = offset
+                        return self._commit(state, totals, lines)
+            except FileNotFoundError:
+                pass
+            state.offset = 0
+        elif st.st_size < state.offset:
+            # Truncated in place (copytruncate)
+            state.offset = 0
+
+        state.inode = st.st_ino
+        n, state.offset, _ = _read_lines(path, state.offset, budget, totals, owners)
+        return self._commit(state, totals, lines + n)
+
+    @staticmethod
+    def _commit(state: TrafficLogState, totals: dict, lines: int) -> int:
+        if totals:
+            _store_totals(totals)
+        db.session.merge(state)
+        db.session.commit()
+        return lines
+
+
+def get_port_traffic(server_id: str, hours: int = 24) -> list[dict]:
+    """Returns per-port totals for *server_id* over the last *hours* hours."""
+    since = _hour_bucket(datetime.now(timezone.utc) - timedelta(hours=hours))
+    rows = (
+        db.session.query(
+            PortTraffic.port,
+            PortTraffic.protocol,
+            func.sum(PortTraffic.bytes_in),
+            func.sum(PortTraffic.bytes_out),
+            func.sum(PortTraffic.connections),
+            func.sum(PortTraffic.session_seconds),
+        )
+        .filter(PortTraffic.server_id == server_id, PortTraffic.bucket >= since)
+        .group_by(PortTraffic.port, PortTraffic.protocol)
+        .order_by(PortTraffic.port)
+        .all()
+    )
+    return [
+        {
+            'port': port,
+            'protocol': protocol,
+            'bytes_in': int(bytes_in or 0),
+            'bytes_out': int(bytes_out or 0),
+            'connections': int(connections or 0),
+            'session_seconds': round(float(session_seconds or 0), 1),
+        }
+        for port, protocol, bytes_in, bytes_out, connections, session_seconds in rows
+    ]
+
+
+# ── Internal helpers ──────────────────────────────────────────────────────────
+
+def _hour_bucket(ts: datetime) -> datetime:
+    """Truncates *ts* to the hour as a naive UTC datetime (the DB convention)."""
+    return _utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def _utc(ts: datetime) -> datetime:
+    """*ts* as a naive UTC datetime (the DB convention)."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _server_owners() -> dict[str, tuple[str, datetime | None]]:
+    """Maps each server's IP to (server_id, created_at)."""
+    return {
+        ip: (server_id, created_at)
+        for ip, server_id, created_at in
+        db.session.query(GameServer.ip_address, GameServer.id, GameServer.created_at)
+    }
+
+
+def _parse_line(line: str, owners: dict):
+    """Parses one TRAFFIC_LOG_FORMAT line into (key, bytes_in, bytes_out, seconds), or None.
+
+    key is (server_id, port, protocol, hour_bucket). Lines for an IP no
+    current server holds, or logged before its holder was created (the IP
+    was recycled from a deleted server), give None.
+    """
+    parts = line.split()
+    if len(parts) != 8:
+        return None
+    time_iso, protocol, _status, received, sent, session_time, upstream, _server_port = parts
+    if upstream == '-':
+        return None
+    # On upstream retries nginx logs "a:p, b:p"; the last one served the session
+    upstream = upstream.split(',')[-1].strip()
+    ip, _, port = upstream.rpartition(':')
+    owner = owners.get(ip)
+    if owner is None:
+        return None  # Server deleted since the line was logged
+    server_id, created_at = owner
+    try:
+        logged_at = _utc(datetime.fromisoformat(time_iso))
+        if created_at is not None and logged_at < created_at:
+            return None
+        key = (server_id, int(port), protocol.lower(), _hour_bucket(logged_at))
+        return key, int(received), int(sent), float(session_time)
+    except ValueError:
+        return None
+
+
+def _read_lines(path: str, offset: int, budget: int, totals: dict, owners: dict) -> tuple[int, int, int]:
+    """Aggregates complete lines of *path* from *offset* into *totals*.
+
+    Stops at a trailing partial line (nginx may be mid-write) or once *budget*
+    bytes have been consumed. Returns (lines, new_offset, bytes_consumed).
+    """
+    lines = 0
+    start = offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while offset - start < budget:
+            raw = f.readline()
+            if not raw or not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            parsed = _parse_line(raw.decode('utf-8', errors='replace'), owners)
+            if parsed is None:
+                continue
+            key, bytes_in, bytes_out, seconds = parsed
+            agg = totals.setdefault(key, [0, 0, 0, 0.0])
+            agg[0] += bytes_in
+            agg[1] += bytes_out
+            agg[2] += 1
+            agg[3] += seconds
+            lines += 1
+    return lines, offset, offset - start
+
+
+def _store_totals(totals: dict) -> None:
+    """Adds aggregated counters onto PortTraffic rows (caller commits)."""
+    for (server_id, port, protocol, bucket), (bytes_in, bytes_out, conns, seconds) in totals.items():
+        row = PortTraffic.query.filter_by(
+            server_id=server_id, port=port, protocol=protocol, bucket=bucket,
+        ).first()
+        if row is None:
+            row = PortTraffic(
+                server_id=server_id, port=port, protocol=protocol, bucket=bucket,
+                bytes_in=0, bytes_out=0, connections=0, session_seconds=0.0,
+            )
+            db.session.add(row)
+        row.bytes_in += bytes_in
+        row.bytes_out += bytes_out
+        row.connections += conns
+        row.session_seconds += seconds
+
+
+traffic_tailer = TrafficTailer()
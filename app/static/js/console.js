@@ -34,17 +34,54 @@ function initConsole(serverId, isRunning) {
         return { cols: term.cols, rows: term.rows };
     }
 
+    // Output is written through a promise chain so it stays in order even
+    // though inflating a compressed frame is asynchronous
+    const canInflate = typeof DecompressionStream !== 'undefined';
+    let writeChain = Promise.resolve();
+
+    function enqueueWrite(produce, done) {
+        writeChain = writeChain
+            .then(produce)
+            .then(function (data) {
+                term.write(typeof data === 'string' ? data : new Uint8Array(data), done);
+            })
+            .catch(function (e) {
+                console.error('[PGSM] console write failed', e);
+                if (done) done();
+            });
+    }
+
+    function inflate(buf) {
+        const stream = new Blob([buf]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Response(stream).arrayBuffer();
+    }
+
     socket.on('connect', function () {
         term.write('\r\n[PGSM] Connecting to server console...\r\n');
-        socket.emit('join_console', { server_id: serverId, ...getDimensions() });
+        socket.emit('join_console', {
+            server_id: serverId,
+            frames: true,
+            deflate: canInflate,
+            ...getDimensions(),
+        });
     });
 
     socket.on('disconnect', function () {
         term.write('\r\n[PGSM] Disconnected from console.\r\n');
     });
 
+    // Status lines from PGSM
     socket.on('console_output', function (data) {
-        term.write(data.data);
+        enqueueWrite(function () { return data.data; });
+    });
+
+    // Console output: text, or deflated UTF-8 bytes on the polling transport.
+    // Acking once xterm has parsed the frame lets the server throttle (or
+    // skip) output for a slow connection without affecting other viewers.
+    socket.on('console_frame', function (frame, ack) {
+        enqueueWrite(function () {
+            return typeof frame === 'string' ? frame : inflate(frame);
+        }, ack);
     });
 
     // Sync terminal size to server when browser is resized
@@ -1,6 +1,43 @@
 /* PGSM File Editor - CodeMirror integration */
 
-function initEditor(serverId, remotePath) {
+// Splits after each newline, keeping the endings (same as the server's split_lines)
+function splitLines(text) {
+    var lines = text.split('\n');
+    var tail = lines.pop();
+    lines = lines.map(function(line) { return line + '\n'; });
+    if (tail) lines.push(tail);
+    return lines;
+}
+
+// One line edit {line, delete, insert} turning base into text: everything
+// between the common leading and trailing lines is replaced
+function lineEdits(base, text) {
+    var a = splitLines(base);
+    var b = splitLines(text);
+    var prefix = 0;
+    while (prefix < a.length && prefix < b.length && a[prefix] === b[prefix]) prefix++;
+    var suffix = 0;
+    while (suffix < a.length - prefix && suffix < b.length - prefix
+           && a[a.length - 1 - suffix] === b[b.length - 1 - suffix]) suffix++;
+    if (prefix === a.length && prefix === b.length) return [];
+    return [{
+        line: prefix,
+        delete: a.length - prefix - suffix,
+        insert: b.slice(prefix, b.length - suffix).join(''),
+    }];
+}
+
+function sha256Hex(text) {
+    // crypto.subtle only exists on HTTPS and localhost; the hash is optional
+    if (!window.crypto || !crypto.subtle) return Promise.resolve(null);
+    return crypto.subtle.digest('SHA-256', new TextEncoder().encode(text)).then(function(buf) {
+        return Array.from(new Uint8Array(buf)).map(function(b) {
+            return b.toString(16).padStart(2, '0');
+        }).join('');
+    });
+}
+
+function initEditor(serverId, remotePath, baseSha256, lineSeparator) {
     var ext = remotePath.split('.').pop().toLowerCase();
 
     var modeMap = {
@@ -60,28 +97,60 @@ function initEditor(serverId, remotePath) {
         statusLines.textContent = cm.lineCount() + ' lines';
     });
 
+    // The text as it will be written, in the file's own line endings
+    function currentText() {
+        return cm.getValue(lineSeparator || '\n');
+    }
+
+    // Sends only the changed lines with the hash of the content they apply
+    // to; the server refuses the save (409) if the file changed meanwhile.
+    // The edits are computed on CodeMirror's normalised lines, so they are
+    // only sent with the result's hash for the server to check; without
+    // crypto.subtle (plain HTTP) the whole text goes instead.
     function saveFile() {
         saveStatus.textContent = 'Saving...';
         saveStatus.className = 'saving';
+        var text = currentText();
+        sha256Hex(text).then(function(digest) {
+            if (digest) {
+                send({path: remotePath, base_sha256: baseSha256, edits: lineEdits(originalContent, text), sha256: digest}, text);
+            } else {
+                send({path: remotePath, base_sha256: baseSha256, content: text}, text);
+            }
+        });
+    }
 
-        var formData = new FormData();
-        formData.append('path', remotePath);
-        formData.append('content', cm.getValue());
-
+    function send(body, text) {
         fetch('/files/' + serverId + '/save', {
             method: 'POST',
-            body: formData,
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(body),
         })
-        .then(function(r) { return r.json(); })
-        .then(function(data) {
+        .then(function(r) { return r.json().then(function(data) { return {status: r.status, data: data}; }); })
+        .then(function(result) {
+            var data = result.data;
             if (data.ok) {
                 saveStatus.textContent = 'Saved';
                 saveStatus.className = 'saved';
-                originalContent = cm.getValue();
+                originalContent = text;
+                baseSha256 = data.sha256;
                 setTimeout(function() {
                     saveStatus.textContent = '';
                     saveStatus.className = '';
                 }, 3000);
+            } else if (result.status === 409) {
+                saveStatus.textContent = 'Changed on the server';
+                saveStatus.className = 'error';
+                if (confirm('This file was changed on the server since you opened it.\n\n'
+                            + 'OK: overwrite it with your version\n'
+                            + 'Cancel: keep editing (reload the page to see the other changes)')) {
+                    saveStatus.textContent = 'Saving...';
+                    saveStatus.className = 'saving';
+                    send({path: remotePath, base_sha256: data.current_sha256, content: text}, text);
+                }
+            } else if (result.status === 422 && body.edits) {
+                // Edits didn't reproduce our text (line ending quirk?); send it whole
+                send({path: remotePath, base_sha256: baseSha256, content: text}, text);
             } else {
                 saveStatus.textContent = 'Error: ' + (data.error || 'unknown');
                 saveStatus.className = 'error';
@@ -96,9 +165,9 @@ function initEditor(serverId, remotePath) {
     document.getElementById('btn-save').addEventListener('click', saveFile);
 
     // Warn on unsaved changes when navigating away
-    var originalContent = cm.getValue();
+    var originalContent = currentText();
     window.addEventListener('beforeunload', function(e) {
-        if (cm.getValue() !== originalContent) {
+        if (currentText() !== originalContent) {
             e.preventDefault();
             e.returnValue = '';
         }
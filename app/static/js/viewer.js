@@ -0,0 +1,195 @@
+/**
+ * PGSM file viewer - pages through a file of any size and follows appends.
+ *
+ * The loaded text is a list of contiguous pages, each {start, end, el} in
+ * byte offsets. "Older"/"Newer" (or scrolling to either edge) fetch the
+ * neighbouring page from /files/<id>/page; once more than MAX_PAGES are
+ * loaded, pages are dropped from the far side. Follow mode jumps to the end
+ * and appends what the server streams as `file_tail` Socket.IO events.
+ */
+function initViewer(opts) {
+    const MAX_PAGES = 8;
+    const text = document.getElementById('view-text');
+    const status = document.getElementById('view-status');
+    const followButton = document.getElementById('view-follow');
+    let pages = [];
+    let size = 0;
+    let loading = false;
+    let following = false;
+    let socket = null;
+
+    function first() { return pages.length ? pages[0].start : 0; }
+    function last() { return pages.length ? pages[pages.length - 1].end : 0; }
+
+    function formatSize(bytes) {
+        if (bytes < 1024) return bytes + ' B';
+        if (bytes < 1048576) return (bytes / 1024).toFixed(1) + ' KB';
+        if (bytes < 1073741824) return (bytes / 1048576).toFixed(1) + ' MB';
+        return (bytes / 1073741824).toFixed(2) + ' GB';
+    }
+
+    function showStatus(extra) {
+        const shown = pages.length ? formatSize(first()) + '–' + formatSize(last()) : 'nothing';
+        status.textContent = 'Showing ' + shown + ' of ' + formatSize(size) + (extra ? ' · ' + extra : '');
+        document.getElementById('view-older').disabled = first() <= 0;
+        document.getElementById('view-newer').disabled = following || last() >= size;
+    }
+
+    function makePage(start, end, content) {
+        const el = document.createElement('span');
+        el.textContent = content;
+        return { start: start, end: end, el: el };
+    }
+
+    function fetchPage(offset, length) {
+        const params = new URLSearchParams({ path: opts.path, offset: offset, length: length });
+        return fetch(opts.pageUrl + '?' + params).then(function (r) {
+            return r.json().then(function (data) {
+                if (data.error) throw new Error(data.error);
+                size = data.size;
+                return data;
+            });
+        });
+    }
+
+    function guarded(load) {
+        if (loading) return;
+        loading = true;
+        status.textContent = 'Loading…';
+        load()
+            .then(function () { showStatus(); })
+            .catch(function (e) { status.textContent = e.message || 'Load failed'; })
+            .finally(function () { loading = false; });
+    }
+
+    // Replaces everything with one page
+    function replace(data, toBottom) {
+        pages.forEach(function (p) { p.el.remove(); });
+        const page = makePage(data.start, data.end, data.text);
+        pages = [page];
+        text.appendChild(page.el);
+        text.scrollTop = toBottom ? text.scrollHeight : 0;
+        status.title = data.binary ? 'This looks like a binary file' : '';
+    }
+
+    // Shows the page at offset (negative: from the end)
+    function jump(offset, toBottom) {
+        guarded(function () {
+            return fetchPage(offset, opts.pageBytes).then(function (data) { replace(data, toBottom); });
+        });
+    }
+
+    function older() {
+        if (first() <= 0) return;
+        guarded(function () {
+            const offset = Math.max(0, first() - opts.pageBytes);
+            return fetchPage(offset, first() - offset).then(function (data) {
+                if (data.end !== first()) return replace(data, false);  // file changed under us
+                const page = makePage(data.start, data.end, data.text);
+                const height = text.scrollHeight;
+                text.insertBefore(page.el, text.firstChild);
+                pages.unshift(page);
+                text.scrollTop += text.scrollHeight - height;  // keep the reader's place
+                while (pages.length > MAX_PAGES) pages.pop().el.remove();
+            });
+        });
+    }
+
+    function newer() {
+        if (following || last() >= size) return;
+        guarded(function () {
+            return fetchPage(last(), opts.pageBytes).then(function (data) {
+                if (data.start !== last()) return replace(data, false);
+                const page = makePage(data.start, data.end, data.text);
+                text.appendChild(page.el);
+                pages.push(page);
+                while (pages.length > MAX_PAGES) {
+                    const dropped = pages.shift();
+                    const height = text.scrollHeight;
+                    dropped.el.remove();
+                    text.scrollTop -= height - text.scrollHeight;
+                }
+            });
+        });
+    }
+
+    // ── Follow ──────────────────────────────────────────────────────────────
+
+    function setFollowing(on) {
+        following = on;
+        followButton.textContent = on ? 'Stop following' : 'Follow';
+        followButton.classList.toggle('btn-primary', on);
+        followButton.classList.toggle('btn-secondary', !on);
+        if (!on) {
+            if (socket) socket.emit('unfollow_file');
+            showStatus();
+            return;
+        }
+        guarded(function () {
+            return fetchPage(-opts.pageBytes, opts.pageBytes).then(function (data) {
+                replace(data, true);
+                if (!socket) socket = connect();
+                socket.emit('follow_file', { server_id: opts.serverId, path: opts.path, offset: data.end });
+            });
+        });
+    }
+
+    function connect() {
+        const s = io();
+        s.on('file_tail', function (msg) {
+            if (!following || msg.path !== opts.path) return;
+            if (msg.error) {
+                setFollowing(false);
+                status.textContent = 'Follow stopped: ' + msg.error;
+                return;
+            }
+            const atBottom = text.scrollTop + text.clientHeight >= text.scrollHeight - 20;
+            if (msg.reset) {
+                // Truncated or rotated: start over from its beginning
+                pages.forEach(function (p) { p.el.remove(); });
+                pages = [makePage(0, 0, '')];
+                text.appendChild(pages[0].el);
+            }
+            if (msg.skipped) {
+                pages.push(makePage(msg.offset, msg.offset, '\n[… ' + formatSize(msg.skipped) + ' skipped …]\n'));
+                text.appendChild(pages[pages.length - 1].el);
+            }
+            if (msg.data) {
+                const tail = pages[pages.length - 1];
+                tail.el.appendChild(document.createTextNode(msg.data));
+                // Start a new page now and then so old output can be dropped
+                if (tail.end - tail.start > opts.pageBytes) {
+                    pages.push(makePage(msg.offset, msg.offset, ''));
+                    text.appendChild(pages[pages.length - 1].el);
+                }
+            }
+            pages[pages.length - 1].end = msg.offset;
+            size = msg.offset;
+            while (pages.length > MAX_PAGES) pages.shift().el.remove();
+            if (atBottom) text.scrollTop = text.scrollHeight;
+            showStatus('following');
+        });
+        // Pick up where we left off after a reconnect
+        s.on('connect', function () {
+            if (following && pages.length) {
+                s.emit('follow_file', { server_id: opts.serverId, path: opts.path, offset: last() });
+            }
+        });
+        return s;
+    }
+
+    // ── Wiring ──────────────────────────────────────────────────────────────
+
+    document.getElementById('view-first').onclick = function () { setFollowing(false); jump(0, false); };
+    document.getElementById('view-last').onclick = function () { setFollowing(false); jump(-opts.pageBytes, true); };
+    document.getElementById('view-older').onclick = older;
+    document.getElementById('view-newer').onclick = newer;
+    followButton.onclick = function () { setFollowing(!following); };
+    text.addEventListener('scroll', function () {
+        if (text.scrollTop < 40) older();
+        else if (text.scrollTop + text.clientHeight > text.scrollHeight - 40) newer();
+    });
+
+    // Logs are read from the end
+    jump(-opts.pageBytes, true);
+}